@@ -0,0 +1,326 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from quota_governor import TokenBucket
+
+# リクエストを処理するワーカースレッドの数
+ADMISSION_WORKERS = int(os.environ.get("ADMISSION_WORKERS", "8"))
+
+# ユーザーごとの1分あたりのリクエスト数と、連続して受け付ける数
+USER_REQUESTS_PER_MINUTE = float(os.environ.get("USER_REQUESTS_PER_MINUTE", "10"))
+USER_BURST = float(os.environ.get("USER_BURST", "5"))
+
+# チャンネルごとの1分あたりのリクエスト数と、連続して受け付ける数
+CHANNEL_REQUESTS_PER_MINUTE = float(os.environ.get("CHANNEL_REQUESTS_PER_MINUTE", "30"))
+CHANNEL_BURST = float(os.environ.get("CHANNEL_BURST", "15"))
+
+# 上限を超えたユーザーのリクエストを待たせる最大数（超えた場合は受け付けない）
+ADMISSION_MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", "5"))
+
+# 一括処理（/approve など）の重み（対話的なリクエストは1.0）
+WEIGHT_INTERACTIVE = 1.0
+WEIGHT_BATCH = 0.25
+
+# 保持するトークンバケットの最大数（超えた場合は最も長く使われていないものから削除）
+MAX_TRACKED_KEYS = 10000
+
+# 受付の結果
+ADMITTED = 'admitted'
+QUEUED = 'queued'
+REJECTED = 'rejected'
+
+
+class Admission:
+    __slots__ = ('status', 'future', 'queued', 'retry_after')
+
+    def __init__(self, status, future=None, queued=0, retry_after=0.0):
+        """
+        受付の結果
+
+        Args:
+            status (str): ADMITTED（上限内）/ QUEUED（上限超過、順番待ち）/ REJECTED（受け付けない）
+            future (Future): 処理の結果（REJECTEDの場合はNone）
+            queued (int): 受付時点でこのユーザーの処理待ちの数（このリクエストを含む）
+            retry_after (float): REJECTEDの場合、再度受け付けられるまでの目安（秒）
+        """
+        self.status = status
+        self.future = future
+        self.queued = queued
+        self.retry_after = retry_after
+
+
+class _Flow:
+    __slots__ = ('finish', 'pending')
+
+    def __init__(self):
+        # 最後にキューに追加したリクエストの仮想終了時刻と、処理待ちの数
+        self.finish = 0.0
+        self.pending = 0
+
+
+class AdmissionController:
+    def __init__(self, workers=ADMISSION_WORKERS, user_rate=USER_REQUESTS_PER_MINUTE, user_burst=USER_BURST,
+                 channel_rate=CHANNEL_REQUESTS_PER_MINUTE, channel_burst=CHANNEL_BURST,
+                 max_queued=ADMISSION_MAX_QUEUED, clock=time.monotonic):
+        """
+        ユーザー・チャンネルごとの受付制御と、重み付き公平キューによるワーカーへの割り当て
+
+        ユーザーとチャンネルのトークンバケットの範囲内のリクエストはそのまま受け付け、
+        超えたリクエストはユーザーごとに max_queued 件まで順番待ちとして受け付ける。
+        順番待ちのリクエストは、ユーザーとチャンネルのトークンが補充されて cost を支払えるまで実行しない。
+        実行の順序はユーザーごとの重み付き公平キュー（仮想終了時刻の小さい順）で決めるため、
+        大量にリクエストしたユーザーは自分のリクエストを待たせるのみで、他のユーザーの待ち時間は増えない。
+
+        Args:
+            workers (int): ワーカースレッドの数
+            user_rate (float): ユーザーごとの1分あたりのリクエスト数
+            user_burst (float): ユーザーごとに連続して受け付ける数
+            channel_rate (float): チャンネルごとの1分あたりのリクエスト数
+            channel_burst (float): チャンネルごとに連続して受け付ける数
+            max_queued (int): 上限を超えたユーザーの処理待ちの最大数
+            clock (callable): 現在時刻を返す関数（テスト用）
+        """
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_queued = max_queued
+        self.clock = clock
+
+        self._user_buckets = OrderedDict()
+        self._channel_buckets = OrderedDict()
+        self._flows = {}
+        self._queue = []
+        self._deferred = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._running = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._stats = {ADMITTED: 0, QUEUED: 0, REJECTED: 0, 'completed': 0, 'failed': 0}
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f'admission-{number}', daemon=True)
+            for number in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def share(self, parts):
+        """
+        ユーザー・チャンネルごとの上限を parts 個のプロセスで分け合う（各プロセスの上限を 1/parts にする）
+
+        Args:
+            parts (int): 同じ上限で受け付けるプロセスの数
+        """
+        if parts <= 1:
+            return
+        with self._condition:
+            self.user_rate /= parts
+            self.user_burst /= parts
+            self.channel_rate /= parts
+            self.channel_burst /= parts
+            # 作成済みのバケットは元の上限のため、次の受付で作成し直す
+            self._user_buckets.clear()
+            self._channel_buckets.clear()
+
+    def _bucket(self, buckets, key, rate, burst):
+        """
+        キーごとのトークンバケット（LRU、上限を超えた場合は最も長く使われていないものを削除）
+        """
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity=burst, clock=self.clock)
+            buckets[key] = bucket
+            while len(buckets) > MAX_TRACKED_KEYS:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _wait_time(bucket, cost):
+        """
+        トークンバケットから cost を支払えるまでの秒数（容量を超える cost はバケットが満たされるまで）
+        """
+        shortage = min(cost, bucket.capacity) - bucket.available
+        if shortage <= 0:
+            return 0.0
+        return shortage / bucket.rate if bucket.rate > 0 else float('inf')
+
+    def _buckets(self, user_id, channel_id):
+        """
+        ユーザーとチャンネル（Noneの場合はユーザーのみ）のトークンバケット
+        """
+        buckets = [self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst)]
+        if channel_id is not None:
+            buckets.append(self._bucket(self._channel_buckets, channel_id, self.channel_rate, self.channel_burst))
+        return buckets
+
+    def submit(self, user_id, channel_id, func, weight=WEIGHT_INTERACTIVE, cost=1):
+        """
+        リクエストを受け付けてワーカーで実行
+
+        Args:
+            user_id (str): SlackのユーザーID
+            channel_id (str): SlackのチャンネルID（Noneの場合はチャンネルの制限なし）
+            func (callable): 引数なしで呼び出す処理
+            weight (float): 公平キューでの重み（一括処理は WEIGHT_BATCH）
+            cost (float): 消費するトークン数（一括処理は件数。公平キューの仮想終了時刻にも全て加える）
+
+        Returns:
+            Admission: 受付の結果
+        """
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("AdmissionControllerは停止しています")
+
+            # ユーザーとチャンネルの両方に cost 分の余裕がある場合のみトークンを消費する
+            # （チャンネルの上限で待たせたリクエストがユーザーのトークンを消費しないように）。
+            # バケットの容量を超える cost（件数の多い一括処理）は上限内にならず、順番待ちとなる
+            buckets = self._buckets(user_id, channel_id)
+            within_limit = all(cost <= bucket.capacity and bucket.available >= cost for bucket in buckets)
+            if within_limit:
+                for bucket in buckets:
+                    bucket.charge(cost)
+
+            flow = self._flows.get(user_id)
+            pending = flow.pending if flow is not None else 0
+            wait = 0.0 if within_limit else max(self._wait_time(bucket, cost) for bucket in buckets)
+            if not within_limit and pending >= self.max_queued:
+                self._stats[REJECTED] += 1
+                return Admission(REJECTED, queued=pending, retry_after=wait)
+
+            if flow is None:
+                flow = self._flows[user_id] = _Flow()
+            # 重み付き公平キュー: ユーザーの前のリクエストの終了後から、重みに反比例する時間を加えた仮想終了時刻
+            start = max(self._virtual_time, flow.finish)
+            flow.finish = start + cost / weight
+            flow.pending += 1
+
+            future = Future()
+            job = (flow.finish, next(self._sequence), user_id, func, future)
+            if within_limit:
+                heapq.heappush(self._queue, job)
+            else:
+                # トークンを支払えるまで実行の対象にしない
+                heapq.heappush(self._deferred, (self.clock() + wait, job, channel_id, cost))
+            status = ADMITTED if within_limit else QUEUED
+            self._stats[status] += 1
+            self._condition.notify()
+            return Admission(status, future, queued=flow.pending)
+
+    def _release_deferred(self):
+        """
+        順番待ちのリクエストのうち、トークンを支払えるものを実行の対象に移す（呼び出し元で _condition を保持）
+
+        Returns:
+            float: 次に確認する時刻までの秒数（順番待ちがない場合はNone）
+        """
+        now = self.clock()
+        retry = []
+        while self._deferred and self._deferred[0][0] <= now:
+            _, job, channel_id, cost = heapq.heappop(self._deferred)
+            buckets = self._buckets(job[2], channel_id)
+            wait = max(self._wait_time(bucket, cost) for bucket in buckets)
+            if wait > 0:
+                # 他のリクエストが先にトークンを消費した場合は、補充されるまで待つ
+                retry.append((now + wait, job, channel_id, cost))
+                continue
+            for bucket in buckets:
+                bucket.charge(cost)
+            heapq.heappush(self._queue, job)
+        for entry in retry:
+            heapq.heappush(self._deferred, entry)
+        if not self._deferred or self._deferred[0][0] == float('inf'):
+            return None
+        return self._deferred[0][0] - now
+
+    def _next_job(self):
+        """
+        実行できるリクエストのうち、仮想終了時刻の最も小さいものを取り出す（停止された場合はNone）
+
+        停止後は順番待ちのリクエストもトークンを待たずに実行する。
+        """
+        with self._condition:
+            while True:
+                timeout = self._release_deferred()
+                if self._stopped and self._deferred:
+                    for _, job, _, _ in self._deferred:
+                        heapq.heappush(self._queue, job)
+                    self._deferred = []
+                if self._queue:
+                    break
+                if self._stopped:
+                    return None
+                self._condition.wait(timeout)
+            finish, _, user_id, func, future = heapq.heappop(self._queue)
+            self._virtual_time = max(self._virtual_time, finish)
+            self._running += 1
+            return user_id, func, future
+
+    def _work(self):
+        """
+        ワーカースレッドの処理
+        """
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            user_id, func, future = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func())
+                        succeeded = True
+                    except Exception as e:
+                        print(f"リクエストの処理エラー: {e}")
+                        future.set_exception(e)
+                        succeeded = False
+                    with self._condition:
+                        self._stats['completed' if succeeded else 'failed'] += 1
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    flow = self._flows.get(user_id)
+                    if flow is not None:
+                        flow.pending -= 1
+                        if flow.pending <= 0:
+                            del self._flows[user_id]
+
+    def metrics(self):
+        """
+        受付と処理の統計情報
+
+        Returns:
+            dict: {'queued'（処理待ち）, 'waiting_for_tokens'（うちトークンの補充待ち）, 'running',
+                   'users'（処理待ちのユーザー数）, 'admitted', 'queued_over_limit', 'rejected', 'completed', 'failed'}
+        """
+        with self._condition:
+            return {
+                'queued': len(self._queue) + len(self._deferred),
+                'waiting_for_tokens': len(self._deferred),
+                'running': self._running,
+                'users': len(self._flows),
+                'admitted': self._stats[ADMITTED],
+                'queued_over_limit': self._stats[QUEUED],
+                'rejected': self._stats[REJECTED],
+                'completed': self._stats['completed'],
+                'failed': self._stats['failed'],
+            }
+
+    def shutdown(self, wait=True):
+        """
+        新しいリクエストの受付を停止（処理待ちのリクエストは実行してから終了する）
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -1,15 +1,396 @@
 import os
 import re
+import threading
+import time
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-from google_sheets_handler_advanced import advanced_search_in_target_spreadsheet
-from software_research import research_and_suggest_software
+from admission_control import QUEUED, REJECTED, WEIGHT_BATCH, AdmissionController
+from cache_backend import InProcessCacheBackend, get_cache
+from column_filter import FILTER_FIELDS, describe_filters, parse_query
+from federated_search import FederatedSearch
+from google_sheets_handler_advanced import SHEETS_WRITE_MODE, GoogleSheetsHandlerAdvanced
+from research_jobs import NegativeCache, ResearchRegistry
+from research_scheduler import get_research_scheduler
+from result_cursor import ResultCursorStore, first_page
+from sheet_writer import SheetWriteQueue
+from snapshot_diff import SnapshotChangeLog
+from snapshot_refresher import source_refreshers
+from software_research import invalidate_research_cache, research_and_suggest_software
+from spreadsheet_sources import load_sources, primary_spreadsheet
 
 # ボットトークンを渡してアプリを初期化します
 app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
 
+# プロセス内で共有するGoogle Sheetsハンドラー（スレッドセーフ）
+_sheets_handler = None
+_sheets_handler_lock = threading.Lock()
+
+
+def get_sheets_handler():
+    """
+    共有のGoogle Sheetsハンドラーを取得（初回のみ作成）
+    """
+    global _sheets_handler
+    with _sheets_handler_lock:
+        if _sheets_handler is None:
+            credentials_path = os.environ.get("GOOGLE_CREDENTIALS_PATH", "google_service_account.json")
+            _sheets_handler = GoogleSheetsHandlerAdvanced(credentials_path)
+        return _sheets_handler
+
+
+# 検索対象のスプレッドシート（ソース）ごとに、スナップショットをバックグラウンドで更新
+# （保存済みのスナップショットで起動直後から応答する）
+sources = load_sources()
+snapshot_refreshers = source_refreshers(get_sheets_handler, sources, cache=get_cache())
+
+# スナップショットがない間の直接検索の結果をキャッシュする期間（秒）
+LIVE_SEARCH_CACHE_TTL = 60
+
+
+def live_search(spreadsheet_name, search_text, search_types, limit):
+    """
+    スナップショットがまだないスプレッドシートを直接検索
+    """
+    # 直接検索の結果はレプリカ間で共有し、同じ検索でGoogle APIを繰り返し呼び出さない
+    cache_key = f"search:{spreadsheet_name}:{','.join(search_types)}:{limit}:{search_text}"
+    result = get_cache().get_json(cache_key)
+    if result is None:
+        result = get_sheets_handler().advanced_search_in_spreadsheet(spreadsheet_name, search_text, search_types, limit=limit)
+        if not result.get('error'):
+            get_cache().set_json(cache_key, result, LIVE_SEARCH_CACHE_TTL)
+    return result
+
+
+# 検索結果として表示する件数（揃った時点でコストの高い検索タイプを省略する）
+DISPLAYED_MATCHES = 3
+
+# 全ソースを並列に検索し、出典付きで結果を統合
+federated_search = FederatedSearch(sources, snapshot_refreshers, live_search=live_search)
+
+
+# スナップショットの差し替え時に前のバージョンとの行単位の差分を記録し、
+# 変更された行に関係するキャッシュのみを無効にする（調査結果は変更された名前のものを削除）
+snapshot_changes = SnapshotChangeLog([source['name'] for source in sources])
+for source in sources:
+    snapshot_refreshers[source['name']].add_listener(
+        snapshot_changes.listener(
+            source['name'],
+            on_diff=lambda diff: invalidate_research_cache(diff.changed_names)
+        )
+    )
+
+# 「見つからなかった」結果のキャッシュ（変更が影響しない間はバージョンをまたいで参照）と、実行中のソフトウェア調査
+# （プロセス間で共有するキャッシュの場合は、別のワーカーで調査中のソフトウェアも調査を1回にまとめる）
+negative_cache = NegativeCache(get_cache(), change_log=snapshot_changes)
+research_registry = ResearchRegistry(cache=get_cache())
+
+# 書き込みモードで、調査結果の追加を承認できるユーザー（SlackのユーザーIDのカンマ区切り）
+SHEETS_WRITE_ADMINS = {user_id.strip() for user_id in os.environ.get("SHEETS_WRITE_ADMINS", "").split(',') if user_id.strip()}
+
+
+def listed_rows(software_name):
+    """
+    追加先のリストでソフトウェア名が完全一致する行（公開中のスナップショットで確認し、Google APIは呼び出さない）
+
+    Returns:
+        list: [(シート名, 行番号)]（スナップショットがまだない場合はNone）
+    """
+    result = snapshot_refreshers[primary_spreadsheet()].search(software_name, ['exact'], limit=1)
+    if result is None:
+        return None
+    return [(match['sheet'], match['row']) for match in result.get('matches', []) if 'sheet' in match and 'row' in match]
+
+
+def is_listed(software_name):
+    """
+    ソフトウェア名が追加先のリストに登録済みか（公開中のスナップショットで完全一致を確認）
+    """
+    return bool(listed_rows(software_name))
+
+
+# 承認された調査結果の行を一定間隔でまとめて追加し（承認の件数によらず1回のAPI呼び出し）、
+# 追加した行は全件を再取得せずに追加先のスナップショットと索引へ反映する
+sheet_writes = SheetWriteQueue(
+    get_sheets_handler,
+    primary_spreadsheet(),
+    cache=get_cache(),
+    is_listed=is_listed,
+    on_written=snapshot_refreshers[primary_spreadsheet()].apply_appended
+)
+
+
+def approve_software(software_names, user_id, respond, proposal_ids=()):
+    """
+    調査結果の追加を承認して書き込みキューに追加し、書き込みの完了後に結果を応答
+
+    Args:
+        software_names (list): 承認するソフトウェア名（/approve コマンド）
+        user_id (str): 承認したSlackのユーザーID
+        respond (callable): 応答を送信する関数
+        proposal_ids (list): 承認する追加案のID（承認ボタン）
+    """
+    if not SHEETS_WRITE_MODE:
+        respond(text="書き込みモードが有効ではないため、リストに追加できません。", replace_original=False)
+        return
+    if user_id not in SHEETS_WRITE_ADMINS:
+        respond(text="リストへの追加を承認する権限がありません。", replace_original=False)
+        return
+
+    def report(done):
+        # 書き込みに失敗した場合も、承認したユーザーに結果を伝える
+        try:
+            message = done.result()['message']
+        except Exception as e:
+            print(f"リストへの追加エラー: {e}")
+            message = "リストへの追加中にエラーが発生しました。もう一度承認してください。"
+        respond(text=message, replace_original=False)
+
+    approvals = [(f"'{software_name}'の", sheet_writes.approve(software_name)) for software_name in software_names]
+    approvals += [("この", sheet_writes.approve_proposal(proposal_id)) for proposal_id in proposal_ids]
+    for label, future in approvals:
+        if future is None:
+            respond(text=f"{label}追加案が見つかりません。もう一度調査してください。", replace_original=False)
+            continue
+        future.add_done_callback(report)
+    if sheet_writes.pending():
+        respond(text=f"承認しました。{sheet_writes.pending()}件の追加を待っています...", replace_original=False)
+
+
+# ユーザー・チャンネルごとの受付制御（上限を超えたリクエストは順番待ちまたは再試行を依頼し、
+# 処理の順序は重み付き公平キューで決める）
+admission = AdmissionController()
+
+
+def admit(user_id, channel_id, func, say, weight=1.0, cost=1):
+    """
+    リクエストを受付制御に通して実行（順番待ち・受付不可の場合はその旨を応答）
+
+    Args:
+        user_id (str): SlackのユーザーID
+        channel_id (str): SlackのチャンネルID
+        func (callable): 引数なしで呼び出す処理
+        say (callable): 応答を送信する関数
+        weight (float): 公平キューでの重み（一括処理は WEIGHT_BATCH）
+        cost (float): 消費するトークン数（一括処理は件数）
+    """
+    result = admission.submit(user_id, channel_id, func, weight=weight, cost=cost)
+    if result.status == REJECTED:
+        say(f"リクエストが集中しているため受け付けられませんでした。{max(1, round(result.retry_after))}秒ほど待ってから再度お試しください。")
+    elif result.status == QUEUED:
+        say(f"リクエストが集中しているため、順番に処理します（あなたの処理待ち: {result.queued}件）...")
+
+
+# ソフトウェア調査の結果を待つ最大秒数（OpenAI APIの呼び出しの期限にもなる）
+RESEARCH_TIMEOUT = 120
+
+
+def search_software(search_text, search_types, limit=DISPLAYED_MATCHES, stop_after=None):
+    """
+    全ソースのスナップショット（ない場合はスプレッドシートを直接）を並列に検索
+    
+    同じスナップショットで見つからなかったことが記録されている場合は検索を省略し、
+    'negative_cached': True を返す。stop_after 件の結果が揃った時点でコストの高い検索タイプを省略し、
+    実行した検索タイプの結果のみを limit 件まで返す。
+    """
+    versions = federated_search.snapshot_versions()
+    if negative_cache.contains(search_text, versions):
+        return {
+            'found': False,
+            'message': f"'{search_text}'は見つかりませんでした",
+            'matches': [],
+            'negative_cached': True
+        }
+    return federated_search.search(search_text, search_types, limit=limit, stop_after=stop_after)
+
+
+# Google APIの障害中に、最後に取得できたスナップショットで応答する場合の注記
+STALE_NOTICE = "⚠️ Google Sheetsに接続できないため、最後に取得したデータで検索しています。最新の情報は接続の回復後に再度お試しください。"
+
+
+def incomplete_notice(result):
+    """
+    一部のソースを検索できなかった場合の注記
+    """
+    return f"⚠️ 次のリストは検索できませんでした: {', '.join(result['failed_sources'])}"
+
+
+# メンションの検索で取得する件数（表示しきれない結果はカーソルに保存し、ボタンでページを切り替えて表示）
+BROWSABLE_MATCHES = 30
+
+# 検索結果の全件をページ単位で表示するためのカーソル（期限付き、件数の上限を超えるとLRUで削除）。
+# 「次のページ」の操作は別のワーカーが受け取り得るため、プロセス間で共有するキャッシュがあればそこに保存する
+result_cursors = ResultCursorStore(
+    cache=None if isinstance(get_cache(), InProcessCacheBackend) else get_cache()
+)
+
+
+def result_page_message(result_page, cursor_id=None):
+    """
+    検索結果の1ページ分のメッセージ（前後のページのボタン付き）を作成
+
+    Args:
+        result_page (dict): ResultCursorStore.page() の戻り値
+        cursor_id (str): カーソルID（Noneの場合はボタンを表示しない）
+
+    Returns:
+        dict: say() / respond() に渡す {'text', 'blocks'}
+    """
+    end = result_page['start'] + len(result_page['matches']) - 1
+    response = f"「{result_page['query']}」の検索結果（{result_page['total']}件中 {result_page['start']}-{end}件目）:\n\n"
+    for i, match in enumerate(result_page['matches'], result_page['start']):
+        response += f"{i}. {match['text'][:100]}{'...' if len(match['text']) > 100 else ''}\n"
+        if len(sources) > 1:
+            response += f"   リスト: {match['source']}\n"
+        response += f"   位置: {match['position']}\n\n"
+    
+    if result_page['stale']:
+        response += STALE_NOTICE
+    if result_page['failed_sources']:
+        response += incomplete_notice(result_page)
+    
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": response}}]
+    buttons = []
+    if cursor_id is not None and result_page['page'] > 0:
+        buttons.append({
+            "type": "button",
+            "text": {"type": "plain_text", "text": "前のページ"},
+            "action_id": "result_page_prev",
+            "value": f"{cursor_id}:{result_page['page'] - 1}"
+        })
+    if cursor_id is not None and result_page['page'] < result_page['pages'] - 1:
+        buttons.append({
+            "type": "button",
+            "text": {"type": "plain_text", "text": "次のページ"},
+            "action_id": "result_page_next",
+            "value": f"{cursor_id}:{result_page['page'] + 1}"
+        })
+    if buttons:
+        blocks.append({"type": "actions", "elements": buttons})
+    return {'text': response, 'blocks': blocks}
+
+
+# 「Xのようなツール」の検索（例: 'like:Zoom'）
+SIMILAR_QUERY = re.compile(r'^(?:like|similar|類似)[:：]\s*(.+)$', re.IGNORECASE)
+
+
+def similar_search_response(software_name):
+    """
+    ソフトウェア名とカテゴリが近いソフトウェアを類似検索（TF-IDF）で探して応答を作成
+
+    Args:
+        software_name (str): 基準にするソフトウェア名
+
+    Returns:
+        str: 応答メッセージ
+    """
+    # 基準のソフトウェア自身が含まれるため1件多く取得する
+    result = federated_search.search(software_name, ['tfidf'], limit=DISPLAYED_MATCHES + 1)
+    if result.get('error'):
+        return f"「{software_name}」に似たソフトウェアを検索できませんでした: {result['message']}"
+    
+    matches = [match for match in result['matches'] if match['text'].lower() != software_name.lower()][:DISPLAYED_MATCHES]
+    if not matches:
+        response = f"「{software_name}」に似たソフトウェアは見つかりませんでした。\n"
+    else:
+        response = f"「{software_name}」に似たソフトウェア:\n\n"
+        for i, match in enumerate(matches, 1):
+            response += f"{i}. {match['text'][:100]}{'...' if len(match['text']) > 100 else ''}（類似度 {match['score']}）\n"
+            if len(sources) > 1:
+                response += f"   リスト: {match['source']}\n"
+            response += f"   位置: {match['position']}\n\n"
+    
+    if result.get('stale'):
+        response += STALE_NOTICE
+    if result.get('incomplete'):
+        response += incomplete_notice(result)
+    return response
+
+
+# 列のフィルター付きの検索で表示する件数
+DISPLAYED_FILTER_MATCHES = 10
+
+
+def filtered_search_response(query, search_text, filters):
+    """
+    列のフィルター付きの検索（例: 'platform:Mac commercial:yes editor'）を実行して応答を作成
+
+    Args:
+        query (str): メンションのテキスト
+        search_text (str): フィルター以外の検索テキスト（空の場合はフィルターのみ）
+        filters (list): [(フィルター名, 値)]
+
+    Returns:
+        str: 応答メッセージ
+    """
+    result = federated_search.search(search_text, ['exact', 'partial', 'fuzzy'], limit=DISPLAYED_FILTER_MATCHES, filters=filters)
+    if result.get('error'):
+        return f"「{query}」を検索できませんでした: {result['message']}"
+    
+    if not result['found']:
+        response = f"条件（{describe_filters(filters)}）に一致するソフトウェアは見つかりませんでした。\n"
+    else:
+        response = f"「{query}」の検索結果（上位{len(result['matches'])}件）:\n\n"
+        for i, match in enumerate(result['matches'], 1):
+            row_data = match.get('row_data', [])
+            response += f"{i}. {match['text'][:100]}{'...' if len(match['text']) > 100 else ''}\n"
+            details = [
+                f"{field}: {row_data[column][:50]}"
+                for field, column in FILTER_FIELDS.items() if column < len(row_data) and row_data[column]
+            ]
+            if details:
+                response += f"   {' / '.join(details)}\n"
+            if len(sources) > 1:
+                response += f"   リスト: {match['source']}\n"
+            response += f"   位置: {match['position']}\n\n"
+    
+    if result.get('stale'):
+        response += STALE_NOTICE
+    if result.get('incomplete'):
+        response += incomplete_notice(result)
+    return response
+
+
+# ソフトウェア名の入力補完で表示する候補の件数（Slackの external_select は最大100件）
+DISPLAYED_COMPLETIONS = 20
+
+# Slackの選択肢の表示テキスト・値の最大文字数
+OPTION_TEXT_LIMIT = 75
+OPTION_VALUE_LIMIT = 150
+
+
+def picked_software_response(software_name):
+    """
+    入力補完で選択されたソフトウェアを検索して応答を作成
+
+    Args:
+        software_name (str): 選択されたソフトウェア名
+
+    Returns:
+        str: 応答メッセージ
+    """
+    result = search_software(software_name, ['exact', 'partial'])
+    if result.get('error'):
+        return f"「{software_name}」を検索できませんでした: {result['message']}"
+    if not result['found']:
+        # 補完の候補の作成後にリストが更新された場合
+        return f"「{software_name}」は見つかりませんでした。リストが更新された可能性があります。"
+
+    response = f"「{software_name}」の検索結果:\n\n"
+    for i, match in enumerate(result['matches'][:DISPLAYED_MATCHES], 1):
+        response += f"{i}. {match['text'][:100]}{'...' if len(match['text']) > 100 else ''}\n"
+        if len(sources) > 1:
+            response += f"   リスト: {match['source']}\n"
+        response += f"   位置: {match['position']}\n\n"
+
+    if result.get('stale'):
+        response += STALE_NOTICE
+    if result.get('incomplete'):
+        response += incomplete_notice(result)
+    return response
+
+
 # 'こんにちは' を含むメッセージをリッスンします
 @app.message("こんにちは")
 def message_hello(message, say):
@@ -36,15 +417,88 @@ def action_button_click(body, ack, say):
     # チャンネルにメッセージを投稿します
     say(f"<@{body['user']['id']}> さんがボタンをクリックしました！")
 
+# 検索結果の前後のページを表示します（保存した結果を切り出すのみで、検索は再実行しない）
+@app.action(re.compile(r'^result_page_(prev|next)$'))
+def show_result_page(ack, body, respond):
+    ack()
+    cursor_id, page = body['actions'][0]['value'].rsplit(':', 1)
+    result_page = result_cursors.page(cursor_id, int(page), DISPLAYED_MATCHES)
+    if result_page is None:
+        respond(text="検索結果の表示期限が切れました。もう一度検索してください。", replace_original=False)
+        return
+    respond(replace_original=True, **result_page_message(result_page, cursor_id))
+
+# /software コマンドで、ソフトウェア名を入力補完で選択できるメニューを表示します
+@app.command("/software")
+def open_software_picker(ack, respond):
+    ack()
+    respond(
+        blocks=[
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": "ソフトウェア名を入力して選択してください"},
+                "accessory": {
+                    "type": "external_select",
+                    "action_id": "software_picker",
+                    "placeholder": {"type": "plain_text", "text": "ソフトウェア名"},
+                    "min_query_length": 1
+                }
+            }
+        ],
+        text="ソフトウェア名を入力して選択してください",
+    )
+
+# 入力のたびに補完の候補を返します（Slackの応答期限内に返すため、メモリ上のスナップショットのみ参照）
+@app.options("software_picker")
+def software_picker_options(ack, payload):
+    names = federated_search.complete(payload.get('value', ''), DISPLAYED_COMPLETIONS)
+    ack(options=[
+        {"text": {"type": "plain_text", "text": name[:OPTION_TEXT_LIMIT]}, "value": name[:OPTION_VALUE_LIMIT]}
+        for name in names
+    ])
+
+# 補完の候補が選択されたら、そのソフトウェアの検索結果を返します
+@app.action("software_picker")
+def software_picked(ack, body, respond):
+    ack()
+    software_name = body['actions'][0]['selected_option']['value']
+    respond(picked_software_response(software_name))
+
+# 調査結果の追加を承認します（書き込みモードの管理者のみ、次回の書き込みでまとめて追加）
+@app.action("approve_software")
+def approve_software_button(ack, body, respond):
+    ack()
+    approve_software([], body['user']['id'], respond, proposal_ids=[body['actions'][0]['value']])
+
+# /approve コマンドで、複数の調査結果の追加をまとめて承認します（例: /approve Zoom, Slack）
+# 一括処理として件数分のトークンを消費し、対話的なリクエストより低い重みで処理します
+@app.command("/approve")
+def approve_software_command(ack, command, respond):
+    ack()
+    software_names = [name.strip() for name in command.get('text', '').split(',') if name.strip()]
+    if not software_names:
+        respond(text="承認するソフトウェア名をカンマ区切りで指定してください（例: /approve Zoom, Slack）")
+        return
+    admit(
+        command['user_id'], command.get('channel_id'),
+        lambda: approve_software(software_names, command['user_id'], respond),
+        lambda text: respond(text=text, replace_original=False),
+        weight=WEIGHT_BATCH, cost=len(software_names)
+    )
+
 # 一般的なメッセージイベントを処理（未処理のイベントを防ぐため）
 @app.event("message")
 def handle_message_events(body, logger):
     # 一般的なメッセージは特に処理しない（ログのみ）
     logger.info("メッセージイベントを受信しました")
 
-# Botがメンションされたときの処理
+# Botがメンションされたときの処理（ユーザー・チャンネルごとの受付制御を通してワーカーで実行）
 @app.event("app_mention")
 def handle_app_mention(event, say):
+    admit(event.get('user'), event.get('channel'), lambda: process_app_mention(event, say), say)
+
+
+def process_app_mention(event, say):
     try:
         # メンションされたメッセージからテキストを抽出
         text = event.get('text', '')
@@ -53,27 +507,68 @@ def handle_app_mention(event, say):
         # <@U...> の形式のメンションを除去
         clean_text = re.sub(r'<@[A-Z0-9]+>', '', text).strip()
         
-        if clean_text:
-            # Google Spreadsheetで部分一致検索を実行（4行目以降のみ）
-            result = advanced_search_in_target_spreadsheet(clean_text, search_types=['partial'])
+        search_text, filters = parse_query(clean_text)
+        similar = SIMILAR_QUERY.match(clean_text)
+        if similar:
+            # 似ているソフトウェアの一覧を返す（調査は実行しない）
+            say(similar_search_response(similar.group(1).strip()))
+        elif filters:
+            # 列のフィルター付きの検索は条件に一致する一覧を返す（見つからない場合も調査は実行しない）
+            say(filtered_search_response(clean_text, search_text, filters))
+        elif clean_text:
+            # Google Spreadsheetで完全一致 → 部分一致 → あいまい検索の順に検索（4行目以降のみ）
+            # 表示する件数が揃った時点で以降の検索を省略し、それまでに見つかった結果をページ送り用に保存する
+            result = search_software(clean_text, ['exact', 'partial', 'fuzzy'], limit=BROWSABLE_MATCHES,
+                                     stop_after=DISPLAYED_MATCHES)
             
             if result['found']:
-                # 検索結果が見つかった場合
-                response = f"「{clean_text}」の検索結果:\n{result['message']}\n\n"
-                
-                # 上位3件の結果を表示
-                for i, match in enumerate(result['matches'][:3], 1):
+                # 検索結果が見つかった場合は上位3件を表示し、表示しきれない場合は全件をカーソルに保存してボタンで表示
+                if len(result['matches']) > DISPLAYED_MATCHES:
+                    cursor_id = result_cursors.put(clean_text, result)
+                    say(**result_page_message(result_cursors.page(cursor_id, 0, DISPLAYED_MATCHES), cursor_id))
+                else:
+                    say(**result_page_message(first_page(clean_text, result, DISPLAYED_MATCHES)))
+            elif result.get('error'):
+                # 検索自体が失敗した場合は「見つからない」と扱わず、調査も実行しない
+                say(f"「{clean_text}」を検索できませんでした: {result['message']}")
+            elif result.get('stale'):
+                # 最新のデータを確認できない場合は、未登録と判断せず調査も実行しない
+                say(f"「{clean_text}」は見つかりませんでした。\n{STALE_NOTICE}")
+            elif result.get('incomplete'):
+                # 検索できなかったリストに登録されている可能性があるため、調査は実行しない
+                say(f"「{clean_text}」は見つかりませんでした。\n{incomplete_notice(result)}")
+            elif not result.get('negative_cached') and (suggestions := federated_search.suggest(clean_text, DISPLAYED_MATCHES)):
+                # 表記ゆれ・略称で近いソフトウェアがある場合は提示し、調査は実行しない
+                response = f"「{clean_text}」は見つかりませんでした。もしかして:\n\n"
+                for i, match in enumerate(suggestions, 1):
                     response += f"{i}. {match['text'][:100]}{'...' if len(match['text']) > 100 else ''}\n"
+                    if len(sources) > 1:
+                        response += f"   リスト: {match['source']}\n"
                     response += f"   位置: {match['position']}\n\n"
-                
+                response += "目的のソフトウェアでない場合は、正式な名称で再度お試しください。"
                 say(response)
             else:
-                # 検索結果が見つからなかった場合、ソフトウェア調査を実行
-                say(f"「{clean_text}」は見つかりませんでした。調査を開始します...")
+                # 近いソフトウェアもない場合のみ、ソフトウェア調査を実行
+                if not result.get('negative_cached'):
+                    negative_cache.add(clean_text, result.get('snapshot_versions'))
+                
+                # 同じソフトウェアの調査が実行中の場合は、その結果を共有する
+                # 期限は応答を待つ時間と揃え、OpenAI APIの呼び出しまで伝える
+                deadline = time.monotonic() + RESEARCH_TIMEOUT
+                future, started = research_registry.submit(
+                    clean_text, lambda: research_and_suggest_software(clean_text, deadline=deadline, find_listed=listed_rows)
+                )
+                if started:
+                    # OpenAI APIの呼び出しが混み合っている場合は待ち件数を伝える
+                    queued = get_research_scheduler().metrics()['queued']
+                    waiting = f"（調査待ち: {queued}件）" if queued else ""
+                    say(f"「{clean_text}」は見つかりませんでした。調査を開始します{waiting}...")
+                else:
+                    say(f"「{clean_text}」は見つかりませんでした。同じソフトウェアの調査が進行中のため、その結果をお知らせします...")
                 
                 try:
                     # ChatGPT APIを使用してソフトウェア情報を調査
-                    research_result = research_and_suggest_software(clean_text)
+                    research_result = future.result(timeout=RESEARCH_TIMEOUT)
                     
                     if research_result['research']:
                         # 調査結果を整形して表示
@@ -94,7 +589,29 @@ def handle_app_mention(event, say):
                         else:
                             response += f"❌ リスト追加提案でエラーが発生しました: {add_suggestion['message']}"
                         
-                        say(response)
+                        # 書き込みモードでは追加案を保存し、管理者が承認するボタンを表示
+                        # （ボタンの値はソフトウェア名ではなく追加案のIDとし、長い名前でも切り詰めない）
+                        proposal_id = None
+                        if SHEETS_WRITE_MODE and add_suggestion['success']:
+                            proposal_id = sheet_writes.propose(add_suggestion['data'])
+                        if proposal_id:
+                            say(
+                                blocks=[
+                                    {"type": "section", "text": {"type": "mrkdwn", "text": response}},
+                                    {
+                                        "type": "actions",
+                                        "elements": [{
+                                            "type": "button",
+                                            "text": {"type": "plain_text", "text": "承認してリストに追加"},
+                                            "action_id": "approve_software",
+                                            "value": proposal_id
+                                        }]
+                                    }
+                                ],
+                                text=response,
+                            )
+                        else:
+                            say(response)
                     else:
                         say(f"「{clean_text}」の調査中にエラーが発生しました。")
                         
@@ -110,5 +627,10 @@ def handle_app_mention(event, say):
         say("検索中にエラーが発生しました")
 
 if __name__ == "__main__":
+    # 保存済みのスナップショットを読み込み、全ソースのバックグラウンドでの更新を開始
+    federated_search.start()
+    if SHEETS_WRITE_MODE:
+        sheet_writes.start()
+    
     # アプリを起動して、ソケットモードで Slack に接続します
     SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
@@ -0,0 +1,173 @@
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+
+from snapshot_index import sorted_position
+
+# BM25のパラメータ（単語の出現回数の飽和、文書長による正規化の強さ）
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 英数字の語と、それ以外の文字（日本語など）の連続
+_TOKEN_RUNS = re.compile(r'[0-9a-z]+|(?:(?![\x00-\x7f])\w)+')
+
+
+def tokenize(text):
+    """
+    テキストを検索用の語に分割（英数字は単語、日本語などは文字バイグラム）
+
+    Args:
+        text (str): テキスト
+
+    Returns:
+        list: 語のリスト（例: 'Web会議ツール' → ['web', '会議', '議ツ', 'ツー', 'ール']）
+    """
+    tokens = []
+    for run in _TOKEN_RUNS.findall(unicodedata.normalize('NFKC', text).casefold()):
+        if run.isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    __slots__ = ('terms', 'starts', 'rows', 'impacts', 'max_impacts', 'row_count')
+
+    def __init__(self, terms, starts, rows, impacts, max_impacts, row_count):
+        """
+        行全体（複数の列）を1つの文書とするBM25の転置索引
+
+        語ごとの行と、その行でのBM25のスコア（寄与）を事前に計算して保持する。
+        配列のみで構成するため、保存したファイルをmmapしてそのまま参照できる。
+
+        Args:
+            terms: ソート済みの語のシーケンス（位置が語の番号）
+            starts, rows: 語ごとの行インデックス（CSR形式）
+            impacts: rows と同じ並びの、語がその行のスコアに寄与する値（array('f')）
+            max_impacts: 語ごとの寄与の最大値（検索時の枝刈り用）
+            row_count (int): 行数
+        """
+        self.terms = terms
+        self.starts = starts
+        self.rows = rows
+        self.impacts = impacts
+        self.max_impacts = max_impacts
+        self.row_count = row_count
+
+    @classmethod
+    def build(cls, snapshot, columns=None, k1=BM25_K1, b=BM25_B):
+        """
+        スナップショットから索引を作成
+
+        各列の文字列プール（重複なし）を1回ずつ語に分割し、行ごとの語の出現回数を集計する。
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            columns (list): 文書に含める列インデックス。Noneの場合は全列
+            k1 (float): BM25のk1
+            b (float): BM25のb
+
+        Returns:
+            BM25Index: 索引
+        """
+        row_count = len(snapshot)
+        lengths = array('I', bytes(4 * row_count))
+        postings = {}
+
+        for column in (range(snapshot.width) if columns is None else columns):
+            cells = snapshot.column_ids(column)
+            if cells is None:
+                continue
+            pool = snapshot.column_pool(column)
+            tokens_by_id = [None]
+            for string_id in range(1, len(pool)):
+                counts = {}
+                for token in tokenize(pool[string_id]):
+                    counts[token] = counts.get(token, 0) + 1
+                tokens_by_id.append(counts)
+
+            for row, string_id in enumerate(cells):
+                if not string_id:
+                    continue
+                counts = tokens_by_id[string_id]
+                for token, count in counts.items():
+                    # 同じ行の複数の列に出現した場合は出現回数を合計する
+                    frequencies = postings.setdefault(token, {})
+                    frequencies[row] = frequencies.get(row, 0) + count
+                    lengths[row] += count
+
+        average_length = (sum(lengths) / row_count) if row_count else 0.0
+        terms = sorted(postings)
+        starts = array('I', [0])
+        rows = array('I')
+        impacts = array('f')
+        max_impacts = array('f')
+        for token in terms:
+            frequencies = postings[token]
+            idf = math.log(1 + (row_count - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+            best = 0.0
+            for row in sorted(frequencies):
+                frequency = frequencies[row]
+                norm = k1 * (1 - b + b * lengths[row] / average_length) if average_length else k1
+                impact = idf * frequency * (k1 + 1) / (frequency + norm)
+                rows.append(row)
+                impacts.append(impact)
+                best = max(best, impact)
+            max_impacts.append(best)
+            starts.append(len(rows))
+
+        return cls(terms, starts, rows, impacts, max_impacts, row_count)
+
+    def term_id(self, token):
+        """
+        語の番号（索引にない語はNone）
+        """
+        return sorted_position(self.terms, token)
+
+    def search(self, text, limit=10):
+        """
+        検索テキストとの関連度（BM25）が高い行を取得
+
+        語の寄与の最大値を使って枝刈りする（MaxScore）。寄与の大きい語から順に処理し、
+        残りの語の寄与の最大値の合計が現在の上位 limit 件目のスコアに届かなくなった時点で、
+        それ以降の語では新しい行を候補に加えず、候補の行のスコアのみ加算する。
+
+        Args:
+            text (str): 検索テキスト
+            limit (int): 取得する件数
+
+        Returns:
+            tuple: ([(行インデックス, スコア)] スコアの高い順, 検索テキストで取り得るスコアの上限)
+        """
+        term_ids = {self.term_id(token) for token in tokenize(text)} - {None}
+        if not term_ids or limit <= 0:
+            return [], 0.0
+
+        ordered = sorted(term_ids, key=lambda term_id: self.max_impacts[term_id], reverse=True)
+        upper_bound = sum(self.max_impacts[term_id] for term_id in ordered)
+        remaining = upper_bound
+        scores = {}
+        threshold = 0.0
+
+        for term_id in ordered:
+            start, end = self.starts[term_id], self.starts[term_id + 1]
+            if len(scores) >= limit and remaining < threshold:
+                # 残りの語だけでは上位に入れないため、候補の行のスコアのみ加算
+                for row, impact in zip(self.rows[start:end], self.impacts[start:end]):
+                    if row in scores:
+                        scores[row] += impact
+            else:
+                for row, impact in zip(self.rows[start:end], self.impacts[start:end]):
+                    scores[row] = scores.get(row, 0.0) + impact
+            remaining -= self.max_impacts[term_id]
+            if len(scores) >= limit:
+                threshold = heapq.nlargest(limit, scores.values())[-1]
+
+        # 同じスコアは行順
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return top, upper_bound
@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# プロセス内キャッシュに保持する値の最大数（超えた場合は最も長く参照されていないものから削除）
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+
+# 期限切れの値をまとめて削除する間隔（秒、書き込みの際に確認する）
+CACHE_SWEEP_INTERVAL = float(os.environ.get("CACHE_SWEEP_INTERVAL", "60"))
+
+
+class CacheBackend(ABC):
+    """
+    キャッシュバックエンドの共通インターフェース
+
+    値はバイト列で保存する。JSONで表現できる値は get_json() / set_json() を使用する。
+    複数のレプリカで共有するバックエンドでは add() / compare_and_set() を排他制御（リース）にも使用できる。
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """
+        値を取得
+
+        Args:
+            key (str): キー
+
+        Returns:
+            bytes: 値（存在しないか期限切れの場合はNone）
+        """
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """
+        値を保存
+
+        Args:
+            key (str): キー
+            value (bytes): 値
+            ttl (float): 有効期間（秒）。Noneの場合は無期限
+        """
+
+    @abstractmethod
+    def add(self, key, value, ttl=None):
+        """
+        キーが存在しない場合のみ値を保存
+
+        Returns:
+            bool: 保存した場合True（既に有効な値がある場合False）
+        """
+
+    @abstractmethod
+    def compare_and_set(self, key, expected, value, ttl=None):
+        """
+        現在の有効な値が expected と一致する場合のみ値を保存（確認と保存を不可分に行う）
+
+        Args:
+            key (str): キー
+            expected (bytes): 期待する現在の値
+            value (bytes): 保存する値
+            ttl (float): 有効期間（秒）。Noneの場合は無期限
+
+        Returns:
+            bool: 保存した場合True
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        値を削除
+        """
+
+    def get_json(self, key):
+        """
+        JSONとして保存した値を取得（存在しない場合はNone）
+        """
+        value = self.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def set_json(self, key, value, ttl=None):
+        """
+        値をJSONとして保存
+        """
+        self.set(key, json.dumps(value, ensure_ascii=False).encode('utf-8'), ttl)
+
+    def close(self):
+        """
+        バックエンドの資源を解放
+        """
+
+
+class InProcessCacheBackend(CacheBackend):
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, sweep_interval=CACHE_SWEEP_INTERVAL):
+        """
+        プロセス内のメモリに保存するキャッシュ（単一プロセス・テスト用）
+
+        検索テキストごとのキーが増え続けないよう、一定間隔で期限切れの値を削除し、
+        max_entries を超えた場合は最も長く参照されていない値から削除する（LRU）。
+
+        Args:
+            max_entries (int): 保持する値の最大数
+            sweep_interval (float): 期限切れの値をまとめて削除する間隔（秒）
+        """
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._entries[key]
+            return None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, ttl, now):
+        """
+        値を保存し、期限切れの削除と上限を超えた分の削除を行う（ロックを取得して呼び出す）
+        """
+        self._entries[key] = (bytes(value), now + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            for expired in [k for k, (_, expires_at) in self._entries.items()
+                            if expires_at is not None and expires_at <= now]:
+                del self._entries[expired]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl, time.time())
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            if self._live_entry(key, now) is not None:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._live_entry(key, now)
+            if entry is None or entry[0] != expected:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    def __init__(self, path, timeout=5.0, sweep_interval=CACHE_SWEEP_INTERVAL):
+        """
+        SQLiteファイルに保存するキャッシュ（同一ホストの複数レプリカで共有）
+
+        期限切れの行は読み込みの対象から外すのみのため、書き込みの際に一定間隔でまとめて削除する。
+
+        Args:
+            path (str): データベースファイルのパス
+            timeout (float): ロック待ちの最大秒数
+            sweep_interval (float): 期限切れの行をまとめて削除する間隔（秒）
+        """
+        self.path = path
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+        self._sweep_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self):
+        """
+        スレッドごとのデータベース接続を取得（初回のみ作成）
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # autocommit（isolation_level=None）で接続し、複数プロセスからの読み書きにWALを使用
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def _sweep(self, now):
+        """
+        前回から sweep_interval 秒以上経過していれば、期限切れの行を削除
+        """
+        with self._sweep_lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + self.sweep_interval
+        self._connection().execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        self._sweep(now)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), now + ttl if ttl is not None else None)
+        )
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        self._sweep(now)
+        # 期限切れの値がある場合のみ上書きする（追加と期限の確認を1文で行う）
+        cursor = self._connection().execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?",
+            (key, sqlite3.Binary(value), now + ttl if ttl is not None else None, now)
+        )
+        return cursor.rowcount == 1
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE cache SET value = ?, expires_at = ? "
+            "WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (sqlite3.Binary(value), now + ttl if ttl is not None else None, key, sqlite3.Binary(expected), now)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+# プロセス内で共有するキャッシュ
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    共有のキャッシュバックエンドを取得（初回のみ作成）
+
+    環境変数 CACHE_BACKEND で 'memory'（デフォルト）または 'sqlite' を選択し、
+    'sqlite' の場合は CACHE_PATH でデータベースファイルを指定する。
+
+    Returns:
+        CacheBackend: キャッシュバックエンド
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend = os.environ.get("CACHE_BACKEND", "memory").lower()
+            if backend == 'sqlite':
+                _cache = SQLiteCacheBackend(os.environ.get("CACHE_PATH", "bot_cache.sqlite3"))
+            elif backend == 'memory':
+                _cache = InProcessCacheBackend()
+            else:
+                raise ValueError(f"未対応のキャッシュバックエンドです: {backend}")
+        return _cache
+
+
+def cache_get_or_set_json(cache, key, factory, ttl=None):
+    """
+    JSONとして保存した値を取得し、ない場合は factory() の結果を保存して返す
+
+    Args:
+        cache (CacheBackend): キャッシュバックエンド（Noneの場合は常に factory() を呼び出す）
+        key (str): キー
+        factory (callable): 値を作成する関数（Noneを返した場合は保存しない）
+        ttl (float): 有効期間（秒）
+
+    Returns:
+        キャッシュまたは factory() の値
+    """
+    if cache is not None:
+        value = cache.get_json(key)
+        if value is not None:
+            return value
+    value = factory()
+    if cache is not None and value is not None:
+        cache.set_json(key, value, ttl)
+    return value
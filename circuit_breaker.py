@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+import httplib2
+
+from quota_governor import RETRYABLE_STATUSES, QuotaExceededError, _error_status
+
+# サーキットブレーカーの状態
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    サーキットブレーカーが開いているため、リクエストを送信しなかった場合の例外
+    """
+
+
+def is_upstream_failure(error):
+    """
+    例外が上流（Google API）の障害によるものか判定
+
+    接続エラー（httplib2の名前解決の失敗などを含む）・429/5xxと、それらのリトライ上限に達した
+    クォータ超過を障害として扱う。リクエストを送信する前にクォータを確保できなかった場合
+    （ローカルの流量制御のみ）と、権限不足や範囲指定の誤りなどの4xxは障害として扱わない。
+
+    Args:
+        error (Exception): 発生した例外
+
+    Returns:
+        bool: 障害として数える場合True
+    """
+    if isinstance(error, QuotaExceededError):
+        return error.__cause__ is not None and is_upstream_failure(error.__cause__)
+    if isinstance(error, httplib2.RelativeURIError):
+        return False
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        return True
+    return _error_status(error) in RETRYABLE_STATUSES
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, name='google'):
+        """
+        サーキットブレーカーを初期化
+
+        連続して失敗すると開いて上流への呼び出しを止め、reset_timeout 秒後に
+        1件だけ試行（半開）して、成功すれば閉じる。
+
+        Args:
+            failure_threshold (int): 開くまでの連続失敗回数
+            reset_timeout (float): 開いてから試行を許可するまでの秒数
+            name (str): ログ表示用の名前
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        現在の状態（'closed' / 'open' / 'half_open'）
+        """
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self):
+        """
+        上流を呼び出さない状態の場合True（試行待ちの半開状態を含まない）
+        """
+        return self.state == OPEN
+
+    def _before_call(self):
+        """
+        呼び出しを許可するか判定（開いている場合は CircuitOpenError）
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN:
+                remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(f"{self.name} APIへの呼び出しを停止中です（残り{remaining:.0f}秒）")
+                self._state = HALF_OPEN
+            # 半開状態では1件だけ試行し、結果が出るまで他の呼び出しは止める
+            if self._probing:
+                raise CircuitOpenError(f"{self.name} APIの復旧を確認中です")
+            self._probing = True
+
+    def record_success(self):
+        """
+        成功を記録（半開状態なら閉じる）
+        """
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"{self.name} APIの復旧を確認しました")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """
+        失敗を記録（連続失敗回数が閾値に達するか、半開状態での試行が失敗した場合は開く）
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"{self.name} APIの障害を検知したため、{self.reset_timeout:.0f}秒間呼び出しを停止します")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def call(self, func):
+        """
+        サーキットブレーカーを通して関数を実行
+
+        Args:
+            func (callable): 引数なしで呼び出す関数
+
+        Returns:
+            関数の戻り値
+
+        Raises:
+            CircuitOpenError: ブレーカーが開いている場合（関数は呼び出さない）
+        """
+        self._before_call()
+        try:
+            result = func()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                # 上流は応答しているため成功として扱う
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+# API種別ごとの共有ブレーカー（プロセス内の全ハンドラーで共有）
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(api='sheets'):
+    """
+    API種別ごとの共有CircuitBreakerを取得
+
+    閾値は環境変数 CIRCUIT_BREAKER_FAILURES / CIRCUIT_BREAKER_RESET_SECONDS で設定可能
+
+    Args:
+        api (str): API種別（'sheets' または 'drive'）
+
+    Returns:
+        CircuitBreaker: 共有ブレーカー
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(api)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=int(os.environ.get("CIRCUIT_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.environ.get("CIRCUIT_BREAKER_RESET_SECONDS", "30")),
+                name=api
+            )
+            _breakers[api] = breaker
+        return breaker
@@ -0,0 +1,337 @@
+import difflib
+import heapq
+import re
+import unicodedata
+
+from snapshot_index import ColumnIndex
+
+# フィルターに使用できる列（列の並びは add_software_to_sheet の new_row と同じ）
+FILTER_FIELDS = {
+    'category': 1,    # B: Category
+    'platform': 3,    # D: Platform
+    'remarks': 4,     # E: Remarks（承認状況）
+    'commercial': 6,  # G: Free version for commercial/corporate use
+}
+
+# フィルター名の別名
+FIELD_ALIASES = {
+    'cat': 'category', 'カテゴリ': 'category', 'カテゴリー': 'category',
+    'os': 'platform', 'プラットフォーム': 'platform',
+    'status': 'remarks', '備考': 'remarks', '状態': 'remarks',
+    'free': 'commercial', '商用': 'commercial', '商用利用': 'commercial',
+}
+
+# yes/no の値の表記ゆれ {値: (一致とみなす語, 除外する語)}
+VALUE_SYNONYMS = {
+    'yes': (('yes', 'ok', 'free', '可', '○', '無料'), ('no', 'not', '不可', '×', '有料')),
+    'no': (('no', 'not', '不可', '×', '有料'), ()),
+}
+VALUE_ALIASES = {'true': 'yes', 'はい': 'yes', 'false': 'no', 'いいえ': 'no'}
+
+# 値ごとの行のビットマップを保持する列の、値の種類数の上限（超える列は検索時に行インデックスから作成）
+MAX_BITMAP_VALUES = 64
+
+# あいまい一致とみなす類似度の閾値（0-100）
+FUZZY_THRESHOLD = 70
+
+_FILTER_TOKEN = re.compile(r'([^:：\s]+)[:：](.+)')
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text).casefold().strip()
+
+
+def resolve_field(name):
+    """
+    フィルター名（別名を含む）を FILTER_FIELDS のキーに変換（フィルター名でない場合はNone）
+    """
+    name = _normalize(name)
+    name = FIELD_ALIASES.get(name, name)
+    return name if name in FILTER_FIELDS else None
+
+
+def parse_query(text):
+    """
+    メンションのテキストを検索テキストと列のフィルターに分割
+
+    'platform:Mac commercial:yes editor' のように「フィルター名:値」の形式の語をフィルターとし、
+    それ以外の語を検索テキストとする（フィルター名でない「xxx:yyy」は検索テキストに含める）。
+
+    Args:
+        text (str): メンションのテキスト
+
+    Returns:
+        tuple: (検索テキスト, [(フィルター名, 値)])
+    """
+    words = []
+    filters = []
+    for token in text.split():
+        match = _FILTER_TOKEN.fullmatch(token)
+        field = resolve_field(match.group(1)) if match else None
+        value = match.group(2).strip('"\'「」') if match else ''
+        if field and value:
+            filters.append((field, value))
+        else:
+            words.append(token)
+    return ' '.join(words), filters
+
+
+def describe_filters(filters):
+    """
+    フィルターを表示用の文字列に変換（例: 'platform:Mac, commercial:yes'）
+    """
+    return ', '.join(f"{field}:{value}" for field, value in filters)
+
+
+def _term_pattern(term, whole_word):
+    """
+    値に語が含まれるか判定する正規表現（英数字の語は単語の先頭から一致させる）
+    """
+    if re.fullmatch(r'[a-z0-9]+', term):
+        return re.compile(r'(?<![a-z0-9])' + re.escape(term) + (r'(?![a-z0-9])' if whole_word else ''))
+    return re.compile(re.escape(term))
+
+
+def value_matcher(value):
+    """
+    フィルターの値に一致するセルの値（正規化済み）を判定する関数を作成
+
+    yes/no は表記ゆれ（可・不可・無料など）を考慮し、それ以外は値を含むセルを一致とする
+    （英数字の場合は単語の先頭から一致。'mac' は 'macOS' に一致し、'Tomac' には一致しない）。
+
+    Args:
+        value (str): フィルターの値
+
+    Returns:
+        callable: セルの値（正規化済み）を受け取り、一致する場合Trueを返す関数
+    """
+    value = _normalize(value)
+    value = VALUE_ALIASES.get(value, value)
+    if value in VALUE_SYNONYMS:
+        include, exclude = VALUE_SYNONYMS[value]
+        include = [_term_pattern(term, True) for term in include]
+        exclude = [_term_pattern(term, True) for term in exclude]
+        return lambda cell: (any(pattern.search(cell) for pattern in include)
+                             and not any(pattern.search(cell) for pattern in exclude))
+    pattern = _term_pattern(value, False)
+    return lambda cell: pattern.search(cell) is not None
+
+
+def _bitmap(rows, size):
+    """
+    行インデックスのリストをビットマップ（int、行インデックスのビットが1）に変換
+    """
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+# 1バイトの値ごとの1のビットの位置
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def iter_rows(bitmap):
+    """
+    ビットマップの1のビット（行インデックス）を昇順に列挙
+
+    バイト列に1回だけ変換してバイトごとに1のビットを列挙する（ビットごとに int を演算すると
+    ビットマップの大きさに比例する処理を1の数だけ繰り返すため）。
+    """
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, value in enumerate(data):
+        if value:
+            base = offset << 3
+            for bit in _BYTE_BITS[value]:
+                yield base + bit
+
+
+class MappedBitmaps:
+    __slots__ = ('_data', '_width')
+
+    def __init__(self, data, width):
+        """
+        保存したファイルの値ごとの行のビットマップ（文字列ID 1 から順に width バイトずつ連結したもの）
+
+        参照した値のビットマップのみ int に変換するため、読み込み時にプロセスのメモリへコピーしない。
+
+        Args:
+            data (memoryview): ビットマップを連結したバイト列
+            width (int): 1つのビットマップのバイト数
+        """
+        self._data = data
+        self._width = width
+
+    def __getitem__(self, string_id):
+        start = (string_id - 1) * self._width
+        return int.from_bytes(self._data[start:start + self._width], 'little')
+
+
+class FilterIndex:
+    __slots__ = ('row_count', 'columns')
+
+    def __init__(self, row_count, columns):
+        """
+        フィルター用の列ごとの索引
+
+        値の種類が少ない列（プラットフォーム・商用利用など）は値ごとの行のビットマップを保持し、
+        それ以外の列（カテゴリ・備考など自由記述の列）はスナップショットの索引の行インデックスの配列を参照して、
+        検索時に一致した値の行のみビットマップにする（ビットマップの合計が行数×値の種類数にならないように）。
+
+        Args:
+            row_count (int): スナップショットの行数
+            columns (dict): {列インデックス: (正規化した文字列プール,
+                                              {文字列ID: 行のビットマップ}・MappedBitmaps または ColumnIndex)}
+        """
+        self.row_count = row_count
+        self.columns = columns
+
+    @classmethod
+    def build(cls, snapshot, index, fields=FILTER_FIELDS, max_bitmap_values=MAX_BITMAP_VALUES):
+        """
+        スナップショットのフィルター対象の列から索引を作成（スナップショットごとに1回だけ作成する）
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            index (SnapshotIndex): スナップショットの索引（文字列IDごとの行を使用）
+            fields (dict): {フィルター名: 列インデックス}
+            max_bitmap_values (int): ビットマップを作成する列の値の種類数の上限
+
+        Returns:
+            FilterIndex: フィルター用の索引
+        """
+        row_count = len(snapshot)
+        columns = {}
+        for column in set(fields.values()):
+            column_index = index.column(column)
+            if column_index is None:
+                continue
+            pool = snapshot.column_pool(column)
+            values = [_normalize(pool[string_id]) for string_id in range(len(pool))]
+            if len(pool) - 1 <= max_bitmap_values:
+                rows = {
+                    string_id: _bitmap(column_index.rows(string_id), row_count)
+                    for string_id in range(1, len(pool))
+                }
+            else:
+                rows = column_index
+            columns[column] = (values, rows)
+        return cls(row_count, columns)
+
+    def match(self, field, value):
+        """
+        1つのフィルターに一致する行のビットマップ
+
+        Args:
+            field (str): フィルター名
+            value (str): フィルターの値
+
+        Returns:
+            int: 行のビットマップ
+        """
+        column = self.columns.get(FILTER_FIELDS[field])
+        if column is None:
+            return 0
+        values, rows = column
+        matches = value_matcher(value)
+        string_ids = [string_id for string_id in range(1, len(values)) if matches(values[string_id])]
+        if isinstance(rows, ColumnIndex):
+            return _bitmap((row for string_id in string_ids for row in rows.rows(string_id)), self.row_count)
+        bitmap = 0
+        for string_id in string_ids:
+            bitmap |= rows[string_id]
+        return bitmap
+
+    def evaluate(self, filters):
+        """
+        全てのフィルターに一致する行のビットマップ（同じフィルター名はOR、異なるフィルター名はAND）
+
+        Args:
+            filters (list): [(フィルター名, 値)]
+
+        Returns:
+            int: 行のビットマップ
+        """
+        by_field = {}
+        for field, value in filters:
+            by_field[field] = by_field.get(field, 0) | self.match(field, value)
+        bitmap = (1 << self.row_count) - 1
+        for bits in by_field.values():
+            bitmap &= bits
+        return bitmap
+
+
+def _text_match(name_lower, search_text_lower, search_types):
+    """
+    ソフトウェア名と検索テキストを比較（一致しない場合はNone）
+
+    Returns:
+        tuple: (検索タイプ, スコア)
+    """
+    if 'exact' in search_types and name_lower == search_text_lower:
+        return '完全一致', 100
+    if 'partial' in search_types and search_text_lower in name_lower:
+        return '部分一致', 90
+    if 'fuzzy' in search_types:
+        score = round(difflib.SequenceMatcher(None, search_text_lower, name_lower, autojunk=False).ratio() * 100)
+        if score >= FUZZY_THRESHOLD:
+            return 'あいまい一致', score
+    return None
+
+
+def filter_search(snapshot, filter_index, filters, search_text='', search_types=['exact', 'partial', 'fuzzy'], limit=10):
+    """
+    列のフィルターで行を絞り込み、残った行のソフトウェア名（1列目）を検索テキストと比較
+
+    フィルターはビットマップのAND/ORで評価し、テキストの比較は絞り込んだ行のみ行う。
+    検索テキストがない場合はフィルターに一致した全ての行を返す。
+
+    Args:
+        snapshot (SheetSnapshot): 検索対象のスナップショット
+        filter_index (FilterIndex): スナップショットのビットマップ索引
+        filters (list): [(フィルター名, 値)]
+        search_text (str): 検索テキスト（空の場合はフィルターのみ）
+        search_types (list): 検索タイプのリスト ['exact', 'partial', 'fuzzy']
+        limit (int): 返す結果の件数
+
+    Returns:
+        dict: 検索結果の詳細情報（各結果に行全体 'row_data' を含む）
+    """
+    bitmap = filter_index.evaluate(filters)
+    search_text_lower = search_text.lower()
+    matches = []
+
+    for row_index in iter_rows(bitmap):
+        name = snapshot.cell(row_index, 0)
+        if not name:
+            continue
+        if search_text_lower:
+            matched = _text_match(name.lower(), search_text_lower, search_types)
+            if matched is None:
+                continue
+            match_type, score = matched
+        else:
+            match_type, score = 'フィルター一致', 100
+        row_num = snapshot.row_numbers[row_index]
+        matches.append({
+            'type': match_type,
+            'text': name,
+            'position': f'行{row_num}, 列1',
+            'sheet': snapshot.sheet_of(row_index),
+            'row': row_num,
+            'score': score,
+            '_index': row_index
+        })
+
+    # スコア上位のみを取り出し（同じスコアは行順）、表示する結果のみ行全体を付ける
+    top_matches = heapq.nlargest(limit, matches, key=lambda x: x['score'])
+    for match in top_matches:
+        match['row_data'] = snapshot.row_values(match.pop('_index'))
+
+    condition = describe_filters(filters) + (f", '{search_text}'" if search_text else '')
+    return {
+        'found': len(top_matches) > 0,
+        'message': f"条件（{condition}）に一致するソフトウェア: {len(matches)}件" if matches else f"条件（{condition}）に一致するソフトウェアは見つかりませんでした",
+        'matches': top_matches,
+        'filters': filters
+    }
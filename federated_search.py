@@ -0,0 +1,239 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from name_matcher import name_aliases, normalize_name
+
+# 複数ソースの検索全体にかける時間の上限（秒）
+DEFAULT_LATENCY_BUDGET = float(os.environ.get("SEARCH_LATENCY_BUDGET", "3.0"))
+
+# 統合した検索結果の件数（デフォルト）
+MAX_MATCHES = 10
+
+
+def fan_out(tasks, budget=DEFAULT_LATENCY_BUDGET, executor=None):
+    """
+    複数の処理を並列に実行し、期限までに完了した結果を集める
+
+    Args:
+        tasks (dict): {キー: 引数なしで呼び出す関数}
+        budget (float): 全体の期限（秒）。各処理の時間は合計されない
+        executor (ThreadPoolExecutor): 使用するスレッドプール（Noneの場合は一時的に作成）
+
+    Returns:
+        dict: {キー: ('ok', 戻り値) / ('error', 例外) / ('timeout', None)}
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)))
+
+    try:
+        futures = {key: executor.submit(task) for key, task in tasks.items()}
+        wait(futures.values(), timeout=budget)
+
+        outcomes = {}
+        for key, future in futures.items():
+            if not future.done():
+                # 期限を過ぎた処理は結果を待たない（バックグラウンドで完了させる）
+                future.cancel()
+                outcomes[key] = ('timeout', None)
+            elif future.exception() is not None:
+                outcomes[key] = ('error', future.exception())
+            else:
+                outcomes[key] = ('ok', future.result())
+        return outcomes
+
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def merge_results(search_text, sources, outcomes, limit=MAX_MATCHES):
+    """
+    ソースごとの検索結果を出典付きで1つの検索結果に統合
+
+    Args:
+        search_text (str): 検索したテキスト
+        sources (list): {'name', 'label'} のソースのリスト
+        outcomes (dict): fan_out() の戻り値（キーはスプレッドシート名）
+        limit (int): 返す結果の件数
+
+    Returns:
+        dict: 検索結果の詳細情報
+              一部のソースを検索できなかった場合は 'incomplete': True と 'failed_sources' を含む
+              'snapshot_versions' は検索したスナップショットのバージョン（直接検索・失敗したソースはNone）
+    """
+    matches = []
+    failed_sources = []
+    snapshot_versions = []
+    stale = False
+
+    for source in sources:
+        status, result = outcomes.get(source['name'], ('timeout', None))
+        if status == 'error':
+            print(f"ソース検索エラー（{source['label']}）: {result}")
+        if status != 'ok' or result is None or result.get('error'):
+            failed_sources.append(source['label'])
+            snapshot_versions.append(None)
+            continue
+        snapshot_versions.append(result.get('snapshot_version'))
+        stale = stale or bool(result.get('stale'))
+        for match in result['matches']:
+            matches.append(dict(match, source=source['label']))
+
+    matches.sort(key=lambda x: x['score'], reverse=True)
+
+    if len(failed_sources) == len(sources):
+        return {
+            'found': False,
+            'error': True,
+            'message': "検索対象のスプレッドシートを検索できませんでした。しばらくしてから再度お試しください",
+            'matches': [],
+            'failed_sources': failed_sources
+        }
+
+    return {
+        'found': len(matches) > 0,
+        'message': f"'{search_text}'の検索結果: {len(matches)}件見つかりました" if matches else f"'{search_text}'は見つかりませんでした",
+        'matches': matches[:limit],
+        'stale': stale,
+        'incomplete': bool(failed_sources),
+        'failed_sources': failed_sources,
+        'snapshot_versions': snapshot_versions
+    }
+
+
+class FederatedSearch:
+    def __init__(self, sources, refreshers, live_search=None, budget=DEFAULT_LATENCY_BUDGET):
+        """
+        複数のスプレッドシート（ソース）を並列に検索して結果を統合
+
+        ソースごとにスナップショットと索引（SnapshotRefresher）を持ち、検索は全ソースに
+        並列に振り分けて、期限（budget）までに応答したソースの結果を出典付きで統合する。
+
+        Args:
+            sources (list): {'name', 'label'} のソースのリスト
+            refreshers (dict): {スプレッドシート名: SnapshotRefresher}
+            live_search (callable): スナップショットがまだないソースを直接検索する関数
+                                    (spreadsheet_name, search_text, search_types, limit) -> dict
+            budget (float): 検索全体の期限（秒）
+        """
+        self.sources = sources
+        self.refreshers = refreshers
+        self.live_search = live_search
+        self.budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(sources)), thread_name_prefix='federated-search')
+
+    def start(self):
+        """
+        全ソースのスナップショットのバックグラウンド更新を開始
+        """
+        for refresher in self.refreshers.values():
+            refresher.start()
+
+    def stop(self):
+        """
+        全ソースのバックグラウンド更新を停止
+        """
+        for refresher in self.refreshers.values():
+            refresher.stop()
+        self._executor.shutdown(wait=False)
+
+    def snapshot_versions(self):
+        """
+        ソースごとの公開中のスナップショットのバージョン（スナップショットがない場合はNone）
+        """
+        versions = []
+        for source in self.sources:
+            current = self.refreshers[source['name']].current
+            versions.append(current[0].version if current is not None else None)
+        return versions
+
+    def _search_source(self, spreadsheet_name, search_text, search_types, limit, filters=None, stop_after=None):
+        """
+        1つのソースを検索（スナップショットがない場合は直接検索。フィルター付きの検索はスナップショットのみ）
+        """
+        result = self.refreshers[spreadsheet_name].search(search_text, search_types, limit=limit, filters=filters,
+                                                          stop_after=stop_after)
+        if result is None and self.live_search is not None and not filters:
+            result = self.live_search(spreadsheet_name, search_text, search_types, limit)
+        return result
+
+    def suggest(self, search_text, limit=3):
+        """
+        全ソースから表記ゆれ・略称で近いソフトウェア名を取得（「もしかして」用）
+
+        スナップショットがないソース、期限内に応答しなかったソースは対象外とする。
+
+        Args:
+            search_text (str): 検索するテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: 類似度の高い順の検索結果（各結果に出典 'source' を含む）
+        """
+        tasks = {
+            source['name']: (lambda name=source['name']: self.refreshers[name].suggest(search_text, limit))
+            for source in self.sources
+        }
+        outcomes = fan_out(tasks, self.budget, self._executor)
+
+        suggestions = []
+        for source in self.sources:
+            status, matches = outcomes[source['name']]
+            if status == 'ok' and matches:
+                suggestions.extend(dict(match, source=source['label']) for match in matches)
+        suggestions.sort(key=lambda x: x['score'], reverse=True)
+        return suggestions[:limit]
+
+    def complete(self, text, limit=MAX_MATCHES):
+        """
+        全ソースのスナップショットから入力中のテキストに一致するソフトウェア名を取得（入力補完用）
+
+        メモリ上の配列の参照のみで完了するため、スレッドに振り分けずに順に取得する。
+        スナップショットがないソースは対象外とする（Google APIは呼び出さない）。
+
+        Args:
+            text (str): 入力中のテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: ソフトウェア名のリスト（複数のソースにある名前は1件にまとめる）
+        """
+        names = []
+        seen = set()
+        for source in self.sources:
+            for name in self.refreshers[source['name']].complete(text, limit) or ():
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        # ソースごとに前方一致が先に並ぶため、前方一致の名前を全ソースで先にする
+        prefix = normalize_name(text)
+        names.sort(key=lambda name: not any(alias.startswith(prefix) for alias in name_aliases(name)))
+        return names[:limit]
+
+    def search(self, search_text, search_types=['exact', 'partial', 'fuzzy'], limit=MAX_MATCHES, filters=None,
+               stop_after=None):
+        """
+        全ソースを並列に検索して結果を統合
+
+        Args:
+            search_text (str): 検索するテキスト
+            search_types (list): 検索タイプのリスト
+            limit (int): 返す結果の件数
+            filters (list): 列のフィルター [(フィルター名, 値)]
+            stop_after (int): ソースごとにコストの高い検索タイプを省略する結果の件数（Noneの場合は limit）
+
+        Returns:
+            dict: 検索結果の詳細情報（各結果に出典 'source' を含む）
+        """
+        started = time.monotonic()
+        tasks = {
+            source['name']: (lambda name=source['name']:
+                             self._search_source(name, search_text, search_types, limit, filters, stop_after))
+            for source in self.sources
+        }
+        outcomes = fan_out(tasks, self.budget, self._executor)
+        result = merge_results(search_text, self.sources, outcomes, limit)
+        result['elapsed'] = time.monotonic() - started
+        return result
@@ -9,6 +9,8 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from spreadsheet_sources import spreadsheet_names
+
 # SSL証明書検証の問題を回避
 os.environ['PYTHONHTTPSVERIFY'] = '0'
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -158,7 +160,7 @@ class GoogleSheetsHandler:
 
 def search_in_target_spreadsheet(search_text):
     """
-    指定されたスプレッドシートでテキストを検索する便利関数
+    設定されたスプレッドシートでテキストを検索する便利関数
     
     Args:
         search_text (str): 検索するテキスト
@@ -170,14 +172,14 @@ def search_in_target_spreadsheet(search_text):
         # 認証情報ファイルのパス（環境変数から取得、デフォルトは汎用名）
         credentials_path = os.environ.get("GOOGLE_CREDENTIALS_PATH", "google_service_account.json")
         
-        # 検索対象のスプレッドシート名
-        target_spreadsheet = "I want to use free software / フリーソフトを利用したい のコピー"
-        
         # Google Sheetsハンドラーを初期化
         sheets_handler = GoogleSheetsHandler(credentials_path)
         
-        # テキストを検索
-        found = sheets_handler.search_text_in_spreadsheet(target_spreadsheet, search_text)
+        # 設定された全てのスプレッドシートでテキストを検索
+        found = any(
+            sheets_handler.search_text_in_spreadsheet(spreadsheet_name, search_text)
+            for spreadsheet_name in spreadsheet_names()
+        )
         
         return "ありました" if found else "ありません"
         
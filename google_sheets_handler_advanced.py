@@ -1,20 +1,143 @@
 import difflib
+import heapq
 import json
 import os
+import re
 import ssl
+import time
+from concurrent.futures.process import BrokenProcessPool
 
 import certifi
-import httplib2
 from fuzzywuzzy import fuzz, process
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from bm25_search import BM25Index
+from cache_backend import get_cache
+from circuit_breaker import CircuitOpenError, get_breaker
+from federated_search import fan_out, merge_results
+from http_transport import HttpTransportPool
+from parallel_fuzzy import get_fuzzy_scorer
+from quota_governor import QuotaExceededError, get_governor
+from sheet_snapshot import SheetSnapshot, as_snapshot
+from snapshot_index import DEFAULT_FUZZY_CANDIDATES
+from spreadsheet_sources import load_sources, primary_spreadsheet
+from tfidf_search import TfidfIndex
+
 # SSL証明書検証の問題を回避
 os.environ['PYTHONHTTPSVERIFY'] = '0'
 ssl._create_default_https_context = ssl._create_unverified_context
 
+# プライマリの検索対象スプレッドシート名（全ソースは環境変数 TARGET_SPREADSHEETS で設定）
+TARGET_SPREADSHEET = primary_spreadsheet()
+
+# ソフトウェア名の列（名前インデックスとして1列目のみを取得する）
+NAME_COLUMNS = ['A']
+
+# ボットのスナップショットで取得する列（ソフトウェア名と、column_filter.FILTER_FIELDS の列）
+SNAPSHOT_COLUMNS = ['A:B', 'D:E', 'G']
+
+# 1列目のみで完結する検索タイプ
+NAME_ONLY_SEARCH_TYPES = {'partial'}
+
+# 検索結果として返す件数（デフォルト）
+DEFAULT_RESULT_LIMIT = 10
+
+# 1クエリあたりの検索時間の上限（秒）。超えた場合は以降の検索タイプを省略する
+QUERY_TIME_BUDGET = float(os.environ.get("SEARCH_QUERY_BUDGET", "0.5"))
+
+# スプレッドシート名からIDへの解決結果をキャッシュする期間（秒）
+SPREADSHEET_ID_CACHE_TTL = 24 * 60 * 60
+
+# 書き込みモード（承認された行をスプレッドシートに追加する）。有効な場合は読み書きのスコープで認証する
+SHEETS_WRITE_MODE = os.environ.get("SHEETS_WRITE_MODE", "").lower() in ('1', 'true', 'yes', 'on')
+
+# 追加する行の列（A: ソフトウェア名 〜 H: 特記事項）
+WRITE_COLUMNS = 'A:H'
+
+
+def column_letter_to_index(letters):
+    """
+    列名（'A', 'AB'など）を0始まりの列インデックスに変換
+    
+    Args:
+        letters (str): 列名
+        
+    Returns:
+        int: 列インデックス
+    """
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+
+def parse_column_range(spec):
+    """
+    列の指定（'A' または 'A:D'）をパース
+    
+    Args:
+        spec (str): 列の指定
+        
+    Returns:
+        tuple: (開始列インデックス, 開始列名, 終了列名)
+    """
+    if ':' in spec:
+        first, last = spec.split(':', 1)
+    else:
+        first = last = spec
+    first = first.strip().upper()
+    last = last.strip().upper()
+    return (column_letter_to_index(first), first, last)
+
+
+def quote_sheet_title(sheet_name):
+    """
+    A1形式で使用できるようにシート名をクォート
+    """
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def column_index_to_letter(index):
+    """
+    0始まりの列インデックスを列名（'A', 'AB'など）に変換
+    
+    Args:
+        index (int): 列インデックス
+        
+    Returns:
+        str: 列名
+    """
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def sheet_range(sheet_name, start_row, column_range=None, end_row=None):
+    """
+    シート名・行範囲・列範囲からA1形式の範囲を作成
+    
+    Args:
+        sheet_name (str): シート名
+        start_row (int): 開始行番号
+        column_range (tuple): parse_column_range() の戻り値（Noneの場合は全列）
+        end_row (int): 終了行番号（Noneの場合は最終行まで）
+        
+    Returns:
+        str: A1形式の範囲（例: 'Sheet1'!A4:A）
+    """
+    if column_range is None:
+        if end_row is None:
+            # 行のみの終端なし範囲は指定できないため、シート全体を取得する
+            return quote_sheet_title(sheet_name)
+        return f"{quote_sheet_title(sheet_name)}!{start_row}:{end_row}"
+    _, first, last = column_range
+    return f"{quote_sheet_title(sheet_name)}!{first}{start_row}:{last}{end_row or ''}"
+
 
 class GoogleSheetsHandlerAdvanced:
     def __init__(self, credentials_path, proxy_info=None):
@@ -38,65 +161,43 @@ class GoogleSheetsHandlerAdvanced:
             # サービスアカウントの認証情報を読み込み
             credentials = service_account.Credentials.from_service_account_file(
                 self.credentials_path,
-                scopes=['https://www.googleapis.com/auth/spreadsheets.readonly',
+                scopes=['https://www.googleapis.com/auth/spreadsheets' if SHEETS_WRITE_MODE
+                        else 'https://www.googleapis.com/auth/spreadsheets.readonly',
                        'https://www.googleapis.com/auth/drive.readonly']
             )
             
-            # プロキシ設定を含むHTTPクライアントを作成
-            if self.proxy_info:
-                proxy_info = httplib2.ProxyInfo(
-                    httplib2.socks.PROXY_TYPE_HTTP,
-                    self.proxy_info['host'],
-                    self.proxy_info['port']
-                )
-                http = httplib2.Http(
-                    proxy_info=proxy_info,
-                    disable_ssl_certificate_validation=True
-                )
-            else:
-                # 環境変数からプロキシ設定を取得
-                http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy')
-                https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
-                
-                if http_proxy or https_proxy:
-                    # プロキシURLをパース
-                    proxy_url = https_proxy or http_proxy
-                    if '://' in proxy_url:
-                        proxy_url = proxy_url.split('://', 1)[1]
-                    
-                    if ':' in proxy_url:
-                        proxy_host, proxy_port = proxy_url.split(':', 1)
-                        proxy_port = int(proxy_port)
-                    else:
-                        proxy_host = proxy_url
-                        proxy_port = 8080
-                    
-                    proxy_info = httplib2.ProxyInfo(
-                        httplib2.socks.PROXY_TYPE_HTTP,
-                        proxy_host,
-                        proxy_port
-                    )
-                    http = httplib2.Http(
-                        proxy_info=proxy_info,
-                        disable_ssl_certificate_validation=True
-                    )
-                else:
-                    http = httplib2.Http(disable_ssl_certificate_validation=True)
-            
-            # 認証されたHTTPクライアントを作成
-            from google_auth_httplib2 import AuthorizedHttp
-            authorized_http = AuthorizedHttp(credentials, http=http)
+            # スレッドごとにHTTPクライアントを持つトランスポートプールを作成
+            # （プロキシ設定は引数または環境変数 HTTP(S)_PROXY から取得）
+            self.transport = HttpTransportPool(credentials, self.proxy_info)
             
             # Google Sheets APIサービスを構築
-            self.service = build('sheets', 'v4', http=authorized_http)
+            self.service = self.transport.build_service('sheets', 'v4')
             
             # Google Drive APIサービスも構築（ファイル検索用）
-            self.drive_service = build('drive', 'v3', http=authorized_http)
+            self.drive_service = self.transport.build_service('drive', 'v3')
             
         except Exception as e:
             print(f"認証エラー: {e}")
             raise
     
+    def _execute(self, request, api='sheets'):
+        """
+        APIリクエストをサーキットブレーカーとクォータ制御（トークンバケット・リトライ）下で実行
+        
+        Args:
+            request (HttpRequest): 実行するリクエスト
+            api (str): API種別（'sheets' または 'drive'）
+            
+        Returns:
+            dict: レスポンス
+            
+        Raises:
+            QuotaExceededError: リトライ上限または期限に達した場合
+            CircuitOpenError: 障害検知によりAPIの呼び出しを停止中の場合
+        """
+        governor = get_governor(api)
+        return get_breaker(api).call(lambda: governor.execute(request))
+    
     def find_spreadsheet_by_name(self, spreadsheet_name):
         """
         指定された名前のスプレッドシートをGoogle Driveから検索
@@ -107,18 +208,26 @@ class GoogleSheetsHandlerAdvanced:
         Returns:
             str: スプレッドシートのID（見つからない場合はNone）
         """
+        # IDは変わらないため、共有キャッシュにあればDrive APIを呼び出さない
+        cache_key = f"spreadsheet_id:{spreadsheet_name}"
+        cached_id = get_cache().get_json(cache_key)
+        if cached_id:
+            return cached_id
+        
         try:
             # Google Driveでスプレッドシートを検索
             query = f"name='{spreadsheet_name}' and mimeType='application/vnd.google-apps.spreadsheet'"
-            results = self.drive_service.files().list(
+            results = self._execute(self.drive_service.files().list(
                 q=query,
                 fields="files(id, name)"
-            ).execute()
+            ), api='drive')
             
             files = results.get('files', [])
             
             if files:
-                return files[0]['id']  # 最初に見つかったファイルのIDを返す
+                spreadsheet_id = files[0]['id']  # 最初に見つかったファイルのIDを返す
+                get_cache().set_json(cache_key, spreadsheet_id, SPREADSHEET_ID_CACHE_TTL)
+                return spreadsheet_id
             else:
                 return None
                 
@@ -126,148 +235,537 @@ class GoogleSheetsHandlerAdvanced:
             print(f"スプレッドシート検索エラー: {e}")
             return None
     
-    def get_all_sheet_data(self, spreadsheet_id):
+    def get_modified_time(self, spreadsheet_id):
         """
-        スプレッドシートの全シートからデータを取得（4行目以降のみ）
+        スプレッドシートの最終更新日時をGoogle Driveから取得
         
         Args:
             spreadsheet_id (str): スプレッドシートのID
             
         Returns:
-            list: 全シートのデータを含むリスト（4行目以降）
+            str: 最終更新日時（RFC 3339形式、取得できない場合はNone）
         """
         try:
-            # スプレッドシートのメタデータを取得してシート名を取得
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
+            result = self._execute(self.drive_service.files().get(
+                fileId=spreadsheet_id,
+                fields='modifiedTime'
+            ), api='drive')
+            return result.get('modifiedTime')
             
-            sheets = spreadsheet.get('sheets', [])
-            all_data = []
+        except HttpError as e:
+            print(f"更新日時取得エラー: {e}")
+            return None
+    
+    def _get_sheet_titles(self, spreadsheet_id):
+        """
+        スプレッドシート内の全シート名を取得（シート名のみを要求して転送量を削減）
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
             
-            for sheet in sheets:
-                sheet_name = sheet['properties']['title']
-                
-                # 各シートのデータを取得
-                result = self.service.spreadsheets().values().get(
-                    spreadsheetId=spreadsheet_id,
-                    range=sheet_name
-                ).execute()
-                
-                values = result.get('values', [])
+        Returns:
+            list: シート名のリスト
+        """
+        spreadsheet = self._execute(self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties.title'
+        ))
+        return [sheet['properties']['title'] for sheet in spreadsheet.get('sheets', [])]
+    
+    def get_sheet_properties(self, spreadsheet_id):
+        """
+        スプレッドシート内の全シートの名前とグリッドサイズを取得
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            
+        Returns:
+            list: {'title': シート名, 'row_count': 行数, 'column_count': 列数} のリスト
+        """
+        spreadsheet = self._execute(self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(title,gridProperties(rowCount,columnCount))'
+        ))
+        
+        sheet_properties = []
+        for sheet in spreadsheet.get('sheets', []):
+            properties = sheet['properties']
+            grid = properties.get('gridProperties', {})
+            sheet_properties.append({
+                'title': properties['title'],
+                'row_count': grid.get('rowCount', 0),
+                'column_count': grid.get('columnCount', 0)
+            })
+        return sheet_properties
+    
+    def _batch_get_values(self, spreadsheet_id, ranges):
+        """
+        複数の範囲の値を1回のリクエストで取得
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            ranges (list): A1形式の範囲のリスト
+            
+        Returns:
+            list: 範囲ごとの値（2次元リスト）のリスト（ranges と同じ順序）
+        """
+        if not ranges:
+            return []
+        
+        result = self._execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=ranges,
+            majorDimension='ROWS',
+            fields='valueRanges(values)'
+        ))
+        
+        value_ranges = result.get('valueRanges', [])
+        return [value_range.get('values', []) for value_range in value_ranges]
+    
+    def append_rows(self, spreadsheet_id, sheet_name, rows, columns=WRITE_COLUMNS):
+        """
+        シートの末尾に複数の行を1回のリクエストで追加（書き込みモードのみ）
+        
+        書き込みは5xxでも反映済みの場合があるため、クォータ制御ではリトライしない
+        （再実行する前に呼び出し元で反映済みか確認する）。
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            sheet_name (str): 追加先のシート名
+            rows (list): 行データのリスト
+            columns (str): 行データの列の範囲（例: 'A:H'）
+            
+        Returns:
+            int: 追加した最初の行の行番号
+            
+        Raises:
+            PermissionError: 書き込みモードでない場合
+            QuotaExceededError, CircuitOpenError, HttpError: API呼び出しに失敗した場合
+        """
+        if not SHEETS_WRITE_MODE:
+            raise PermissionError("書き込みモード（SHEETS_WRITE_MODE）が有効ではありません")
+        
+        result = self._execute(self.service.spreadsheets().values().append(
+            spreadsheetId=spreadsheet_id,
+            range=sheet_range(sheet_name, 1, parse_column_range(columns)),
+            valueInputOption='RAW',
+            insertDataOption='INSERT_ROWS',
+            body={'values': rows},
+            fields='updates(updatedRange)'
+        ), api='sheets_write')
+        
+        # 例: 'Sheet1'!A105:H107 → 105
+        updated_range = result['updates']['updatedRange']
+        return int(re.search(r'!\$?[A-Z]+\$?(\d+)', updated_range).group(1))
+    
+    def get_row_blocks(self, spreadsheet_id, blocks):
+        """
+        複数の行範囲（ブロック）のデータを1回のリクエストでまとめて取得
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            blocks (list): (シート名, 開始行, 終了行, 列の指定) のタプルのリスト
+                           終了行がNoneの場合は最終行まで、列の指定がNoneの場合は全列
+            
+        Returns:
+            list: ブロックごとの (行データ, 行番号, シート名) のタプルのリスト
+                  列を指定した場合、行データは取得しなかった列を空文字で埋めた列位置どおりのリスト
+        """
+        # 全ブロック・全列の範囲をまとめて1回のリクエストで取得
+        block_ranges = []
+        ranges = []
+        for sheet_name, start_row, end_row, columns in blocks:
+            column_ranges = [parse_column_range(spec) for spec in columns] if columns else [None]
+            block_ranges.append(column_ranges)
+            ranges.extend(
+                sheet_range(sheet_name, start_row, column_range, end_row)
+                for column_range in column_ranges
+            )
+        values_list = iter(self._batch_get_values(spreadsheet_id, ranges))
+        
+        results = []
+        
+        for (sheet_name, start_row, end_row, columns), column_ranges in zip(blocks, block_ranges):
+            # ブロックごとに、列範囲ごとの値を行単位でマージ
+            rows = {}
+            for column_range in column_ranges:
+                values = next(values_list, [])
+                first_col = column_range[0] if column_range else 0
+                first_row = 1 if column_range is None and end_row is None else start_row
                 
-                # 4行目以降のデータのみを追加（インデックス3以降）
-                if len(values) > 3:
-                    for i, row in enumerate(values[3:], start=4):  # 4行目から開始
-                        # 行番号情報を保持するために、行データと実際の行番号をタプルで保存
-                        all_data.append((row, i))
+                for row_num, row in enumerate(values, start=first_row):
+                    # 開始行より前（ヘッダー行）と空行は除外
+                    if row_num < start_row or not row:
+                        continue
+                    row_data = rows.setdefault(row_num, [])
+                    end_col = first_col + len(row)
+                    if len(row_data) < end_col:
+                        row_data.extend([''] * (end_col - len(row_data)))
+                    row_data[first_col:end_col] = row
+            
+            # 行番号情報を保持するために、行データ・実際の行番号・シート名をタプルで保存
+            results.append([(rows[row_num], row_num, sheet_name) for row_num in sorted(rows)])
+        
+        return results
+    
+    def get_all_sheet_data(self, spreadsheet_id, columns=None, start_row=4):
+        """
+        スプレッドシートの全シートからデータを取得（4行目以降のみ）
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            columns (list): 取得する列の指定（例: ['A'], ['A', 'D', 'G:H']）。Noneの場合は全列
+            start_row (int): 取得を開始する行番号
             
-            return all_data
+        Returns:
+            list: (行データ, 行番号, シート名) のタプルのリスト（4行目以降）
+                  列を指定した場合、行データは取得しなかった列を空文字で埋めた列位置どおりのリスト
+        """
+        try:
+            return self._fetch_all_rows(spreadsheet_id, columns, start_row)
             
         except HttpError as e:
             print(f"データ取得エラー: {e}")
             return []
     
-    def exact_search(self, all_data, search_text):
+    def _fetch_all_rows(self, spreadsheet_id, columns=None, start_row=4):
+        """
+        全シートのデータを取得（get_all_sheet_data と同じだが、エラー時は例外を送出する）
+        """
+        # スプレッドシートのメタデータを取得してシート名を取得
+        sheet_titles = self._get_sheet_titles(spreadsheet_id)
+        
+        # 全シートのデータを1回のリクエストで取得
+        blocks = [(sheet_name, start_row, None, columns) for sheet_name in sheet_titles]
+        
+        all_data = []
+        for block_rows in self.get_row_blocks(spreadsheet_id, blocks):
+            all_data.extend(block_rows)
+        
+        return all_data
+    
+    def hydrate_matches(self, spreadsheet_id, matches):
+        """
+        検索結果の行全体を取得して 'row_data' に設定（表示する少数の結果のみ）
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            matches (list): 'sheet' と 'row' を含む検索結果のリスト
+            
+        Returns:
+            list: 行データを設定した検索結果のリスト
+        """
+        targets = [match for match in matches if 'sheet' in match and 'row' in match]
+        if not targets:
+            return matches
+        
+        try:
+            ranges = [f"{quote_sheet_title(match['sheet'])}!{match['row']}:{match['row']}" for match in targets]
+            values_list = self._batch_get_values(spreadsheet_id, ranges)
+            
+            for match, values in zip(targets, values_list):
+                match['row_data'] = values[0] if values else []
+                
+        except HttpError as e:
+            print(f"行データ取得エラー: {e}")
+        
+        return matches
+    
+    def get_snapshot(self, spreadsheet_id, columns=None):
+        """
+        スプレッドシートのデータを取得してスナップショットを作成
+        
+        Args:
+            spreadsheet_id (str): スプレッドシートのID
+            columns (list): 取得する列の指定（例: ['A']）。Noneの場合は全列
+            
+        Returns:
+            SheetSnapshot: 列指向のスナップショット
+            
+        Raises:
+            HttpError, QuotaExceededError, CircuitOpenError: データを取得できなかった場合
+                （空のスナップショットを「見つからない」と扱わないよう、例外を送出する）
+        """
+        all_data = self._fetch_all_rows(spreadsheet_id, columns=columns)
+        return SheetSnapshot.from_rows(all_data, metadata={'spreadsheet_id': spreadsheet_id, 'columns': columns})
+    
+    def _match(self, snapshot, index, column, match_type, score, text=None):
+        """
+        スナップショットの行から検索結果を作成
+        """
+        row_num = snapshot.row_numbers[index]
+        return {
+            'type': match_type,
+            'text': text if text is not None else snapshot.cell(index, column),
+            'position': f'行{row_num}, 列{column+1}',
+            'sheet': snapshot.sheet_of(index),
+            'row': row_num,
+            'score': score
+        }
+    
+    def exact_search(self, all_data, search_text, index=None, columns=None):
         """
         完全一致検索
         
         Args:
-            all_data (list): 検索対象のデータ
+            all_data: 検索対象のデータ（SheetSnapshot または行データ・行番号・シート名のタプルのリスト）
             search_text (str): 検索するテキスト
+            index (SnapshotIndex): スナップショットの索引（ある場合は索引を使用）
+            columns (list): 検索する列インデックス。Noneの場合は全列
             
         Returns:
             list: マッチした結果のリスト
         """
+        snapshot = as_snapshot(all_data)
         matches = []
         search_text_lower = search_text.lower()
         
-        for row_idx, row in enumerate(all_data):
-            for col_idx, cell in enumerate(row):
-                if cell and search_text_lower == str(cell).lower():
-                    matches.append({
-                        'type': '完全一致',
-                        'text': str(cell),
-                        'position': f'行{row_idx+1}, 列{col_idx+1}',
-                        'score': 100
-                    })
+        for column in (range(snapshot.width) if columns is None else columns):
+            if index is not None:
+                # 索引（小文字化した値の順に並べた文字列ID）を二分探索
+                string_ids = index.exact_ids(snapshot, column, search_text_lower)
+                rows = index.rows_with_ids(column, string_ids)
+            else:
+                # 列の文字列プール（重複なし）で比較し、一致した文字列IDを持つ行を列挙
+                pool_lower = snapshot.column_pool(column).lower()
+                string_ids = {string_id for string_id, cell in enumerate(pool_lower) if cell and cell == search_text_lower}
+                rows = snapshot.rows_with_ids(column, string_ids)
+            
+            for row_index in rows:
+                matches.append(self._match(snapshot, row_index, column, '完全一致', 100))
         
         return matches
     
-    def partial_search(self, all_data, search_text):
+    def partial_search(self, all_data, search_text, index=None):
         """
         部分一致検索（1列目のみ、4行目以降）
         
         Args:
-            all_data (list): 検索対象のデータ（行データと行番号のタプルのリスト）
+            all_data: 検索対象のデータ（SheetSnapshot または行データ・行番号・シート名のタプルのリスト）
             search_text (str): 検索するテキスト
+            index (SnapshotIndex): スナップショットの索引（ある場合はバイグラム転置索引を使用）
             
         Returns:
             list: マッチした結果のリスト
         """
+        snapshot = as_snapshot(all_data)
         matches = []
         search_text_lower = search_text.lower()
         
-        for row_data, actual_row_num in all_data:
-            # 1列目のみを検索（インデックス0）
-            if len(row_data) > 0:
-                cell = row_data[0]
-                if cell and search_text_lower in str(cell).lower():
-                    matches.append({
-                        'type': '部分一致',
-                        'text': str(cell),
-                        'position': f'行{actual_row_num}, 列1',
-                        'score': 90
-                    })
+        # 1列目のみを検索（インデックス0）
+        if index is not None:
+            string_ids = index.substring_ids(snapshot, 0, search_text_lower)
+            rows = index.rows_with_ids(0, string_ids)
+        else:
+            pool_lower = snapshot.column_pool(0).lower()
+            string_ids = {string_id for string_id, cell in enumerate(pool_lower) if cell and search_text_lower in cell}
+            rows = snapshot.rows_with_ids(0, string_ids)
+        
+        for row_index in rows:
+            matches.append(self._match(snapshot, row_index, 0, '部分一致', 90))
         
         return matches
     
-    def fuzzy_search(self, all_data, search_text, threshold=70):
+    def fuzzy_search(self, all_data, search_text, threshold=70, index=None, columns=None):
         """
         あいまい検索（類似度検索）
         
         Args:
-            all_data (list): 検索対象のデータ
+            all_data: 検索対象のデータ（SheetSnapshot または行データ・行番号・シート名のタプルのリスト）
             search_text (str): 検索するテキスト
             threshold (int): 類似度の閾値（0-100）
+            index (SnapshotIndex): スナップショットの索引（ある場合は共通バイグラムの多い候補のみ比較）
+            columns (list): 検索する列インデックス。Noneの場合は全列
             
         Returns:
             list: マッチした結果のリスト
         """
+        snapshot = as_snapshot(all_data)
         matches = []
-        all_texts = []
         text_positions = {}
+        search_text_lower = search_text.lower()
         
-        # 全てのテキストを収集
-        for row_idx, row in enumerate(all_data):
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    cell_text = str(cell)
-                    all_texts.append(cell_text)
-                    text_positions[cell_text] = f'行{row_idx+1}, 列{col_idx+1}'
+        # 対象の列の文字列プールから重複のないテキストを収集（並列化できる場合は索引の候補を増やす）
+        scorer = get_fuzzy_scorer()
+        candidate_limit = scorer.candidate_limit(DEFAULT_FUZZY_CANDIDATES)
+        for column in (range(snapshot.width) if columns is None else columns):
+            pool = snapshot.column_pool(column)
+            if index is not None:
+                string_ids = index.fuzzy_candidates(column, search_text_lower, limit=candidate_limit)
+            else:
+                string_ids = range(1, len(pool))
+            for string_id in string_ids:
+                cell_text = pool[string_id]
+                if cell_text and cell_text not in text_positions:
+                    text_positions[cell_text] = (column, string_id)
         
-        # fuzzywuzzyを使用して類似度検索
-        fuzzy_matches = process.extract(search_text, all_texts, limit=10)
+        # fuzzywuzzyを使用して類似度検索（候補が多い場合は複数のプロセスで比較）
+        fuzzy_matches = None
+        if scorer.enabled(len(text_positions)):
+            try:
+                fuzzy_matches = scorer.extract(snapshot, search_text, list(text_positions.values()), limit=10)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"あいまい検索のプロセスプール・共有メモリのエラーのため、単一スレッドで比較します: {e}")
+        if fuzzy_matches is None:
+            fuzzy_matches = process.extract(search_text, list(text_positions), limit=10)
         
         for match_text, score in fuzzy_matches:
             if score >= threshold:
-                matches.append({
-                    'type': 'あいまい一致',
-                    'text': match_text,
-                    'position': text_positions[match_text],
-                    'score': score
-                })
+                # 最初に出現した位置を結果の位置とする
+                column, string_id = text_positions[match_text]
+                if index is not None:
+                    rows = index.rows_with_ids(column, [string_id])
+                else:
+                    rows = snapshot.rows_with_ids(column, {string_id})
+                if rows:
+                    matches.append(self._match(snapshot, rows[0], column, 'あいまい一致', score, match_text))
+        
+        return matches
+    
+    def bm25_search(self, all_data, search_text, bm25_index=None, limit=DEFAULT_RESULT_LIMIT):
+        """
+        関連度検索（行全体を文書としたBM25によるランキング）
+        
+        英数字は単語、日本語などは文字バイグラムに分割し、全ての列を含む行ごとの関連度で
+        上位 limit 件を返す。スコアは検索テキストで取り得る最大の関連度に対する割合（0-100）。
+        
+        Args:
+            all_data: 検索対象のデータ（SheetSnapshot または行データ・行番号・シート名のタプルのリスト）
+            search_text (str): 検索するテキスト
+            bm25_index (BM25Index): スナップショットのBM25索引（ない場合は作成する）
+            limit (int): 返す結果の件数
+            
+        Returns:
+            list: マッチした結果のリスト（関連度の高い順、'bm25' にBM25のスコアを含む）
+        """
+        snapshot = as_snapshot(all_data)
+        if bm25_index is None:
+            bm25_index = BM25Index.build(snapshot)
         
+        ranked, upper_bound = bm25_index.search(search_text, limit)
+        matches = []
+        for row_index, bm25_score in ranked:
+            # 結果の位置はソフトウェア名（1列目）とする
+            match = self._match(snapshot, row_index, 0, '関連度', round(100 * bm25_score / upper_bound))
+            match['bm25'] = bm25_score
+            matches.append(match)
         return matches
     
-    def advanced_search_in_spreadsheet(self, spreadsheet_name, search_text, search_types=['exact', 'partial', 'fuzzy']):
+    def tfidf_search(self, all_data, search_text, tfidf_index=None, index=None, limit=DEFAULT_RESULT_LIMIT):
+        """
+        類似検索（ソフトウェア名とカテゴリのTF-IDF文字n-gramベクトルのコサイン類似度）
+        
+        検索テキストと一致するソフトウェア名の行がある場合は、その行（名前とカテゴリ）のベクトルで
+        検索するため、「Xのようなツール」（同じカテゴリで名前の近いもの）が上位になる。
+        
+        Args:
+            all_data: 検索対象のデータ（SheetSnapshot または行データ・行番号・シート名のタプルのリスト）
+            search_text (str): 検索するテキスト（ソフトウェア名）
+            tfidf_index (TfidfIndex): スナップショットのTF-IDF索引（ない場合は作成する）
+            index (SnapshotIndex): スナップショットの索引（ソフトウェア名の完全一致の確認に使用）
+            limit (int): 返す結果の件数
+            
+        Returns:
+            list: マッチした結果のリスト（類似度の高い順、スコアはコサイン類似度 × 100）
+        """
+        snapshot = as_snapshot(all_data)
+        if tfidf_index is None:
+            tfidf_index = TfidfIndex.build(snapshot)
+        
+        search_text_lower = search_text.lower()
+        if index is not None:
+            rows = index.rows_with_ids(0, index.exact_ids(snapshot, 0, search_text_lower))
+        else:
+            pool_lower = snapshot.column_pool(0).lower()
+            rows = snapshot.rows_with_ids(0, {string_id for string_id, cell in enumerate(pool_lower) if cell and cell == search_text_lower})
+        vector = tfidf_index.row_vector(snapshot, rows[0]) if rows else tfidf_index.query_vector(search_text)
+        
+        return [
+            self._match(snapshot, row_index, 0, '類似', round(similarity * 100))
+            for row_index, similarity in tfidf_index.search(vector, limit)
+        ]
+    
+    def search_snapshot(self, snapshot, search_text, search_types=['exact', 'partial', 'fuzzy'], index=None,
+                        limit=DEFAULT_RESULT_LIMIT, time_budget=QUERY_TIME_BUDGET, columns=None, bm25_index=None,
+                        tfidf_index=None, stop_after=None):
+        """
+        取得済みのスナップショットに対して高度な検索を実行（Google APIは呼び出さない）
+        
+        コストの低い順（完全一致 → 部分一致 → 関連度 → 類似 → あいまい検索）に実行し、stop_after 件の
+        結果が揃った時点で以降の検索を省略する。時間の上限（time_budget）を超えた場合も
+        以降の検索を省略し、'truncated': True を返す。
+        
+        最初に表示する件数より多くの結果をページ送り用に返す場合は、stop_after を表示する件数、
+        limit を返す件数とする（実行した検索タイプの結果のみを limit 件まで返す）。
+        
+        Args:
+            snapshot (SheetSnapshot): 検索対象のスナップショット
+            search_text (str): 検索するテキスト
+            search_types (list): 検索タイプのリスト ['exact', 'partial', 'bm25', 'tfidf', 'fuzzy']
+            index (SnapshotIndex): スナップショットの索引（ある場合は索引を使用）
+            limit (int): 返す結果の件数
+            time_budget (float): 1クエリあたりの時間の上限（秒）。Noneの場合は無制限
+            columns (list): 完全一致・あいまい検索で検索する列インデックス。Noneの場合は全列
+            bm25_index (BM25Index): 関連度検索の索引（ない場合は 'bm25' を指定した時のみ作成する）
+            tfidf_index (TfidfIndex): 類似検索の索引（ない場合は 'tfidf' を指定した時のみ作成する）
+            stop_after (int): 以降の検索を省略する結果の件数。Noneの場合は limit
+            
+        Returns:
+            dict: 検索結果の詳細情報（実行した検索タイプを 'engines' に含む）
+        """
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        stop_after = limit if stop_after is None else min(stop_after, limit)
+        engines = [
+            ('exact', lambda: self.exact_search(snapshot, search_text, index=index, columns=columns)),
+            ('partial', lambda: self.partial_search(snapshot, search_text, index=index)),
+            ('bm25', lambda: self.bm25_search(snapshot, search_text, bm25_index=bm25_index, limit=limit)),
+            ('tfidf', lambda: self.tfidf_search(snapshot, search_text, tfidf_index=tfidf_index, index=index, limit=limit)),
+            ('fuzzy', lambda: self.fuzzy_search(snapshot, search_text, index=index, columns=columns)),
+        ]
+        
+        # 重複を除去（同じセルは最も高いスコアの結果のみ残す）
+        unique_matches = {}
+        executed = []
+        truncated = False
+        
+        for engine_type, engine in engines:
+            if engine_type not in search_types:
+                continue
+            if len(unique_matches) >= stop_after:
+                # 表示する件数の結果が揃ったため、よりコストの高い検索は実行しない
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                truncated = True
+                break
+            
+            for match in engine():
+                key = (match['sheet'], match['row'], match['position'])
+                if key not in unique_matches or unique_matches[key]['score'] < match['score']:
+                    unique_matches[key] = match
+            executed.append(engine_type)
+        
+        # スコア上位のみを取り出す（全件のソートは行わない）
+        top_matches = heapq.nlargest(limit, unique_matches.values(), key=lambda x: x['score'])
+        
+        return {
+            'found': len(top_matches) > 0,
+            'message': f"'{search_text}'の検索結果: {len(unique_matches)}件見つかりました" if top_matches else f"'{search_text}'は見つかりませんでした",
+            'matches': top_matches,
+            'engines': executed,
+            'truncated': truncated
+        }
+    
+    def advanced_search_in_spreadsheet(self, spreadsheet_name, search_text, search_types=['exact', 'partial', 'fuzzy'], hydrate=0,
+                                       limit=DEFAULT_RESULT_LIMIT):
         """
         指定されたスプレッドシート内で高度な検索を実行
         
         Args:
             spreadsheet_name (str): 検索対象のスプレッドシート名
             search_text (str): 検索するテキスト
-            search_types (list): 検索タイプのリスト ['exact', 'partial', 'fuzzy']
+            search_types (list): 検索タイプのリスト ['exact', 'partial', 'bm25', 'tfidf', 'fuzzy']
+            hydrate (int): 行全体（'row_data'）を取得する上位件数
+            limit (int): 返す結果の件数
             
         Returns:
             dict: 検索結果の詳細情報
@@ -277,49 +775,55 @@ class GoogleSheetsHandlerAdvanced:
             spreadsheet_id = self.find_spreadsheet_by_name(spreadsheet_name)
             
             if not spreadsheet_id:
+                # 検索対象がない場合はソフトウェアが「見つからない」のではなくエラーとして返す
                 return {
                     'found': False,
+                    'error': True,
                     'message': f"スプレッドシート '{spreadsheet_name}' が見つかりません",
                     'matches': []
                 }
             
-            # 全シートのデータを取得
-            all_data = self.get_all_sheet_data(spreadsheet_id)
+            # 部分一致検索（1列目のみ）だけの場合は1列目のみを取得し、それ以外は全列を取得
+            columns = NAME_COLUMNS if set(search_types) <= NAME_ONLY_SEARCH_TYPES else None
+            snapshot = self.get_snapshot(spreadsheet_id, columns=columns)
             
-            all_matches = []
+            result = self.search_snapshot(snapshot, search_text, search_types, limit=limit)
             
-            # 各検索タイプを実行
-            if 'exact' in search_types:
-                exact_matches = self.exact_search(all_data, search_text)
-                all_matches.extend(exact_matches)
+            # 表示する上位の結果のみ行全体を取得（全列取得済みの場合は取得済みデータを使用）
+            if hydrate and columns is not None:
+                self.hydrate_matches(spreadsheet_id, result['matches'][:hydrate])
+            elif hydrate:
+                rows_by_position = {(sheet_name, row_num): row_data for row_data, row_num, sheet_name in snapshot}
+                for match in result['matches'][:hydrate]:
+                    match['row_data'] = rows_by_position.get((match['sheet'], match['row']), [])
             
-            if 'partial' in search_types:
-                partial_matches = self.partial_search(all_data, search_text)
-                all_matches.extend(partial_matches)
+            return result
             
-            if 'fuzzy' in search_types:
-                fuzzy_matches = self.fuzzy_search(all_data, search_text)
-                all_matches.extend(fuzzy_matches)
-            
-            # 重複を除去し、スコア順にソート
-            unique_matches = {}
-            for match in all_matches:
-                key = f"{match['text']}_{match['position']}"
-                if key not in unique_matches or unique_matches[key]['score'] < match['score']:
-                    unique_matches[key] = match
-            
-            sorted_matches = sorted(unique_matches.values(), key=lambda x: x['score'], reverse=True)
+        except QuotaExceededError as e:
+            # クォータ超過時は「見つからない」ではなくエラーとして返す（調査を起動させない）
+            print(f"クォータ超過エラー: {e}")
+            return {
+                'found': False,
+                'error': True,
+                'message': "Google APIの利用上限に達したため検索できませんでした。しばらくしてから再度お試しください",
+                'matches': []
+            }
             
+        except CircuitOpenError as e:
+            # 障害中は上流を呼び出さずに即座にエラーとして返す
+            print(f"検索停止中: {e}")
             return {
-                'found': len(sorted_matches) > 0,
-                'message': f"'{search_text}'の検索結果: {len(sorted_matches)}件見つかりました" if sorted_matches else f"'{search_text}'は見つかりませんでした",
-                'matches': sorted_matches[:10]  # 上位10件まで
+                'found': False,
+                'error': True,
+                'message': "Google APIに障害が発生しているため検索できませんでした。しばらくしてから再度お試しください",
+                'matches': []
             }
             
         except Exception as e:
             print(f"検索エラー: {e}")
             return {
                 'found': False,
+                'error': True,
                 'message': "検索中にエラーが発生しました",
                 'matches': []
             }
@@ -327,35 +831,37 @@ class GoogleSheetsHandlerAdvanced:
 
 def advanced_search_in_target_spreadsheet(search_text, search_types=['exact', 'partial', 'fuzzy'], proxy_info=None):
     """
-    指定されたスプレッドシートで高度な検索を実行する便利関数
+    設定された全てのスプレッドシートで高度な検索を並列に実行する便利関数
     
     Args:
         search_text (str): 検索するテキスト
-        search_types (list): 検索タイプのリスト ['exact', 'partial', 'fuzzy']
+        search_types (list): 検索タイプのリスト ['exact', 'partial', 'bm25', 'tfidf', 'fuzzy']
         proxy_info (dict): プロキシ情報 {'host': 'proxy.company.com', 'port': 8080}
         
     Returns:
-        dict: 検索結果の詳細情報
+        dict: 検索結果の詳細情報（各結果に出典 'source' を含む）
     """
     try:
         # 認証情報ファイルのパス（環境変数から取得、デフォルトは汎用名）
         credentials_path = os.environ.get("GOOGLE_CREDENTIALS_PATH", "google_service_account.json")
         
-        # 検索対象のスプレッドシート名
-        target_spreadsheet = "I want to use free software / フリーソフトを利用したい のコピー"
-        
         # Google Sheetsハンドラーを初期化（高度な検索機能付き）
         sheets_handler = GoogleSheetsHandlerAdvanced(credentials_path, proxy_info)
         
-        # 高度な検索を実行
-        result = sheets_handler.advanced_search_in_spreadsheet(target_spreadsheet, search_text, search_types)
+        # 全ソースを並列に検索し、出典付きで統合
+        sources = load_sources()
+        outcomes = fan_out({
+            source['name']: (lambda name=source['name']: sheets_handler.advanced_search_in_spreadsheet(name, search_text, search_types))
+            for source in sources
+        })
         
-        return result
+        return merge_results(search_text, sources, outcomes)
         
     except Exception as e:
         print(f"検索処理エラー: {e}")
         return {
             'found': False,
+            'error': True,
             'message': "検索中にエラーが発生しました",
             'matches': []
         }
@@ -3,12 +3,13 @@ import os
 import ssl
 
 import certifi
-import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from http_transport import HttpTransportPool
+from spreadsheet_sources import spreadsheet_names
+
 # SSL証明書検証の問題を回避
 os.environ['PYTHONHTTPSVERIFY'] = '0'
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -40,56 +41,15 @@ class GoogleSheetsHandlerProxy:
                        'https://www.googleapis.com/auth/drive.readonly']
             )
             
-            # プロキシ設定を含むHTTPクライアントを作成
-            if self.proxy_info:
-                proxy_info = httplib2.ProxyInfo(
-                    httplib2.socks.PROXY_TYPE_HTTP,
-                    self.proxy_info['host'],
-                    self.proxy_info['port']
-                )
-                http = httplib2.Http(
-                    proxy_info=proxy_info,
-                    disable_ssl_certificate_validation=True
-                )
-            else:
-                # 環境変数からプロキシ設定を取得
-                http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy')
-                https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
-                
-                if http_proxy or https_proxy:
-                    # プロキシURLをパース
-                    proxy_url = https_proxy or http_proxy
-                    if '://' in proxy_url:
-                        proxy_url = proxy_url.split('://', 1)[1]
-                    
-                    if ':' in proxy_url:
-                        proxy_host, proxy_port = proxy_url.split(':', 1)
-                        proxy_port = int(proxy_port)
-                    else:
-                        proxy_host = proxy_url
-                        proxy_port = 8080
-                    
-                    proxy_info = httplib2.ProxyInfo(
-                        httplib2.socks.PROXY_TYPE_HTTP,
-                        proxy_host,
-                        proxy_port
-                    )
-                    http = httplib2.Http(
-                        proxy_info=proxy_info,
-                        disable_ssl_certificate_validation=True
-                    )
-                else:
-                    http = httplib2.Http(disable_ssl_certificate_validation=True)
-            
-            # 認証されたHTTPクライアントを作成
-            from google_auth_httplib2 import AuthorizedHttp
-            authorized_http = AuthorizedHttp(credentials, http=http)
+            # スレッドごとにHTTPクライアントを持つトランスポートプールを作成
+            # （プロキシ設定は引数または環境変数 HTTP(S)_PROXY から取得）
+            self.transport = HttpTransportPool(credentials, self.proxy_info)
             
             # Google Sheets APIサービスを構築
-            self.service = build('sheets', 'v4', http=authorized_http)
+            self.service = self.transport.build_service('sheets', 'v4')
             
             # Google Drive APIサービスも構築（ファイル検索用）
-            self.drive_service = build('drive', 'v3', http=authorized_http)
+            self.drive_service = self.transport.build_service('drive', 'v3')
             
         except Exception as e:
             print(f"認証エラー: {e}")
@@ -200,7 +160,7 @@ class GoogleSheetsHandlerProxy:
 
 def search_in_target_spreadsheet_proxy(search_text, proxy_info=None):
     """
-    指定されたスプレッドシートでテキストを検索する便利関数（プロキシ対応版）
+    設定されたスプレッドシートでテキストを検索する便利関数（プロキシ対応版）
     
     Args:
         search_text (str): 検索するテキスト
@@ -213,14 +173,14 @@ def search_in_target_spreadsheet_proxy(search_text, proxy_info=None):
         # 認証情報ファイルのパス（環境変数から取得、デフォルトは汎用名）
         credentials_path = os.environ.get("GOOGLE_CREDENTIALS_PATH", "google_service_account.json")
         
-        # 検索対象のスプレッドシート名
-        target_spreadsheet = "I want to use free software / フリーソフトを利用したい のコピー"
-        
         # Google Sheetsハンドラーを初期化（プロキシ対応）
         sheets_handler = GoogleSheetsHandlerProxy(credentials_path, proxy_info)
         
-        # テキストを検索
-        found = sheets_handler.search_text_in_spreadsheet(target_spreadsheet, search_text)
+        # 設定された全てのスプレッドシートでテキストを検索
+        found = any(
+            sheets_handler.search_text_in_spreadsheet(spreadsheet_name, search_text)
+            for spreadsheet_name in spreadsheet_names()
+        )
         
         return "ありました" if found else "ありません"
         
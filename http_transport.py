@@ -0,0 +1,165 @@
+import os
+import threading
+import weakref
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+
+def build_proxy_info(proxy_info=None):
+    """
+    プロキシ設定からhttplib2用のProxyInfoを作成
+
+    Args:
+        proxy_info (dict): プロキシ情報 {'host': 'proxy.company.com', 'port': 8080}
+                           Noneの場合は環境変数 HTTP(S)_PROXY から取得
+
+    Returns:
+        httplib2.ProxyInfo: プロキシ情報（プロキシを使用しない場合はNone）
+    """
+    if proxy_info:
+        return httplib2.ProxyInfo(
+            httplib2.socks.PROXY_TYPE_HTTP,
+            proxy_info['host'],
+            proxy_info['port']
+        )
+
+    # 環境変数からプロキシ設定を取得
+    http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy')
+    https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
+
+    if not (http_proxy or https_proxy):
+        return None
+
+    # プロキシURLをパース
+    proxy_url = https_proxy or http_proxy
+    if '://' in proxy_url:
+        proxy_url = proxy_url.split('://', 1)[1]
+
+    if ':' in proxy_url:
+        proxy_host, proxy_port = proxy_url.split(':', 1)
+        proxy_port = int(proxy_port)
+    else:
+        proxy_host = proxy_url
+        proxy_port = 8080
+
+    return httplib2.ProxyInfo(
+        httplib2.socks.PROXY_TYPE_HTTP,
+        proxy_host,
+        proxy_port
+    )
+
+
+class HttpTransportPool:
+    def __init__(self, credentials, proxy_info=None, timeout=None):
+        """
+        スレッドごとにHTTPクライアントを保持するトランスポートプールを初期化
+
+        httplib2.Httpはスレッドセーフではないため、スレッドごとに専用の
+        AuthorizedHttpを作成して再利用する（各Httpが自身のkeep-alive接続を保持）。
+
+        Args:
+            credentials: Google APIの認証情報
+            proxy_info (dict): プロキシ情報 {'host': 'proxy.company.com', 'port': 8080}
+            timeout (float): ソケットのタイムアウト秒数
+        """
+        self.credentials = credentials
+        self.proxy_info = build_proxy_info(proxy_info)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 終了したスレッドのHTTPクライアントはスレッドローカルと共に解放されるよう、弱参照で保持する
+        self._all_http = weakref.WeakSet()
+
+    def _create_http(self):
+        """
+        プロキシ設定を含む認証済みHTTPクライアントを作成
+
+        Returns:
+            AuthorizedHttp: 認証済みHTTPクライアント
+        """
+        if self.proxy_info:
+            http = httplib2.Http(
+                proxy_info=self.proxy_info,
+                timeout=self.timeout,
+                disable_ssl_certificate_validation=True
+            )
+        else:
+            http = httplib2.Http(
+                timeout=self.timeout,
+                disable_ssl_certificate_validation=True
+            )
+
+        authorized_http = AuthorizedHttp(self.credentials, http=http)
+
+        with self._lock:
+            self._all_http.add(authorized_http)
+
+        return authorized_http
+
+    def get_http(self):
+        """
+        現在のスレッド専用の認証済みHTTPクライアントを取得（なければ作成）
+
+        Returns:
+            AuthorizedHttp: 認証済みHTTPクライアント
+        """
+        authorized_http = getattr(self._local, 'http', None)
+        if authorized_http is None:
+            authorized_http = self._create_http()
+            self._local.http = authorized_http
+        return authorized_http
+
+    def request_builder(self, http, *args, **kwargs):
+        """
+        googleapiclient用のリクエストビルダー
+
+        サービス構築時のHTTPクライアントではなく、リクエストを作成したスレッドの
+        HTTPクライアントを使用する。gzip圧縮レスポンスも要求する。
+
+        Args:
+            http: サービス構築時のHTTPクライアント（使用しない）
+
+        Returns:
+            HttpRequest: スレッド専用のHTTPクライアントを使うリクエスト
+        """
+        headers = kwargs.get('headers') or {}
+        headers.setdefault('accept-encoding', 'gzip, deflate')
+        kwargs['headers'] = headers
+        return HttpRequest(self.get_http(), *args, **kwargs)
+
+    def build_service(self, service_name, version):
+        """
+        このプールを使用するGoogle APIサービスを構築
+
+        Args:
+            service_name (str): サービス名（'sheets', 'drive'など）
+            version (str): APIバージョン
+
+        Returns:
+            Resource: Google APIサービス
+        """
+        return build(
+            service_name,
+            version,
+            http=self.get_http(),
+            requestBuilder=self.request_builder
+        )
+
+    def close(self):
+        """
+        プールが作成した全てのHTTP接続を閉じる
+        """
+        with self._lock:
+            all_http = list(self._all_http)
+            self._all_http = weakref.WeakSet()
+
+        for authorized_http in all_http:
+            try:
+                authorized_http.close()
+            except Exception as e:
+                print(f"HTTP接続クローズエラー: {e}")
+
+        self._local = threading.local()
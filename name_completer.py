@@ -0,0 +1,91 @@
+from bisect import bisect_left
+
+from name_matcher import name_aliases, normalize_name
+
+# 補完候補の最大件数（Slackの external_select は最大100件）
+MAX_COMPLETIONS = 100
+
+# 途中一致（名前の途中に含まれる）の候補を探す入力の最小文字数
+MIN_INFIX_LENGTH = 2
+
+
+class NameCompleter:
+    __slots__ = ('keys', 'ids')
+
+    def __init__(self, keys, ids):
+        """
+        ソフトウェア名の入力補完（前方一致）用のソート済み配列
+
+        Args:
+            keys (list): 正規化したソフトウェア名と略称（昇順）
+            ids (list): keys と同じ並びの文字列ID
+        """
+        self.keys = keys
+        self.ids = ids
+
+    @classmethod
+    def build(cls, pool):
+        """
+        列の文字列プールから作成
+
+        Args:
+            pool: 文字列IDで参照できる文字列のシーケンス（ID 0 は空文字）
+
+        Returns:
+            NameCompleter: 補完用の配列
+        """
+        # 正規化した名前に加え、頭文字による略称（例: 'vscode'）でも前方一致させる
+        entries = sorted(
+            (alias, string_id) for string_id in range(1, len(pool)) for alias in name_aliases(pool[string_id])
+        )
+        return cls([key for key, _ in entries], [string_id for _, string_id in entries])
+
+    def prefix_ids(self, text, limit=MAX_COMPLETIONS):
+        """
+        正規化した名前・略称が入力で始まる文字列ID（名前の昇順、二分探索で開始位置を求める）
+
+        Args:
+            text (str): 入力中のテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: 文字列IDのリスト
+        """
+        prefix = normalize_name(text)
+        if not prefix:
+            return []
+        string_ids = []
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(string_ids) < limit and self.keys[position].startswith(prefix):
+            # 名前と略称の両方が一致する場合は1件とする
+            if self.ids[position] not in string_ids:
+                string_ids.append(self.ids[position])
+            position += 1
+        return string_ids
+
+    def complete(self, snapshot, index, text, limit=MAX_COMPLETIONS):
+        """
+        入力中のテキストに一致するソフトウェア名（1列目）を取得
+
+        前方一致の名前を先に、次に名前の途中に含む名前（スナップショットの索引のバイグラムで絞り込む）を返す。
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            index (SnapshotIndex): スナップショットの索引
+            text (str): 入力中のテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: ソフトウェア名のリスト
+        """
+        string_ids = self.prefix_ids(text, limit)
+        text_lower = text.strip().lower()
+        if len(string_ids) < limit and len(text_lower) >= MIN_INFIX_LENGTH:
+            seen = set(string_ids)
+            for string_id in index.substring_ids(snapshot, 0, text_lower):
+                if string_id not in seen:
+                    string_ids.append(string_id)
+                    if len(string_ids) >= limit:
+                        break
+        pool = snapshot.column_pool(0)
+        return [pool[string_id] for string_id in string_ids]
@@ -0,0 +1,198 @@
+import difflib
+import re
+import unicodedata
+from array import array
+
+from snapshot_index import sorted_position, text_grams
+
+# 「もしかして」として提示する類似度の閾値（0-100）
+SUGGESTION_THRESHOLD = 80
+
+# 類似度を計算する候補数の上限
+MAX_SUGGESTION_CANDIDATES = 200
+
+# 類似度で候補を探す検索テキストの最小文字数（正規化後）
+MIN_FUZZY_LENGTH = 3
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_name(text):
+    """
+    ソフトウェア名を比較用に正規化（全角・半角の統一、大文字小文字の無視、記号と空白の除去）
+
+    Args:
+        text (str): ソフトウェア名
+
+    Returns:
+        str: 正規化した名前（例: 'ＶＳ Code' → 'vscode'）
+    """
+    return _SEPARATORS.sub('', unicodedata.normalize('NFKC', text).casefold())
+
+
+def name_aliases(name):
+    """
+    ソフトウェア名の別名（正規化済み）を列挙
+
+    正規化した名前に加え、複数の単語からなる名前は頭文字による略称も別名とする
+    （例: 'Visual Studio Code' → 'visualstudiocode', 'vscode', 'vsc'）。
+
+    Args:
+        name (str): ソフトウェア名
+
+    Returns:
+        set: 正規化した別名の集合
+    """
+    aliases = {normalize_name(name)}
+    words = [word for word in _SEPARATORS.split(unicodedata.normalize('NFKC', name).casefold()) if word]
+    if len(words) >= 2:
+        aliases.add(''.join(word[0] for word in words[:-1]) + words[-1])
+        if len(words) >= 3:
+            aliases.add(''.join(word[0] for word in words))
+    aliases.discard('')
+    return aliases
+
+
+class AliasIndex:
+    __slots__ = ('keys', 'id_starts', 'ids', 'gram_keys', 'gram_starts', 'gram_positions')
+
+    def __init__(self, keys, id_starts, ids, gram_keys, gram_starts, gram_positions):
+        """
+        正規化した別名からソフトウェア名（文字列ID）を引く索引
+
+        配列のみで構成するため、保存したファイルをmmapしてそのまま参照できる。
+
+        Args:
+            keys: 正規化した別名（昇順）
+            id_starts, ids: 別名ごとの文字列ID（CSR形式）
+            gram_keys: ソート済みのバイグラムのシーケンス
+            gram_starts, gram_positions: バイグラムごとの別名の位置（CSR形式）
+        """
+        self.keys = keys
+        self.id_starts = id_starts
+        self.ids = ids
+        self.gram_keys = gram_keys
+        self.gram_starts = gram_starts
+        self.gram_positions = gram_positions
+
+    @classmethod
+    def build(cls, pool):
+        """
+        列の文字列プールから索引を作成
+
+        Args:
+            pool: 文字列IDで参照できる文字列のシーケンス（ID 0 は空文字）
+
+        Returns:
+            AliasIndex: 別名の索引
+        """
+        aliases = {}
+        for string_id in range(1, len(pool)):
+            for alias in name_aliases(pool[string_id]):
+                aliases.setdefault(alias, []).append(string_id)
+
+        keys = sorted(aliases)
+        id_starts = array('I', [0])
+        ids = array('I')
+        positions_by_gram = {}
+        for position, key in enumerate(keys):
+            ids.extend(aliases[key])
+            id_starts.append(len(ids))
+            for gram in text_grams(key):
+                positions_by_gram.setdefault(gram, []).append(position)
+
+        gram_keys = sorted(positions_by_gram)
+        gram_starts = array('I', [0])
+        gram_positions = array('I')
+        for gram in gram_keys:
+            gram_positions.extend(positions_by_gram[gram])
+            gram_starts.append(len(gram_positions))
+        return cls(keys, id_starts, ids, gram_keys, gram_starts, gram_positions)
+
+    def _alias_ids(self, position):
+        """
+        別名の位置に対応する文字列ID
+        """
+        return self.ids[self.id_starts[position]:self.id_starts[position + 1]]
+
+    def suggest(self, text, limit=3, threshold=SUGGESTION_THRESHOLD):
+        """
+        検索テキストに近いソフトウェア名を類似度の高い順に取得
+
+        Args:
+            text (str): 検索テキスト
+            limit (int): 取得する件数
+            threshold (int): 類似度の閾値（0-100）
+
+        Returns:
+            list: (文字列ID, 類似度) のリスト
+        """
+        query = normalize_name(text)
+        if not query:
+            return []
+
+        scores = {}
+        position = sorted_position(self.keys, query)
+        if position is not None:
+            for string_id in self._alias_ids(position):
+                scores[string_id] = 100
+
+        # 短すぎるテキストは類似度が高くなりやすいため、別名の一致のみとする
+        if len(query) < MIN_FUZZY_LENGTH:
+            return sorted(scores.items())[:limit]
+
+        # 共通するバイグラムの多い別名のみ類似度を計算
+        counts = {}
+        for gram in text_grams(query):
+            gram_position = sorted_position(self.gram_keys, gram)
+            if gram_position is None:
+                continue
+            for position in self.gram_positions[self.gram_starts[gram_position]:self.gram_starts[gram_position + 1]]:
+                counts[position] = counts.get(position, 0) + 1
+        candidates = sorted(counts, key=counts.__getitem__, reverse=True)[:MAX_SUGGESTION_CANDIDATES]
+
+        matcher = difflib.SequenceMatcher(b=query, autojunk=False)
+        for position in candidates:
+            key = self.keys[position]
+            matcher.set_seq1(key)
+            score = round(matcher.ratio() * 100)
+            if score < threshold:
+                continue
+            for string_id in self._alias_ids(position):
+                if scores.get(string_id, 0) < score:
+                    scores[string_id] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+def suggestion_matches(snapshot, index, alias_index, text, limit=3, threshold=SUGGESTION_THRESHOLD):
+    """
+    スナップショットの1列目から「もしかして」の候補を検索結果の形式で取得
+
+    Args:
+        snapshot (SheetSnapshot): 検索対象のスナップショット
+        index (SnapshotIndex): スナップショットの索引
+        alias_index (AliasIndex): 1列目の別名の索引
+        text (str): 検索テキスト
+        limit (int): 取得する件数
+        threshold (int): 類似度の閾値（0-100）
+
+    Returns:
+        list: 検索結果（'type' は 'もしかして'）のリスト
+    """
+    matches = []
+    for string_id, score in alias_index.suggest(text, limit, threshold):
+        rows = index.rows_with_ids(0, [string_id])
+        if not rows:
+            continue
+        row_num = snapshot.row_numbers[rows[0]]
+        matches.append({
+            'type': 'もしかして',
+            'text': snapshot.column_pool(0)[string_id],
+            'position': f'行{row_num}, 列1',
+            'sheet': snapshot.sheet_of(rows[0]),
+            'row': row_num,
+            'score': score
+        })
+    return matches
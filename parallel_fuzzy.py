@@ -0,0 +1,279 @@
+import atexit
+import bisect
+import heapq
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+from fuzzywuzzy import process
+
+# 並列であいまい検索する候補数の閾値（これ未満は呼び出し元のスレッドで比較する）
+PARALLEL_FUZZY_THRESHOLD = int(os.environ.get("PARALLEL_FUZZY_THRESHOLD", "2000"))
+
+# あいまい検索のワーカープロセス数（1以下で並列化しない）
+FUZZY_WORKERS = int(os.environ.get("FUZZY_WORKERS", str(os.cpu_count() or 1)))
+
+# 共有メモリに保持するスナップショット（文字列テーブル）の数
+SHARED_TABLES = 2
+
+# 共有メモリの先頭に置く文字列数（uint32）
+_HEADER = 4
+
+
+class SharedStringTable:
+    __slots__ = ('snapshot', 'sizes', 'bases', 'memory')
+
+    def __init__(self, snapshot, sizes, bases, memory):
+        """
+        スナップショットの全列の文字列プールを共有メモリに配置したテーブル
+
+        共有メモリの内容は [文字列数 N (uint32)] [オフセット (uint32 × N+1)] [UTF-8のバイト列]。
+        テーブル内の番号は「列の先頭番号 + 文字列ID」で、ワーカーは名前で共有メモリに接続して読む。
+
+        Args:
+            snapshot (SheetSnapshot): 元のスナップショット
+            sizes (tuple): 作成時の列ごとの文字列プールのサイズ（スナップショットの変更の検出用）
+            bases (list): 列ごとの先頭番号
+            memory (SharedMemory): 共有メモリ
+        """
+        self.snapshot = snapshot
+        self.sizes = sizes
+        self.bases = bases
+        self.memory = memory
+
+    @classmethod
+    def publish(cls, snapshot):
+        """
+        スナップショットの文字列プールを共有メモリに書き込む
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+
+        Returns:
+            SharedStringTable: テーブル
+        """
+        sizes = tuple(len(snapshot.column_pool(column)) for column in range(snapshot.width))
+        bases = []
+        offsets = array('I', [0])
+        chunks = []
+        length = 0
+        for column, size in enumerate(sizes):
+            bases.append(len(offsets) - 1)
+            pool = snapshot.column_pool(column)
+            for string_id in range(size):
+                chunk = pool[string_id].encode('utf-8')
+                chunks.append(chunk)
+                length += len(chunk)
+                offsets.append(length)
+
+        data = b''.join(chunks)
+        header = array('I', [len(offsets) - 1]).tobytes() + offsets.tobytes()
+        memory = shared_memory.SharedMemory(create=True, size=max(1, len(header) + len(data)))
+        memory.buf[:len(header)] = header
+        memory.buf[len(header):len(header) + len(data)] = data
+        return cls(snapshot, sizes, bases, memory)
+
+    def matches(self, snapshot):
+        """
+        スナップショットがこのテーブルの作成時から変わっていないか
+        """
+        return self.snapshot is snapshot and self.sizes == tuple(
+            len(snapshot.column_pool(column)) for column in range(snapshot.width)
+        )
+
+    def release(self):
+        """
+        共有メモリを解放（接続中のワーカーは切断するまで読める）
+        """
+        self.memory.close()
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ワーカープロセス側: 接続した共有メモリ名 → (SharedMemory, 文字列数)
+_attached = OrderedDict()
+
+
+def _attach(name):
+    """
+    共有メモリのテーブルに接続（ワーカーごとに1回、直近 SHARED_TABLES 件を保持）
+    """
+    entry = _attached.get(name)
+    if entry is not None:
+        _attached.move_to_end(name)
+        return entry
+
+    # spawnしたワーカーは作成したプロセスのresource_trackerを共有するため、登録は作成したプロセスの1件のみとなり、
+    # 作成したプロセスが解放するまで削除されない
+    memory = shared_memory.SharedMemory(name=name)
+    with memory.buf[:_HEADER].cast('I') as header:
+        entry = _attached[name] = (memory, header[0])
+    while len(_attached) > SHARED_TABLES:
+        _, (old_memory, _) = _attached.popitem(last=False)
+        old_memory.close()
+    return entry
+
+
+def _score_shard(name, search_text, ids, limit):
+    """
+    ワーカープロセスで候補の一部を比較し、上位 limit 件を返す
+
+    Args:
+        name (str): 共有メモリ名
+        search_text (str): 検索テキスト
+        ids (bytes): 候補のテーブル内の番号（array('I') のバイト列）
+        limit (int): 返す件数
+
+    Returns:
+        list: [(テーブル内の番号, スコア)] スコアの高い順
+    """
+    memory, count = _attach(name)
+    numbers = array('I')
+    numbers.frombytes(ids)
+    # 候補の文字列のみ共有メモリから直接デコードする（テーブル全体をコピー・デコードしない）
+    start = _HEADER + 4 * (count + 1)
+    with memory.buf[_HEADER:start].cast('I') as offsets, memory.buf[start:] as data:
+        choices = {number: str(data[offsets[number]:offsets[number + 1]], 'utf-8') for number in numbers}
+    return [(number, score) for _, score, number in process.extract(search_text, choices, limit=limit)]
+
+
+class ParallelFuzzyScorer:
+    def __init__(self, workers=FUZZY_WORKERS, threshold=PARALLEL_FUZZY_THRESHOLD):
+        """
+        あいまい検索の候補を複数のプロセスで比較するスコアラー
+
+        ワーカープロセスは常駐し、スナップショットの文字列は共有メモリで受け渡す
+        （呼び出しごとに送るのは検索テキストと候補の番号のみ）。
+
+        Args:
+            workers (int): ワーカープロセス数
+            threshold (int): 並列化する候補数の閾値
+        """
+        self.workers = workers
+        self.threshold = threshold
+        self._tables = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def enabled(self, candidate_count):
+        """
+        候補数が並列化の対象か
+        """
+        return self.workers > 1 and candidate_count >= self.threshold
+
+    def candidate_limit(self, limit):
+        """
+        索引から取り出す列ごとの候補数の上限
+
+        並列化できる場合は、単一スレッドでの上限をワーカー数倍にする
+        （ワーカーごとの比較数は変わらないため、応答時間をほぼ保ったまま候補を増やせる）。
+
+        Args:
+            limit (int): 単一スレッドで比較する場合の上限
+
+        Returns:
+            int: 候補数の上限
+        """
+        return limit * self.workers if self.workers > 1 else limit
+
+    def _table(self, snapshot):
+        """
+        スナップショットの共有メモリのテーブルを取得（ない場合は作成し、古いものを解放）
+        """
+        with self._lock:
+            for table in self._tables:
+                if table.matches(snapshot):
+                    return table
+            table = SharedStringTable.publish(snapshot)
+            self._tables.append(table)
+            while len(self._tables) > SHARED_TABLES:
+                self._tables.pop(0).release()
+            return table
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # ボットのスレッドを引き継がないよう spawn でワーカーを起動
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'))
+            return self._executor
+
+    def extract(self, snapshot, search_text, candidates, limit=10):
+        """
+        候補とのあいまい一致のスコアを並列に計算し、上位 limit 件を返す
+
+        候補をワーカー数で分割し、ワーカーごとの上位 limit 件をまとめて上位 limit 件を選ぶ
+        （fuzzywuzzy の process.extract と同じスコア、同じスコアは候補の順）。
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            search_text (str): 検索テキスト
+            candidates (list): [(列インデックス, 文字列ID)] 候補（重複なし）
+            limit (int): 返す件数
+
+        Returns:
+            list: [(テキスト, スコア)] スコアの高い順
+        """
+        if not candidates:
+            return []
+        table = self._table(snapshot)
+        numbers = array('I', (table.bases[column] + string_id for column, string_id in candidates))
+        shard_size = -(-len(numbers) // self.workers)
+        try:
+            executor = self._pool()
+            futures = [
+                executor.submit(_score_shard, table.memory.name, search_text, numbers[start:start + shard_size].tobytes(), limit)
+                for start in range(0, len(numbers), shard_size)
+            ]
+            # 分割の順に連結するため、同じスコアは候補の順のまま
+            scored = [item for future in futures for item in future.result()]
+        except BrokenProcessPool as e:
+            print(f"あいまい検索のワーカーが停止したため、プロセスプールを作り直します: {e}")
+            with self._lock:
+                self._executor = None
+            raise
+
+        top = heapq.nlargest(limit, scored, key=lambda item: item[1])
+        results = []
+        for number, score in top:
+            column = bisect.bisect_right(table.bases, number) - 1
+            results.append((snapshot.column_pool(column)[number - table.bases[column]], score))
+        return results
+
+    def shutdown(self):
+        """
+        ワーカープロセスを停止し、共有メモリを解放
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            for table in self._tables:
+                table.release()
+            self._tables = []
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_fuzzy_scorer():
+    """
+    共有のParallelFuzzyScorerを取得
+
+    ワーカー数は環境変数 FUZZY_WORKERS、並列化する候補数の閾値は PARALLEL_FUZZY_THRESHOLD で設定可能
+
+    Returns:
+        ParallelFuzzyScorer: 共有スコアラー
+    """
+    global _scorer
+    with _scorer_lock:
+        if _scorer is None:
+            _scorer = ParallelFuzzyScorer()
+            atexit.register(_scorer.shutdown)
+        return _scorer
@@ -0,0 +1,246 @@
+import os
+import random
+import threading
+import time
+
+# リトライ対象のHTTPステータス（レート制限とサーバーエラー）
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class QuotaExceededError(Exception):
+    """
+    リトライ上限または期限までにリクエストが成功しなかった場合の例外
+    """
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        """
+        トークンバケットを初期化
+
+        Args:
+            rate_per_minute (float): 1分あたりに補充されるトークン数
+            capacity (float): バケットの最大容量（省略時は1分間分）
+            clock (callable): 現在時刻を返す関数（テスト用）
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        トークンを待たずに取得を試みる
+
+        Args:
+            tokens (float): 取得するトークン数
+
+        Returns:
+            bool: 取得できた場合True
+        """
+        with self._lock:
+            self._refill(self.clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def charge(self, tokens):
+        """
+        残高が負になることを許してトークンを消費（容量を超える一括処理は、不足分が補充されるまで後続を待たせる）
+
+        Args:
+            tokens (float): 消費するトークン数
+        """
+        with self._lock:
+            self._refill(self.clock())
+            self._tokens -= tokens
+
+    def acquire(self, tokens=1, deadline=None):
+        """
+        トークンが補充されるまで待機して取得
+
+        Args:
+            tokens (float): 取得するトークン数
+            deadline (float): time.monotonic()基準の期限（Noneの場合は無期限）
+
+        Returns:
+            bool: 取得できた場合True、期限までに取得できない場合False
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate if self.rate > 0 else float('inf')
+
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    @property
+    def available(self):
+        """
+        現在利用可能なトークン数
+        """
+        with self._lock:
+            self._refill(self.clock())
+            return self._tokens
+
+
+def _error_status(error):
+    """
+    例外からHTTPステータスコードを取得（HttpError以外はNone）
+    """
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(error):
+    """
+    例外のレスポンスからRetry-Afterヘッダーの秒数を取得
+    """
+    resp = getattr(error, 'resp', None)
+    if resp is None or not hasattr(resp, 'get'):
+        return None
+    value = resp.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaGovernor:
+    def __init__(self, requests_per_minute=60, max_retries=5, base_delay=1.0, max_delay=32.0, timeout=30.0):
+        """
+        クォータを考慮したリクエスト制御を初期化
+
+        Args:
+            requests_per_minute (int): 1分あたりのリクエスト上限（プロジェクトのクォータ）
+            max_retries (int): 429/5xx時の最大リトライ回数
+            base_delay (float): 指数バックオフの基準秒数
+            max_delay (float): バックオフの最大秒数
+            timeout (float): 1リクエストあたりのデフォルト期限（秒）
+        """
+        self.bucket = TokenBucket(requests_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    def _backoff(self, attempt, error):
+        """
+        リトライまでの待機秒数を計算（フルジッター付き指数バックオフ）
+        """
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, timeout=None):
+        """
+        トークンバケットでペース配分し、429/5xx時はリトライして関数を実行
+
+        Args:
+            func (callable): 引数なしで呼び出すリクエスト関数
+            timeout (float): 期限（秒）。省略時はデフォルト期限
+
+        Returns:
+            関数の戻り値
+
+        Raises:
+            QuotaExceededError: リトライ上限または期限に達した場合
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        attempt = 0
+
+        while True:
+            if not self.bucket.acquire(deadline=deadline):
+                raise QuotaExceededError("リクエスト期限までにクォータを確保できませんでした")
+
+            try:
+                return func()
+            except (ConnectionError, TimeoutError) as e:
+                last_error = e
+            except Exception as e:
+                if _error_status(e) not in RETRYABLE_STATUSES:
+                    raise
+                last_error = e
+
+            if attempt >= self.max_retries:
+                raise QuotaExceededError(f"リトライ上限に達しました: {last_error}") from last_error
+
+            delay = self._backoff(attempt, last_error)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise QuotaExceededError(f"リクエスト期限に達しました: {last_error}") from last_error
+
+            print(f"Google APIリトライ待機中（{attempt + 1}回目, {delay:.1f}秒）: {last_error}")
+            time.sleep(delay)
+            attempt += 1
+
+    def execute(self, request, timeout=None):
+        """
+        googleapiclientのリクエストをクォータ制御下で実行
+
+        Args:
+            request (HttpRequest): 実行するリクエスト
+            timeout (float): 期限（秒）
+
+        Returns:
+            dict: レスポンス
+        """
+        return self.call(request.execute, timeout=timeout)
+
+
+# API種別ごとの共有ガバナー（プロセス内の全ハンドラーで共有）
+_governors = {}
+_governors_lock = threading.Lock()
+
+_DEFAULT_QUOTAS = {
+    'sheets': ('SHEETS_READ_QUOTA_PER_MINUTE', 60),
+    'sheets_write': ('SHEETS_WRITE_QUOTA_PER_MINUTE', 60),
+    'drive': ('DRIVE_QUOTA_PER_MINUTE', 600),
+}
+
+# リトライしないAPI種別（書き込みは5xxでも反映済みの場合があるため、呼び出し元で確認してから再実行する）
+_NO_RETRY_APIS = {'sheets_write'}
+
+
+def get_governor(api='sheets'):
+    """
+    API種別ごとの共有QuotaGovernorを取得
+
+    クォータは環境変数 SHEETS_READ_QUOTA_PER_MINUTE / SHEETS_WRITE_QUOTA_PER_MINUTE / DRIVE_QUOTA_PER_MINUTE で設定可能
+
+    Args:
+        api (str): API種別（'sheets'、'sheets_write' または 'drive'）
+
+    Returns:
+        QuotaGovernor: 共有ガバナー
+    """
+    with _governors_lock:
+        governor = _governors.get(api)
+        if governor is None:
+            env_name, default_quota = _DEFAULT_QUOTAS.get(api, (None, 60))
+            quota = float(os.environ.get(env_name, default_quota)) if env_name else default_quota
+            if api in _NO_RETRY_APIS:
+                governor = QuotaGovernor(requests_per_minute=quota, max_retries=0)
+            else:
+                governor = QuotaGovernor(requests_per_minute=quota)
+            _governors[api] = governor
+        return governor
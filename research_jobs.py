@@ -0,0 +1,169 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from name_matcher import normalize_name
+
+# 「見つからなかった」結果をキャッシュする期間（秒）
+NEGATIVE_CACHE_TTL = float(os.environ.get("NEGATIVE_CACHE_TTL", "300"))
+
+# 同時に実行するソフトウェア調査の数
+RESEARCH_WORKERS = int(os.environ.get("RESEARCH_WORKERS", "4"))
+
+# 共有キャッシュに置く「調査中」の印の有効期間（秒、印を置いたプロセスが停止した場合に解放される）
+RESEARCH_IN_FLIGHT_TTL = float(os.environ.get("RESEARCH_IN_FLIGHT_TTL", "180"))
+
+# 別のプロセスの調査の完了を確認する間隔（秒）
+RESEARCH_POLL_INTERVAL = 0.5
+
+
+class NegativeCache:
+    def __init__(self, cache, ttl=NEGATIVE_CACHE_TTL, change_log=None):
+        """
+        「スナップショットのバージョンXには存在しない」という検索結果のキャッシュ
+
+        記録時のスナップショットのバージョンを値として保存する。スナップショットが更新された場合、
+        差分の記録（change_log）があれば、その間の変更で検索テキストが見つかるようになり得る場合のみ
+        無効とし、影響しない場合は現在のバージョンで記録し直して引き続き参照する。
+        差分の記録がない場合は、バージョンが変わった時点で参照しない。
+
+        Args:
+            cache (CacheBackend): 保存先のキャッシュ
+            ttl (float): 有効期間（秒）
+            change_log (SnapshotChangeLog): スナップショットの差分の記録
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.change_log = change_log
+
+    @staticmethod
+    def _key(search_text):
+        # 記号のみのテキストは正規化すると空になるため、元のテキストをキーにする
+        return f"negative:{normalize_name(search_text) or search_text.strip().lower()}"
+
+    def contains(self, search_text, versions):
+        """
+        指定したバージョンのスナップショットに存在しないことが記録されているか判定
+
+        Args:
+            search_text (str): 検索テキスト
+            versions (tuple): ソースごとのスナップショットのバージョン（Noneを含む場合は常にFalse）
+
+        Returns:
+            bool: 記録されている場合True
+        """
+        if not versions or None in versions:
+            return False
+        key = self._key(search_text)
+        entry = self.cache.get_json(key)
+        if entry is None:
+            return False
+        recorded = entry.get('versions')
+        if recorded == list(versions):
+            return True
+        if self.change_log is None or self.change_log.affects(search_text, recorded, versions):
+            self.cache.delete(key)
+            return False
+        # 変更が検索テキストに影響しないため、現在のバージョンで記録し直す
+        self.cache.set_json(key, {'versions': list(versions)}, self.ttl)
+        return True
+
+    def add(self, search_text, versions):
+        """
+        指定したバージョンのスナップショットに存在しないことを記録
+        """
+        if not versions or None in versions:
+            return
+        self.cache.set_json(self._key(search_text), {'versions': list(versions)}, self.ttl)
+
+
+class ResearchRegistry:
+    def __init__(self, max_workers=RESEARCH_WORKERS, cache=None, in_flight_ttl=RESEARCH_IN_FLIGHT_TTL,
+                 poll_interval=RESEARCH_POLL_INTERVAL):
+        """
+        実行中のソフトウェア調査の登録簿（同じソフトウェアの調査を1回にまとめる）
+
+        cache を指定した場合は「調査中」の印を共有キャッシュにも置き、別のプロセスで同じソフトウェアを
+        調査中であれば、その完了を待ってから func を呼び出す（完了した調査は調査結果のキャッシュから返る）。
+
+        Args:
+            max_workers (int): 同時に実行する調査の数
+            cache (CacheBackend): プロセス間で「調査中」の印を共有するキャッシュ（Noneの場合はプロセス内のみ）
+            in_flight_ttl (float): 「調査中」の印の有効期間（秒）
+            poll_interval (float): 別のプロセスの調査の完了を確認する間隔（秒）
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='research')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.cache = cache
+        self.in_flight_ttl = in_flight_ttl
+        self.poll_interval = poll_interval
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}".encode('utf-8')
+
+    def submit(self, software_name, func):
+        """
+        調査を開始する。同じソフトウェアの調査が実行中の場合は、その調査の結果を共有する
+
+        Args:
+            software_name (str): ソフトウェア名（正規化して同じ調査か判定する）
+            func (callable): 引数なしで呼び出す調査処理
+
+        Returns:
+            tuple: (Future, 新しく開始した場合True)
+        """
+        key = normalize_name(software_name) or software_name.strip().lower()
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            started = True
+            if self.cache is None:
+                future = self._executor.submit(func)
+            elif self.cache.add(self._marker_key(key), self.owner_id, self.in_flight_ttl):
+                future = self._executor.submit(self._run_marked, key, func)
+            else:
+                # 別のプロセスで調査中
+                future = self._executor.submit(self._await_other, key, func)
+                started = False
+            self._in_flight[key] = future
+
+        # 完了した調査は登録簿から外す（以降は調査結果のキャッシュを参照する）
+        future.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return future, started
+
+    @staticmethod
+    def _marker_key(key):
+        return f"research_in_flight:{key}"
+
+    def _run_marked(self, key, func):
+        try:
+            return func()
+        finally:
+            # 自分の印のみを解放する（期限切れ後に別のプロセスが置いた印は残す）
+            self.cache.compare_and_set(self._marker_key(key), self.owner_id, self.owner_id, 0)
+
+    def _await_other(self, key, func):
+        while self.cache.get(self._marker_key(key)) is not None:
+            time.sleep(self.poll_interval)
+        return func()
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def in_flight(self):
+        """
+        実行中の調査の数
+        """
+        with self._lock:
+            return len(self._in_flight)
+
+    def shutdown(self, wait=True):
+        """
+        調査の受け付けを終了
+        """
+        self._executor.shutdown(wait=wait)
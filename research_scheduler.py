@@ -0,0 +1,474 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, wait
+
+import openai
+
+from quota_governor import RETRYABLE_STATUSES, TokenBucket
+
+# 優先度（値が小さいほど先に実行する）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# 実行時間がこのパーセンタイルを超えた呼び出しは、重複した呼び出し（ヘッジ）を追加で開始する
+HEDGE_PERCENTILE = float(os.environ.get("RESEARCH_HEDGE_PERCENTILE", "95"))
+
+# ヘッジの数の上限（ヘッジ対象の呼び出し数に対する割合）。追加の費用をこの割合までに抑える
+HEDGE_MAX_RATIO = float(os.environ.get("RESEARCH_HEDGE_MAX_RATIO", "0.1"))
+
+# パーセンタイルの計算に必要な実行時間の記録数（これより少ない場合はヘッジしない）
+HEDGE_MIN_SAMPLES = 20
+
+
+class ResearchQueueTimeout(Exception):
+    """
+    期限までに実行を開始・完了できなかった場合の例外
+    """
+
+
+def _status_code(error):
+    """
+    OpenAI APIの例外からHTTPステータスコードを取得（ない場合はNone）
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(error):
+    """
+    OpenAI APIの例外のレスポンスからRetry-Afterの秒数を取得
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after') is not None:
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+# リトライで回復する可能性のあるOpenAI APIの例外（APITimeoutErrorはAPIConnectionErrorのサブクラス）
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError, ConnectionError, TimeoutError
+)
+
+
+def _is_retryable(error):
+    """
+    リトライで回復する可能性のある例外か判定（429/5xx・接続エラー・タイムアウト）
+    """
+    if isinstance(error, _RETRYABLE_ERRORS):
+        return True
+    return _status_code(error) in RETRYABLE_STATUSES
+
+
+def _is_rate_limited(error):
+    """
+    レート制限（429）の例外か判定
+    """
+    return isinstance(error, openai.RateLimitError) or _status_code(error) == 429
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        """
+        直近の呼び出しの実行時間の記録（パーセンタイルの計算用）
+
+        Args:
+            window (int): 記録する呼び出しの数
+        """
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent, min_samples=HEDGE_MIN_SAMPLES):
+        """
+        実行時間のパーセンタイル
+
+        Args:
+            percent (float): パーセンタイル（0-100）
+            min_samples (int): 必要な記録数
+
+        Returns:
+            float: 実行時間（秒）。記録が足りない場合はNone
+        """
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            samples = sorted(self._samples)
+        position = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[position]
+
+
+class _Job:
+    __slots__ = ('func', 'priority', 'tokens', 'deadline', 'future', 'attempt', 'queued_at', 'sequence',
+                 'started_at', 'dispatched', 'cancelled')
+
+    def __init__(self, func, priority, tokens, deadline):
+        self.func = func
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.future = Future()
+        self.attempt = 0
+        self.queued_at = time.monotonic()
+        self.sequence = None
+        self.started_at = None
+        # 実行を開始した（または開始せずに終了した）ことの通知
+        self.dispatched = threading.Event()
+        self.cancelled = False
+
+
+class ResearchScheduler:
+    def __init__(self, max_concurrency=2, tokens_per_minute=40000, max_retries=4, base_delay=1.0, max_delay=60.0,
+                 hedge_percentile=HEDGE_PERCENTILE, hedge_max_ratio=HEDGE_MAX_RATIO):
+        """
+        OpenAI APIの呼び出しを優先度付きキューで制御するスケジューラー
+
+        同時実行数と1分あたりのトークン数を制限し、429/5xxの場合は Retry-After に従って
+        全体の実行を一時停止してからリトライする。
+
+        Args:
+            max_concurrency (int): 同時に実行する呼び出しの数
+            tokens_per_minute (int): 1分あたりのトークン数の上限
+            max_retries (int): 429/5xx時の最大リトライ回数
+            base_delay (float): 指数バックオフの基準秒数
+            max_delay (float): バックオフの最大秒数
+            hedge_percentile (float): hedged_call でヘッジを開始する実行時間のパーセンタイル
+            hedge_max_ratio (float): hedged_call の呼び出し数に対するヘッジの数の上限
+        """
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.latency = LatencyTracker()
+
+        self._queue = []
+        # バックオフ中の呼び出し（再実行できる時刻の順）
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._running = 0
+        self._stopped = False
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'retries': 0, 'rate_limited': 0, 'expired': 0,
+            'cancelled': 0, 'hedged_calls': 0, 'hedges': 0, 'hedge_wins': 0
+        }
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f'research-scheduler-{number}', daemon=True)
+            for number in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, priority=PRIORITY_INTERACTIVE, tokens=1000, timeout=None):
+        """
+        呼び出しをキューに追加
+
+        Args:
+            func (callable): 引数なしで呼び出すAPI呼び出し
+            priority (int): 優先度（PRIORITY_INTERACTIVE / PRIORITY_BATCH）
+            tokens (int): 消費するトークン数の見積もり
+            timeout (float): 実行開始までの期限（秒）。Noneの場合は無期限
+
+        Returns:
+            Future: 呼び出しの結果
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return self._enqueue(func, priority, tokens, deadline).future
+
+    def call(self, func, priority=PRIORITY_INTERACTIVE, tokens=1000, timeout=None):
+        """
+        呼び出しをキューに追加して結果を待つ
+
+        Raises:
+            ResearchQueueTimeout: 期限までに実行を開始できなかった場合
+            Exception: リトライ上限に達した場合は最後の例外
+        """
+        return self.submit(func, priority, tokens, timeout).result()
+
+    def hedged_call(self, func, priority=PRIORITY_INTERACTIVE, tokens=1000, deadline=None):
+        """
+        期限付きで呼び出し、遅い場合は重複した呼び出し（ヘッジ）を追加して先に成功した結果を返す
+
+        実行時間が直近の呼び出しの hedge_percentile パーセンタイルを超えた場合にヘッジを開始する。
+        ヘッジの数は呼び出し数の hedge_max_ratio までに制限する。結果が返った時点で残りの呼び出しは
+        取り消す（実行中の場合は結果を破棄する。APIの呼び出し自体は func 側のタイムアウトで終了させる）。
+
+        Args:
+            func (callable): 引数なしで呼び出すAPI呼び出し（期限までに終了するようタイムアウトを指定すること）
+            priority (int): 優先度
+            tokens (int): 1回の呼び出しで消費するトークン数の見積もり
+            deadline (float): 期限（time.monotonic() の値）。Noneの場合は無期限
+
+        Returns:
+            呼び出しの結果
+
+        Raises:
+            ResearchQueueTimeout: 期限までに完了しなかった場合
+            Exception: すべての呼び出しが失敗した場合は最初の例外
+        """
+        primary = self._enqueue(func, priority, tokens, deadline)
+        jobs = [primary]
+        with self._condition:
+            self._stats['hedged_calls'] += 1
+
+        try:
+            hedge_after = self.latency.percentile(self.hedge_percentile)
+            if hedge_after is not None:
+                # ヘッジの待ち時間はキューの待ち時間を含めず、実行を開始してから数える
+                primary.dispatched.wait(self._remaining(deadline))
+                if primary.started_at is not None:
+                    hedge_at = primary.started_at + hedge_after
+                    if deadline is not None:
+                        hedge_at = min(hedge_at, deadline)
+                    wait([primary.future], max(0.0, hedge_at - time.monotonic()))
+                    if not primary.future.done() and self._remaining(deadline) != 0 and self._allow_hedge():
+                        jobs.append(self._enqueue(func, priority, tokens, deadline))
+
+            pending = {job.future for job in jobs}
+            error = None
+            while pending:
+                done, pending = wait(pending, self._remaining(deadline), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise ResearchQueueTimeout("調査が期限までに完了しませんでした")
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    if future.exception() is None:
+                        if future is not primary.future:
+                            with self._condition:
+                                self._stats['hedge_wins'] += 1
+                        return future.result()
+                    error = error or future.exception()
+            raise error
+        finally:
+            for job in jobs:
+                self._cancel(job)
+
+    @staticmethod
+    def _remaining(deadline):
+        """
+        期限までの残り秒数（期限がない場合はNone）
+        """
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _allow_hedge(self):
+        with self._condition:
+            if self._stats['hedges'] >= self.hedge_max_ratio * self._stats['hedged_calls']:
+                return False
+            self._stats['hedges'] += 1
+            return True
+
+    def _cancel(self, job):
+        """
+        呼び出しを取り消す（キュー内の場合は実行せず、実行中の場合はリトライしない）
+        """
+        with self._condition:
+            job.cancelled = True
+        job.future.cancel()
+
+    def _enqueue(self, func, priority, tokens, deadline):
+        job = _Job(func, priority, min(tokens, self.bucket.capacity), deadline)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("スケジューラーは停止しています")
+            self._push(job)
+            self._stats['submitted'] += 1
+        return job
+
+    def _push(self, job):
+        # リトライ時は最初の順番のまま戻す（同じ優先度の新しい呼び出しより先に実行する）
+        if job.sequence is None:
+            job.sequence = next(self._sequence)
+        heapq.heappush(self._queue, (job.priority, job.sequence, job))
+        self._condition.notify()
+
+    def _next_job(self):
+        """
+        実行する次の呼び出しを取得（一時停止中・キューが空の場合は待機）
+        """
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self._delayed)
+                    self._push(job)
+                wait = self._paused_until - now
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                if not self._queue:
+                    self._condition.wait(self._delayed[0][0] - now if self._delayed else None)
+                    continue
+                _, _, job = heapq.heappop(self._queue)
+                if job.cancelled or job.future.cancelled():
+                    self._stats['cancelled'] += 1
+                    if not job.future.done():
+                        job.future.set_exception(CancelledError())
+                    job.dispatched.set()
+                    continue
+                if job.deadline is not None and time.monotonic() > job.deadline:
+                    self._stats['expired'] += 1
+                    job.future.set_exception(ResearchQueueTimeout("調査の待ち時間が期限を超えました"))
+                    job.dispatched.set()
+                    continue
+                if job.attempt == 0:
+                    job.future.set_running_or_notify_cancel()
+                self._running += 1
+                return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            # トークン数の上限まで待機（期限がある場合は期限まで）
+            if not self.bucket.acquire(job.tokens, deadline=job.deadline):
+                self._finish(job, error=ResearchQueueTimeout("トークン数の上限により期限までに実行できませんでした"))
+                continue
+
+            if job.started_at is None:
+                job.started_at = time.monotonic()
+                job.dispatched.set()
+            attempt_started = time.monotonic()
+            try:
+                result = job.func()
+            except Exception as e:
+                if _is_retryable(e) and job.attempt < self.max_retries and not job.cancelled:
+                    self._retry(job, e)
+                    continue
+                self._finish(job, error=e)
+                continue
+            self.latency.record(time.monotonic() - attempt_started)
+            self._finish(job, result=result)
+
+    def _retry(self, job, error):
+        """
+        Retry-After（ない場合は指数バックオフ）の秒数の後に再実行するよう、キューに戻す
+
+        待機中は同時実行数の枠を使用しない。429の場合は他の呼び出しも同じ制限を受けるため、
+        スケジューラー全体の実行を停止する。それ以外はこの呼び出しのみ、再実行できる時刻まで取り出さない。
+        """
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** job.attempt)))
+        delay = min(self.max_delay, delay)
+        print(f"OpenAI APIリトライ待機中（{job.attempt + 1}回目, {delay:.1f}秒）: {error}")
+
+        rate_limited = _is_rate_limited(error)
+        with self._condition:
+            job.attempt += 1
+            self._running -= 1
+            self._stats['retries'] += 1
+            if rate_limited:
+                # レート制限は全体に影響するため、他の呼び出しも開始しない
+                self._stats['rate_limited'] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._push(job)
+            else:
+                heapq.heappush(self._delayed, (time.monotonic() + delay, job.sequence, job))
+            self._condition.notify_all()
+
+    def _finish(self, job, result=None, error=None):
+        finished = time.monotonic()
+        started = job.started_at if job.started_at is not None else finished
+        with self._condition:
+            self._running -= 1
+            self._total_wait += started - job.queued_at
+            self._total_run += finished - started
+            self._stats['failed' if error is not None else 'completed'] += 1
+        job.dispatched.set()
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def metrics(self):
+        """
+        キューの状態と統計情報
+
+        Returns:
+            dict: 待機中・バックオフ中・実行中の数、優先度ごとの待機数、完了・失敗・リトライ数、平均待ち時間・実行時間など
+        """
+        with self._condition:
+            queued_by_priority = {}
+            for priority, _, _ in self._queue:
+                queued_by_priority[priority] = queued_by_priority.get(priority, 0) + 1
+            finished = self._stats['completed'] + self._stats['failed']
+            return dict(
+                self._stats,
+                queued=len(self._queue),
+                queued_by_priority=queued_by_priority,
+                backing_off=len(self._delayed),
+                running=self._running,
+                paused_for=max(0.0, self._paused_until - time.monotonic()),
+                available_tokens=self.bucket.available,
+                average_wait=self._total_wait / finished if finished else 0.0,
+                average_run=self._total_run / finished if finished else 0.0
+            )
+
+    def shutdown(self):
+        """
+        スケジューラーを停止（待機中の呼び出しは取り消す）
+        """
+        with self._condition:
+            self._stopped = True
+            pending = [job for _, _, job in self._queue] + [job for _, _, job in self._delayed]
+            self._queue = []
+            self._delayed = []
+            self._condition.notify_all()
+        for job in pending:
+            job.future.cancel()
+
+
+# プロセス内で共有するスケジューラー
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_research_scheduler():
+    """
+    共有のResearchSchedulerを取得（初回のみ作成）
+
+    同時実行数は環境変数 OPENAI_MAX_CONCURRENCY、1分あたりのトークン数は
+    OPENAI_TOKENS_PER_MINUTE で設定可能
+
+    Returns:
+        ResearchScheduler: 共有スケジューラー
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ResearchScheduler(
+                max_concurrency=int(os.environ.get("OPENAI_MAX_CONCURRENCY", "2")),
+                tokens_per_minute=int(os.environ.get("OPENAI_TOKENS_PER_MINUTE", "40000"))
+            )
+        return _scheduler
@@ -0,0 +1,145 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# 検索結果（カーソル）を保持する期間（秒）
+RESULT_CURSOR_TTL = float(os.environ.get("RESULT_CURSOR_TTL", "900"))
+
+# 保持するカーソルの最大数（超えた場合は最も長く参照されていないものから削除）
+RESULT_CURSOR_CAPACITY = int(os.environ.get("RESULT_CURSOR_CAPACITY", "1000"))
+
+
+def _entry(query, result):
+    """
+    ページの表示に必要な部分のみを検索結果から取り出す
+    """
+    return {
+        'query': query,
+        'matches': list(result['matches']),
+        'stale': bool(result.get('stale')),
+        'failed_sources': list(result.get('failed_sources') or []),
+    }
+
+
+def _page(entry, page, page_size):
+    """
+    保存した検索結果から1ページ分を切り出す（範囲外のページ番号は最初・最後のページとする）
+    """
+    total = len(entry['matches'])
+    pages = max(1, -(-total // page_size))
+    page = min(max(page, 0), pages - 1)
+    start = page * page_size
+    return {
+        'query': entry['query'],
+        'matches': entry['matches'][start:start + page_size],
+        'start': start + 1,
+        'total': total,
+        'page': page,
+        'pages': pages,
+        'stale': entry['stale'],
+        'failed_sources': entry['failed_sources'],
+    }
+
+
+def first_page(query, result, page_size):
+    """
+    検索結果の最初のページ（カーソルに保存せずに表示する場合）
+
+    Args:
+        query (str): 検索したテキスト
+        result (dict): 検索結果
+        page_size (int): 1ページの件数
+
+    Returns:
+        dict: {'query', 'matches'（ページ分）, 'start'（ページ先頭の順位、1から）, 'total', 'page', 'pages',
+               'stale', 'failed_sources'}
+    """
+    return _page(_entry(query, result), 0, page_size)
+
+
+class ResultCursorStore:
+    def __init__(self, capacity=RESULT_CURSOR_CAPACITY, ttl=RESULT_CURSOR_TTL, clock=time.monotonic, cache=None):
+        """
+        検索結果の全件を短期間保持し、ページ単位で返すカーソルの保存先（プロセス内、LRU）
+
+        ページの表示は保持した結果を切り出すのみで、スプレッドシートの取得や検索は再実行しない。
+        cache を指定した場合はプロセス内ではなく共有キャッシュに保存する（「次のページ」の操作を
+        別のワーカープロセスが受け取っても同じカーソルを参照できる。件数の上限はキャッシュ側に従う）。
+
+        Args:
+            capacity (int): 保持するカーソルの最大数（プロセス内に保持する場合）
+            ttl (float): カーソルの有効期間（秒、最後に参照した時点から）
+            clock (callable): 現在時刻を返す関数（テスト用、プロセス内に保持する場合）
+            cache (CacheBackend): 保存先の共有キャッシュ（Noneの場合はプロセス内）
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.cache = cache
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(cursor_id):
+        return f"cursor:{cursor_id}"
+
+    def put(self, query, result):
+        """
+        検索結果を保存してカーソルIDを発行
+
+        Args:
+            query (str): 検索したテキスト
+            result (dict): 検索結果（'matches' は順位の高い順）
+
+        Returns:
+            str: カーソルID
+        """
+        cursor_id = secrets.token_urlsafe(9)
+        entry = _entry(query, result)
+        if self.cache is not None:
+            self.cache.set_json(self._key(cursor_id), entry, self.ttl)
+            return cursor_id
+        with self._lock:
+            self._entries[cursor_id] = (self.clock() + self.ttl, entry)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return cursor_id
+
+    def page(self, cursor_id, page, page_size):
+        """
+        カーソルの検索結果から1ページ分を取得
+
+        Args:
+            cursor_id (str): カーソルID
+            page (int): ページ番号（0から）
+            page_size (int): 1ページの件数
+
+        Returns:
+            dict: first_page() と同じ形式のページ（期限切れ・削除済みの場合はNone）
+        """
+        if self.cache is not None:
+            entry = self.cache.get_json(self._key(cursor_id))
+            if entry is None:
+                return None
+            # 参照した時点から有効期間を延ばす
+            self.cache.set_json(self._key(cursor_id), entry, self.ttl)
+            return _page(entry, page, page_size)
+
+        now = self.clock()
+        with self._lock:
+            item = self._entries.get(cursor_id)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= now:
+                del self._entries[cursor_id]
+                return None
+            self._entries[cursor_id] = (now + self.ttl, entry)
+            self._entries.move_to_end(cursor_id)
+
+        return _page(entry, page, page_size)
+
+    def __len__(self):
+        return len(self._entries)
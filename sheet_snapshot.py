@@ -0,0 +1,321 @@
+import sys
+from array import array
+
+
+class StringPool:
+    __slots__ = ('strings', '_ids', '_lower')
+
+    def __init__(self, strings=None):
+        """
+        重複を除いた文字列のプール（ID 0 は空文字）
+
+        Args:
+            strings (list): 初期の文字列リスト（先頭は空文字であること）
+        """
+        self.strings = strings if strings is not None else ['']
+        self._ids = None
+        self._lower = None
+
+    def intern(self, text):
+        """
+        文字列をプールに登録してIDを返す（登録済みの場合は既存のID）
+
+        Args:
+            text (str): 登録する文字列
+
+        Returns:
+            int: 文字列のID
+        """
+        if not text:
+            return 0
+        if self._ids is None:
+            self._ids = {string: index for index, string in enumerate(self.strings)}
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(sys.intern(text))
+            self._ids[text] = string_id
+            self._lower = None
+        return string_id
+
+    def find(self, text):
+        """
+        文字列のIDを検索（登録されていない場合はNone、プールは変更しない）
+
+        Args:
+            text (str): 検索する文字列
+
+        Returns:
+            int: 文字列のID
+        """
+        if not text:
+            return 0
+        ids = self._ids
+        if ids is None:
+            ids = {string: index for index, string in enumerate(self.strings)}
+            self._ids = ids
+        return ids.get(text)
+
+    def lower(self):
+        """
+        小文字化した文字列のリスト（検索用、初回のみ作成）
+        """
+        lower = self._lower
+        if lower is None or len(lower) != len(self.strings):
+            lower = [string.lower() for string in self.strings]
+            self._lower = lower
+        return lower
+
+    def copy(self):
+        return StringPool(list(self.strings))
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class SnapshotRow:
+    __slots__ = ('_snapshot', 'index')
+
+    def __init__(self, snapshot, index):
+        """
+        スナップショット内の1行を参照するビュー（データはコピーしない）
+
+        Args:
+            snapshot (SheetSnapshot): 参照元のスナップショット
+            index (int): スナップショット内の行インデックス
+        """
+        self._snapshot = snapshot
+        self.index = index
+
+    @property
+    def values(self):
+        """
+        行データ（列位置どおりの文字列リスト、末尾の空セルは除く）
+        """
+        return self._snapshot.row_values(self.index)
+
+    @property
+    def row_number(self):
+        """
+        スプレッドシート上の実際の行番号
+        """
+        return self._snapshot.row_numbers[self.index]
+
+    @property
+    def sheet(self):
+        """
+        シート名
+        """
+        return self._snapshot.sheet_of(self.index)
+
+    def __getitem__(self, column):
+        return self._snapshot.cell(self.index, column)
+
+    def __iter__(self):
+        # 従来の (行データ, 行番号, シート名) タプルとして展開できるようにする
+        return iter((self.values, self.row_number, self.sheet))
+
+    def __repr__(self):
+        return f"SnapshotRow({self.values!r}, {self.row_number}, {self.sheet!r})"
+
+
+class SheetSnapshot:
+    __slots__ = ('pools', 'cells', 'row_numbers', 'sheet_ids', 'sheets', 'version', 'metadata')
+
+    def __init__(self, version=0, metadata=None):
+        """
+        スプレッドシートのデータを列指向で保持するコンパクトなスナップショット
+
+        各列は重複を除いた文字列プールと、行ごとの文字列IDの配列（array('I')）で保持する。
+        行番号は array('I')、シート名はシート名プールのIDで保持する。
+
+        Args:
+            version (int): スナップショットのバージョン
+            metadata (dict): 付加情報（スプレッドシートID、更新日時など）
+        """
+        self.pools = []
+        self.cells = []
+        self.row_numbers = array('I')
+        self.sheet_ids = array('I')
+        self.sheets = StringPool()
+        self.version = version
+        self.metadata = metadata if metadata is not None else {}
+
+    @classmethod
+    def from_rows(cls, rows, version=0, metadata=None):
+        """
+        (行データ, 行番号, シート名) のタプルのリストからスナップショットを作成
+
+        Args:
+            rows (list): get_all_sheet_data() の戻り値
+            version (int): スナップショットのバージョン
+            metadata (dict): 付加情報
+
+        Returns:
+            SheetSnapshot: スナップショット
+        """
+        snapshot = cls(version, metadata)
+        snapshot.append_rows(rows)
+        return snapshot
+
+    def _ensure_columns(self, width):
+        """
+        列数を拡張（既存の行は空文字で埋める）
+        """
+        while len(self.cells) < width:
+            self.pools.append(StringPool())
+            self.cells.append(array('I', bytes(4 * len(self.row_numbers))))
+
+    def append_rows(self, rows):
+        """
+        行をスナップショットの末尾に追加
+
+        Args:
+            rows (list): (行データ, 行番号, シート名) のタプルのリスト
+
+        Returns:
+            range: 追加された行のインデックス範囲
+        """
+        start = len(self.row_numbers)
+        for row_data, row_num, sheet_name in rows:
+            self._ensure_columns(len(row_data))
+            for column, (pool, cells) in enumerate(zip(self.pools, self.cells)):
+                cell = row_data[column] if column < len(row_data) else ''
+                cells.append(pool.intern(str(cell)) if cell else 0)
+            self.row_numbers.append(row_num)
+            self.sheet_ids.append(self.sheets.intern(sheet_name))
+        return range(start, len(self.row_numbers))
+
+    def copy(self, version=None):
+        """
+        スナップショットを複製（差し替え用の新しいバージョンを作成する際に使用）
+
+        Args:
+            version (int): 複製後のバージョン（省略時は同じバージョン）
+
+        Returns:
+            SheetSnapshot: 複製したスナップショット
+        """
+        snapshot = SheetSnapshot(self.version if version is None else version, dict(self.metadata))
+        snapshot.pools = [pool.copy() for pool in self.pools]
+        snapshot.cells = [array('I', cells) for cells in self.cells]
+        snapshot.row_numbers = array('I', self.row_numbers)
+        snapshot.sheet_ids = array('I', self.sheet_ids)
+        snapshot.sheets = self.sheets.copy()
+        return snapshot
+
+    @property
+    def width(self):
+        """
+        列数
+        """
+        return len(self.cells)
+
+    def cell(self, index, column):
+        """
+        指定した行・列のセルの値を取得
+
+        Args:
+            index (int): 行インデックス
+            column (int): 列インデックス（0始まり）
+
+        Returns:
+            str: セルの値（空の場合は空文字）
+        """
+        if column >= len(self.cells):
+            return ''
+        return self.pools[column][self.cells[column][index]]
+
+    def row_values(self, index):
+        """
+        指定した行の行データを取得（末尾の空セルは除く）
+
+        Args:
+            index (int): 行インデックス
+
+        Returns:
+            list: 行データ
+        """
+        values = [pool[cells[index]] for pool, cells in zip(self.pools, self.cells)]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def sheet_of(self, index):
+        """
+        指定した行のシート名を取得
+        """
+        return self.sheets[self.sheet_ids[index]]
+
+    def column_pool(self, column):
+        """
+        列の文字列プールを取得（列が存在しない場合は空のプール）
+        """
+        if column >= len(self.pools):
+            return StringPool()
+        return self.pools[column]
+
+    def column_ids(self, column):
+        """
+        列の行ごとの文字列ID配列を取得（列が存在しない場合はNone）
+        """
+        if column >= len(self.cells):
+            return None
+        return self.cells[column]
+
+    def rows_with_ids(self, column, string_ids):
+        """
+        指定した文字列IDのいずれかを持つ行インデックスを列挙
+
+        Args:
+            column (int): 列インデックス
+            string_ids (set): 文字列IDの集合
+
+        Returns:
+            list: 行インデックスのリスト（行順）
+        """
+        cells = self.column_ids(column)
+        if cells is None or not string_ids:
+            return []
+        if len(string_ids) == 1:
+            (string_id,) = string_ids
+            return [index for index, cell_id in enumerate(cells) if cell_id == string_id]
+        return [index for index, cell_id in enumerate(cells) if cell_id in string_ids]
+
+    def to_rows(self):
+        """
+        (行データ, 行番号, シート名) のタプルのリストに変換
+        """
+        return [tuple(row) for row in self]
+
+    def __len__(self):
+        return len(self.row_numbers)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.row_numbers)
+        if not 0 <= index < len(self.row_numbers):
+            raise IndexError(index)
+        return SnapshotRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.row_numbers)):
+            yield SnapshotRow(self, index)
+
+
+def as_snapshot(all_data):
+    """
+    検索対象のデータをスナップショットに変換（既にスナップショットの場合はそのまま返す）
+
+    Args:
+        all_data: SheetSnapshot または (行データ, 行番号, シート名) のタプルのリスト
+
+    Returns:
+        SheetSnapshot: スナップショット
+    """
+    if isinstance(all_data, SheetSnapshot):
+        return all_data
+    return SheetSnapshot.from_rows(all_data)
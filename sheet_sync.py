@@ -0,0 +1,234 @@
+import hashlib
+import json
+from array import array
+
+from google_sheets_handler_advanced import column_index_to_letter, column_letter_to_index, parse_column_range
+from sheet_snapshot import SheetSnapshot
+
+# 変更検知のためにシートごとにサンプリングする行数
+DEFAULT_SAMPLE_SIZE = 8
+
+
+def _normalize_row(row_data):
+    """
+    行データをスナップショットと同じ形式（文字列、末尾の空セルなし）に揃える
+    """
+    values = [str(cell) if cell else '' for cell in row_data]
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def mask_row(row_data, columns):
+    """
+    行データのうち、取得する列の指定に含まれる列のみを残す（含まれない列は空文字）
+
+    書き込んだ行をスナップショットに追加する際に、同期で取得した場合と同じ内容にするために使用する。
+
+    Args:
+        row_data (list): A列からの行データ
+        columns (list): 取得する列の指定（例: ['A:B', 'D:E', 'G']）。Noneの場合は全列
+
+    Returns:
+        list: 列位置どおりの行データ（末尾の空セルなし）
+    """
+    if not columns:
+        return _normalize_row(row_data)
+    masked = [''] * len(row_data)
+    for spec in columns:
+        first, _, last = parse_column_range(spec)
+        for column in range(first, min(column_letter_to_index(last) + 1, len(row_data))):
+            masked[column] = row_data[column]
+    return _normalize_row(masked)
+
+
+class IncrementalSheetSync:
+    def __init__(self, sheets_handler, spreadsheet_id, columns=None, start_row=4, sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        追記中心のスプレッドシート向けの差分同期を初期化
+
+        シートごとに最終行番号とサンプル行のハッシュを記録しておき、更新時は
+        サンプル行が変わっていなければ末尾に追加された行だけを取得する。
+        サンプル行が変わっていた場合（末尾より上の編集・削除）は全件を再取得する。
+
+        Args:
+            sheets_handler (GoogleSheetsHandlerAdvanced): Google Sheetsハンドラー
+            spreadsheet_id (str): スプレッドシートのID
+            columns (list): 取得する列の指定（例: ['A']）。Noneの場合は全列
+            start_row (int): 取得を開始する行番号
+            sample_size (int): 変更検知のためにサンプリングする行数
+        """
+        self.sheets_handler = sheets_handler
+        self.spreadsheet_id = spreadsheet_id
+        self.columns = columns
+        self.start_row = start_row
+        self.sample_size = sample_size
+        self.snapshot = SheetSnapshot(metadata={'spreadsheet_id': spreadsheet_id, 'columns': columns})
+        self.sheet_states = {}
+
+    def _sheet_columns(self, properties):
+        """
+        シートごとの取得列を決定（全列の場合はグリッドの列数から範囲を作成）
+        """
+        if self.columns:
+            return self.columns
+        last_col = column_index_to_letter(max(properties['column_count'], 1) - 1)
+        return [f"A:{last_col}"]
+
+    def _sample_rows(self, row_indices):
+        """
+        シートの行から変更検知用のサンプル行（スナップショットの行インデックス）を選択
+
+        最終行は必ず含める
+        """
+        if len(row_indices) <= self.sample_size:
+            return list(row_indices)
+        step = (len(row_indices) - 1) / (self.sample_size - 1)
+        return sorted({row_indices[round(i * step)] for i in range(self.sample_size)})
+
+    @staticmethod
+    def _hash_rows(sample_rows):
+        """
+        サンプル行 [(行番号, 行データ)] の内容ハッシュを計算
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for row_num, row_data in sample_rows:
+            digest.update(json.dumps([row_num, row_data], ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _record_state(self, sheet_name, row_indices, columns):
+        """
+        シートの最終行番号とサンプル行のハッシュを記録
+        """
+        snapshot = self.snapshot
+        samples = self._sample_rows(row_indices)
+        sample_rows = [(snapshot.row_numbers[index], snapshot.row_values(index)) for index in samples]
+        self.sheet_states[sheet_name] = {
+            'row_count': snapshot.row_numbers[row_indices[-1]] if row_indices else self.start_row - 1,
+            'columns': columns,
+            'row_indices': row_indices,
+            'sample_rows': [row_num for row_num, _ in sample_rows],
+            'sample_hash': self._hash_rows(sample_rows)
+        }
+
+    def full_reload(self, sheet_properties=None):
+        """
+        全シートのデータを再取得して新しいスナップショットを作成し、状態を記録し直す
+
+        Args:
+            sheet_properties (list): get_sheet_properties() の戻り値（省略時は取得）
+
+        Returns:
+            dict: {'mode': 'full', 'added': 行数}
+        """
+        if sheet_properties is None:
+            sheet_properties = self.sheets_handler.get_sheet_properties(self.spreadsheet_id)
+
+        blocks = [
+            (properties['title'], self.start_row, None, self._sheet_columns(properties))
+            for properties in sheet_properties
+        ]
+        block_rows = self.sheets_handler.get_row_blocks(self.spreadsheet_id, blocks)
+
+        self.snapshot = SheetSnapshot(self.snapshot.version + 1, dict(self.snapshot.metadata))
+        self.sheet_states = {}
+        for properties, rows in zip(sheet_properties, block_rows):
+            added = self.snapshot.append_rows(rows)
+            self._record_state(properties['title'], array('I', added), self._sheet_columns(properties))
+
+        return {'mode': 'full', 'added': len(self.snapshot)}
+
+    def refresh(self):
+        """
+        差分同期を実行（末尾に追加された行のみ取得し、必要な場合のみ全件を再取得）
+
+        追加行は現在のスナップショットにその場で追加する。全件を再取得した場合は
+        self.snapshot が新しいスナップショットに置き換わる。
+
+        Returns:
+            dict: {'mode': 'full' | 'tail' | 'unchanged', 'added': 追加された行数}
+
+        Raises:
+            HttpError, QuotaExceededError: API呼び出しに失敗した場合（既存のデータは変更しない）
+        """
+        sheet_properties = self.sheets_handler.get_sheet_properties(self.spreadsheet_id)
+
+        # シートの追加・削除・並べ替えがあった場合は全件を再取得
+        sheet_titles = [properties['title'] for properties in sheet_properties]
+        if not self.sheet_states or sheet_titles != list(self.sheet_states):
+            return self.full_reload(sheet_properties)
+
+        # サンプル行と末尾の追加分をまとめて1回のリクエストで取得
+        blocks = []
+        for properties in sheet_properties:
+            state = self.sheet_states[properties['title']]
+            columns = self._sheet_columns(properties)
+            if columns != state['columns']:
+                return self.full_reload(sheet_properties)
+            for row_num in state['sample_rows']:
+                blocks.append((properties['title'], row_num, row_num, columns))
+            if state['row_count'] < properties['row_count']:
+                blocks.append((properties['title'], state['row_count'] + 1, None, columns))
+
+        block_rows = iter(self.sheets_handler.get_row_blocks(self.spreadsheet_id, blocks))
+
+        tail_rows = {}
+        for properties in sheet_properties:
+            state = self.sheet_states[properties['title']]
+            sampled = []
+            for row_num in state['sample_rows']:
+                rows = next(block_rows)
+                sampled.append((row_num, _normalize_row(rows[0][0]) if rows else []))
+
+            # 末尾より上の行が編集・削除された場合は全件を再取得
+            if self._hash_rows(sampled) != state['sample_hash']:
+                return self.full_reload(sheet_properties)
+
+            if state['row_count'] < properties['row_count']:
+                tail_rows[properties['title']] = next(block_rows)
+
+        added = sum(len(rows) for rows in tail_rows.values())
+        if not added:
+            return {'mode': 'unchanged', 'added': 0}
+
+        # 追加された行を現在のスナップショットにその場で追加
+        self.snapshot.version += 1
+        for properties in sheet_properties:
+            sheet_name = properties['title']
+            rows = tail_rows.get(sheet_name)
+            if not rows:
+                continue
+            row_indices = self.sheet_states[sheet_name]['row_indices']
+            row_indices.extend(self.snapshot.append_rows(rows))
+            self._record_state(sheet_name, row_indices, self._sheet_columns(properties))
+
+        return {'mode': 'tail', 'added': added}
+
+    def apply_appended(self, sheet_name, first_row, rows):
+        """
+        ボットが書き込んだ行を、再取得せずにスナップショットと同期状態に反映
+
+        書き込んだ行が同期済みの最終行の直後に続く場合のみ反映する（間に他の追加がある場合は
+        次回の差分同期で取得する）。反映した行は次回の差分同期で再取得されない。
+
+        Args:
+            sheet_name (str): 書き込んだシート名
+            first_row (int): 書き込んだ最初の行番号
+            rows (list): 書き込んだ行データ（A列から）のリスト
+
+        Returns:
+            bool: 反映した場合True
+        """
+        state = self.sheet_states.get(sheet_name)
+        if state is None or not rows or first_row != state['row_count'] + 1:
+            return False
+
+        self.snapshot.version += 1
+        appended = [
+            (mask_row(row_data, state['columns']), first_row + offset, sheet_name)
+            for offset, row_data in enumerate(rows)
+        ]
+        row_indices = state['row_indices']
+        row_indices.extend(self.snapshot.append_rows(appended))
+        self._record_state(sheet_name, row_indices, state['columns'])
+        return True
@@ -0,0 +1,324 @@
+import os
+import secrets
+import socket
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from circuit_breaker import CircuitOpenError
+from name_matcher import normalize_name
+from quota_governor import QuotaExceededError, _error_status
+
+# 承認された行をまとめて書き込む間隔（秒）
+SHEETS_WRITE_INTERVAL = float(os.environ.get("SHEETS_WRITE_INTERVAL", "5"))
+
+# 書き込み先のシート名（未設定の場合はスプレッドシートの最初のシート）
+SHEETS_WRITE_SHEET = os.environ.get("SHEETS_WRITE_SHEET") or None
+
+# 1回の書き込みでまとめる最大行数
+MAX_FLUSH_ROWS = 500
+
+# 調査結果から作成した追加案（承認待ち）を保持する期間（秒）
+PROPOSAL_TTL = float(os.environ.get("SHEETS_PROPOSAL_TTL", str(7 * 24 * 60 * 60)))
+
+# 書き込み済みの記録（冪等キー）を保持する期間（秒）
+WRITTEN_TTL = 30 * 24 * 60 * 60
+
+# 書き込み中のリースの有効期間（秒、書き込み中に停止したプロセスのリースは期限切れ後に他のプロセスが取得する）
+FLUSH_LEASE_TTL = 120
+
+
+def _may_have_written(error):
+    """
+    書き込みのリクエストの例外が、書き込みが反映された可能性のあるものか判定
+
+    送信前の失敗（クォータを確保できない、サーキットブレーカーが開いている）と4xx（429を含む）は
+    反映されていない。接続エラー・タイムアウト・5xxは反映済みの可能性がある。
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, QuotaExceededError):
+        if error.__cause__ is None:
+            return False
+        error = error.__cause__
+    status = _error_status(error)
+    return status is None or status >= 500
+
+
+class SheetWriteQueue:
+    def __init__(self, handler_factory, spreadsheet_name, sheet_name=SHEETS_WRITE_SHEET, interval=SHEETS_WRITE_INTERVAL,
+                 cache=None, is_listed=None, on_written=None):
+        """
+        承認された行の書き込みキュー（一定間隔でまとめて1回の values.append で追加する）
+
+        ソフトウェア名を正規化した値を冪等キーとし、同じソフトウェアの行はキューの中でも
+        書き込み済みの記録（共有キャッシュ）に対しても重複して追加しない。書き込みの結果が
+        不明な失敗（接続エラー・5xx）の後は、再実行の前にソフトウェア名の列を読んで反映済みの行を除く。
+
+        複数のプロセス・レプリカがそれぞれキューを持つ場合は、共有キャッシュのリースを取得したプロセスのみが
+        書き込み、リースの保持中に他のプロセスが書き込み済みの行を除くため、同じ行は1回だけ追加される。
+
+        Args:
+            handler_factory (callable): GoogleSheetsHandlerAdvanced を返す関数（書き込みモードで認証したもの）
+            spreadsheet_name (str): 書き込み先のスプレッドシート名
+            sheet_name (str): 書き込み先のシート名（Noneの場合は最初のシート）
+            interval (float): 書き込みの間隔（秒）
+            cache (CacheBackend): 追加案と書き込み済みの記録の保存先（Noneの場合は追加案を保存できない）
+            is_listed (callable): ソフトウェア名がリストに登録済みか判定する関数（スナップショットで確認）
+            on_written (callable): 書き込み後に (シート名, 最初の行番号, 行データのリスト) を受け取る関数
+        """
+        self.handler_factory = handler_factory
+        self.spreadsheet_name = spreadsheet_name
+        self.sheet_name = sheet_name
+        self.interval = interval
+        self.cache = cache
+        self.is_listed = is_listed
+        self.on_written = on_written
+        self.writer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pending = OrderedDict()
+        self._uncertain = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _cache_key(self, kind, key):
+        return f"sheet_write:{self.spreadsheet_name}:{kind}:{key}"
+
+    def propose(self, row):
+        """
+        調査結果から作成した行を追加案として保存（承認されるまで書き込まない）
+
+        Args:
+            row (list): 追加する行データ（A列: ソフトウェア名から）
+
+        Returns:
+            str: 追加案のID（承認ボタンの値として使う短いID）。保存できない場合はNone
+        """
+        key = normalize_name(row[0])
+        if not key or self.cache is None:
+            return None
+        self.cache.set_json(self._cache_key('proposal', key), list(row), PROPOSAL_TTL)
+        # ソフトウェア名はボタンの値の長さの上限を超え得るため、短いIDから冪等キーを引けるようにする
+        proposal_id = secrets.token_urlsafe(9)
+        self.cache.set_json(self._cache_key('proposal_id', proposal_id), key, PROPOSAL_TTL)
+        return proposal_id
+
+    def approve(self, software_name):
+        """
+        保存した追加案を承認して書き込みキューに追加
+
+        Args:
+            software_name (str): ソフトウェア名
+
+        Returns:
+            Future: 書き込みの結果（enqueue() と同じ）。追加案がない場合はNone
+        """
+        return self._approve_key(normalize_name(software_name))
+
+    def approve_proposal(self, proposal_id):
+        """
+        propose() が返したIDの追加案を承認して書き込みキューに追加
+
+        Args:
+            proposal_id (str): 追加案のID
+
+        Returns:
+            Future: 書き込みの結果（enqueue() と同じ）。追加案がない・期限切れの場合はNone
+        """
+        if not proposal_id or self.cache is None:
+            return None
+        return self._approve_key(self.cache.get_json(self._cache_key('proposal_id', proposal_id)))
+
+    def _approve_key(self, key):
+        """
+        冪等キー（正規化したソフトウェア名）の追加案を書き込みキューに追加
+        """
+        row = self.cache.get_json(self._cache_key('proposal', key)) if key and self.cache is not None else None
+        if row is None:
+            return None
+        return self.enqueue(row)
+
+    def enqueue(self, row):
+        """
+        行を書き込みキューに追加（次回の書き込みでまとめて追加する）
+
+        Args:
+            row (list): 追加する行データ（A列: ソフトウェア名から）
+
+        Returns:
+            Future: {'success', 'message', 'row_num'（書き込んだ行番号）} を返すFuture
+                    同じソフトウェアが既にキューにある場合は、その行のFuture
+        """
+        key = normalize_name(row[0])
+        if not key:
+            raise ValueError("ソフトウェア名が空の行は追加できません")
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending[1]
+            future = Future()
+            if self.cache is not None and self.cache.get(self._cache_key('written', key)) is not None:
+                future.set_result({'success': False, 'message': f"'{row[0]}'は既に追加済みです", 'row_num': None})
+                return future
+            if self.is_listed is not None and self.is_listed(row[0]):
+                future.set_result({'success': False, 'message': f"'{row[0]}'は既にリストに登録されています", 'row_num': None})
+                return future
+            self._pending[key] = (list(row), future)
+        return future
+
+    def pending(self):
+        """
+        書き込み待ちの行数
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def _written_keys(self, handler, spreadsheet_id, sheet_name):
+        """
+        シートのソフトウェア名の列を読み、登録済みの名前（正規化済み）の集合を取得
+        """
+        rows = handler.get_row_blocks(spreadsheet_id, [(sheet_name, 1, None, ['A'])])[0]
+        return {normalize_name(str(row_data[0])) for row_data, _, _ in rows if row_data}
+
+    def _mark_uncertain(self, uncertain):
+        """
+        前回の書き込みの結果が不明か記録（共有キャッシュがある場合は他のプロセスの次回の書き込みにも反映する）
+        """
+        self._uncertain = uncertain
+        if self.cache is not None:
+            if uncertain:
+                self.cache.set(self._cache_key('state', 'uncertain'), b'1', WRITTEN_TTL)
+            else:
+                self.cache.delete(self._cache_key('state', 'uncertain'))
+
+    def _is_uncertain(self):
+        """
+        前回の書き込み（他のプロセスのものを含む）の結果が不明か
+        """
+        return self._uncertain or (self.cache is not None
+                                   and self.cache.get(self._cache_key('state', 'uncertain')) is not None)
+
+    def flush(self):
+        """
+        書き込み待ちの行を1回の values.append でまとめて追加
+
+        失敗した場合、および他のプロセスが書き込み中（リースを保持している）の場合、行はキューに残り次回に再実行する。
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.items())[:MAX_FLUSH_ROWS]
+            if not batch:
+                return 0
+
+            if self.cache is None:
+                return self._flush_batch(batch)
+            lease_key = self._cache_key('lease', 'flush')
+            owner = self.writer_id.encode('utf-8')
+            if not self.cache.add(lease_key, owner, FLUSH_LEASE_TTL):
+                return 0
+            try:
+                return self._flush_batch(batch)
+            finally:
+                # 自分のリースのみを期限切れにして解放する（期限切れ後に他のプロセスが取得したリースは解放しない）
+                self.cache.compare_and_set(lease_key, owner, owner, 0)
+
+    def _flush_batch(self, batch):
+        """
+        書き込み待ちの行のうち、batch を1回の values.append で追加（リースの保持中に呼び出す）
+        """
+        sending = False
+        try:
+            # 他のプロセスが書き込み済みの行は除く
+            already_written = set()
+            if self.cache is not None:
+                already_written = {key for key, _ in batch if self.cache.get(self._cache_key('written', key)) is not None}
+
+            handler = self.handler_factory()
+            spreadsheet_id = handler.find_spreadsheet_by_name(self.spreadsheet_name)
+            if not spreadsheet_id:
+                raise LookupError(f"スプレッドシート '{self.spreadsheet_name}' が見つかりません")
+            sheet_name = self.sheet_name or handler.get_sheet_properties(spreadsheet_id)[0]['title']
+
+            # 前回の書き込みの結果が不明な場合は、反映済みの行を除いてから再実行する
+            if self._is_uncertain():
+                already_written |= self._written_keys(handler, spreadsheet_id, sheet_name)
+                self._mark_uncertain(False)
+
+            rows = [row for key, (row, _) in batch if key not in already_written]
+            first_row = None
+            if rows:
+                sending = True
+                first_row = handler.append_rows(spreadsheet_id, sheet_name, rows)
+        except Exception as e:
+            if sending and _may_have_written(e):
+                self._mark_uncertain(True)
+            print(f"スプレッドシートへの書き込みエラー（{len(batch)}行、次回再実行します）: {e}")
+            return 0
+
+        with self._lock:
+            for key, _ in batch:
+                self._pending.pop(key, None)
+
+        row_num = first_row
+        for key, (row, future) in batch:
+            if self.cache is not None:
+                self.cache.set(self._cache_key('written', key), b'1', WRITTEN_TTL)
+                self.cache.delete(self._cache_key('proposal', key))
+            if key in already_written:
+                future.set_result({'success': True, 'message': f"'{row[0]}'は追加済みです", 'row_num': None})
+            else:
+                future.set_result({
+                    'success': True,
+                    'message': f"'{row[0]}'を{sheet_name}の{row_num}行目に追加しました",
+                    'row_num': row_num
+                })
+                row_num += 1
+
+        print(f"スプレッドシートに{len(rows)}行を追加しました（{sheet_name}）")
+        if rows and self.on_written is not None:
+            try:
+                self.on_written(sheet_name, first_row, rows)
+            except Exception as e:
+                print(f"書き込んだ行の反映エラー: {e}")
+        return len(rows)
+
+    def _drain(self):
+        """
+        書き込み待ちの行がなくなるまで MAX_FLUSH_ROWS 行ずつ続けて書き込む（失敗した場合は次の間隔に再実行する）
+        """
+        while self.flush() and self.pending():
+            pass
+
+    def _run(self):
+        """
+        バックグラウンドスレッドの処理（停止されるまで一定間隔で書き込む）
+        """
+        while not self._stop.wait(self.interval):
+            self._drain()
+        # 停止時に残っている行を書き込む
+        self._drain()
+
+    def start(self):
+        """
+        バックグラウンドでの書き込みを開始
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sheet-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        バックグラウンドでの書き込みを停止（残っている行は書き込んでから停止する）
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,254 @@
+import difflib
+import threading
+from collections import OrderedDict
+
+from fuzzywuzzy import fuzz
+
+from name_matcher import name_aliases, normalize_name
+
+# 変更された名前と検索テキストが一致し得るとみなすあいまい一致のスコア（あいまい検索の閾値と同じ）
+AFFECT_FUZZY_THRESHOLD = 70
+
+# 変更された名前と検索テキストの正規化した名前・略称の類似度（「もしかして」の閾値より低くする）
+AFFECT_ALIAS_RATIO = 0.6
+
+# 個別に比較する変更の最大件数（超えた場合は全ての検索テキストに影響するとみなす）
+MAX_TARGETED_CHANGES = 500
+
+# 保持する差分の数（ソースごと）
+CHANGE_LOG_SIZE = 50
+
+
+def _row_signatures(snapshot, key_column=0):
+    """
+    正規化したキー（ソフトウェア名）ごとの行の内容（同じキーの行が複数ある場合は全て）
+
+    Returns:
+        dict: {正規化したキー: (名前, 行の値のタプルのタプル)}
+    """
+    rows = {}
+    cells = snapshot.column_ids(key_column)
+    if cells is None:
+        return {}
+    pool = snapshot.column_pool(key_column)
+    columns = [(snapshot.column_ids(column), snapshot.column_pool(column)) for column in range(snapshot.width)]
+    # キーの文字列IDごとに正規化を1回だけ行う
+    keys = [normalize_name(pool[string_id]) for string_id in range(len(pool))]
+    for row_index, string_id in enumerate(cells):
+        key = keys[string_id]
+        if not key:
+            continue
+        # 行番号は含めない（行の挿入で以降の行がずれても変更とはしない）
+        values = tuple(column_pool[column_ids[row_index]] for column_ids, column_pool in columns)
+        entry = rows.get(key)
+        if entry is None:
+            rows[key] = (pool[string_id], [values])
+        else:
+            entry[1].append(values)
+    return {key: (name, tuple(sorted(values))) for key, (name, values) in rows.items()}
+
+
+class SnapshotDiff:
+    __slots__ = ('added', 'removed', 'modified')
+
+    def __init__(self, added, removed, modified):
+        """
+        2つのスナップショットの行単位の差分（キーは正規化したソフトウェア名）
+
+        Args:
+            added (dict): {キー: ソフトウェア名} 追加された行
+            removed (dict): {キー: ソフトウェア名} 削除された行
+            modified (dict): {キー: ソフトウェア名} 内容（他の列の値・同じ名前の行数）が変更された行
+        """
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+
+    @property
+    def changed(self):
+        """
+        変更があったキーの集合（追加・削除・変更）
+        """
+        return set(self.added) | set(self.removed) | set(self.modified)
+
+    @property
+    def changed_names(self):
+        """
+        変更があったソフトウェア名のリスト（追加・削除・変更）
+        """
+        return list(self.added.values()) + list(self.removed.values()) + list(self.modified.values())
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def to_json(self):
+        """
+        スナップショットのメタ情報として保存する形式（affects() の判定に必要な追加・変更された行のみ）
+
+        件数が MAX_TARGETED_CHANGES を超える場合は、全ての検索テキストに影響するとみなすのに足りる件数のみ残す。
+
+        Returns:
+            dict: {'added': {キー: ソフトウェア名}, 'modified': {キー: ソフトウェア名}}
+        """
+        added = dict(list(self.added.items())[:MAX_TARGETED_CHANGES + 1])
+        modified = dict(list(self.modified.items())[:MAX_TARGETED_CHANGES + 1 - len(added)])
+        return {'added': added, 'modified': modified}
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        to_json() の形式から復元（削除された行は含まない）
+        """
+        return cls(data['added'], {}, data['modified'])
+
+    def affects(self, search_text):
+        """
+        「見つからなかった」検索テキストが、この差分によって見つかるようになり得るか
+
+        追加・変更された名前のみを対象とし（削除では見つからない結果は変わらない）、
+        完全一致・部分一致・あいまい一致・「もしかして」のいずれかに該当し得る場合をTrueとする。
+
+        Args:
+            search_text (str): 検索テキスト
+
+        Returns:
+            bool: 影響し得る場合True
+        """
+        names = list(self.added.values()) + list(self.modified.values())
+        if len(names) > MAX_TARGETED_CHANGES:
+            return True
+        query = normalize_name(search_text)
+        if not query:
+            return bool(names)
+        for name in names:
+            for alias in name_aliases(name):
+                if query in alias or alias in query:
+                    return True
+                if _ratio(query, alias) >= AFFECT_ALIAS_RATIO:
+                    return True
+            if fuzz.WRatio(search_text, name) >= AFFECT_FUZZY_THRESHOLD:
+                return True
+        return False
+
+
+def _ratio(a, b):
+    """
+    2つの文字列の類似度（0-1）
+    """
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def diff_snapshots(old, new, key_column=0):
+    """
+    2つのスナップショットの行単位の差分を計算
+
+    Args:
+        old (SheetSnapshot): 以前のスナップショット
+        new (SheetSnapshot): 新しいスナップショット
+        key_column (int): キーにする列（ソフトウェア名）
+
+    Returns:
+        SnapshotDiff: 差分
+    """
+    before = _row_signatures(old, key_column)
+    after = _row_signatures(new, key_column)
+    added = {key: after[key][0] for key in after.keys() - before.keys()}
+    removed = {key: before[key][0] for key in before.keys() - after.keys()}
+    modified = {key: after[key][0] for key in after.keys() & before.keys() if after[key][1] != before[key][1]}
+    return SnapshotDiff(added, removed, modified)
+
+
+class SnapshotChangeLog:
+    def __init__(self, source_names, size=CHANGE_LOG_SIZE):
+        """
+        ソースごとのスナップショットの差分の記録（キャッシュの対象を絞った無効化用）
+
+        Args:
+            source_names (list): ソース（スプレッドシート名）のリスト（検索結果のバージョンの並び順）
+            size (int): ソースごとに保持する差分の数
+        """
+        self.source_names = list(source_names)
+        self.size = size
+        self._diffs = {name: OrderedDict() for name in self.source_names}
+        self._lock = threading.Lock()
+
+    def record(self, source_name, old_version, new_version, diff):
+        """
+        バージョン old_version から new_version への差分を記録
+        """
+        with self._lock:
+            diffs = self._diffs.setdefault(source_name, OrderedDict())
+            if new_version <= old_version:
+                # バージョンが戻った場合（全件の再取得など）は以前の記録と混ざらないよう破棄する
+                diffs.clear()
+            diffs[old_version] = (new_version, diff)
+            while len(diffs) > self.size:
+                diffs.popitem(last=False)
+
+    def diffs_between(self, source_name, from_version, to_version):
+        """
+        バージョン間の差分のリスト（記録が途切れている場合はNone）
+        """
+        with self._lock:
+            diffs = self._diffs.get(source_name, {})
+            chain = []
+            version = from_version
+            while version != to_version:
+                step = diffs.get(version)
+                if step is None or len(chain) >= len(diffs):
+                    return None
+                version, diff = step
+                chain.append(diff)
+            return chain
+
+    def affects(self, search_text, from_versions, to_versions):
+        """
+        ソースごとのバージョンの間の変更が、「見つからなかった」検索テキストに影響し得るか
+
+        Args:
+            search_text (str): 検索テキスト
+            from_versions (list): 記録時のソースごとのバージョン
+            to_versions (list): 現在のソースごとのバージョン
+
+        Returns:
+            bool: 影響し得る場合、または差分の記録が途切れていて判定できない場合True
+        """
+        if len(from_versions) != len(self.source_names) or len(to_versions) != len(self.source_names):
+            return True
+        for name, from_version, to_version in zip(self.source_names, from_versions, to_versions):
+            if from_version == to_version:
+                continue
+            chain = self.diffs_between(name, from_version, to_version)
+            if chain is None or any(diff.affects(search_text) for diff in chain):
+                return True
+        return False
+
+    def listener(self, source_name, on_diff=None):
+        """
+        SnapshotRefresher.add_listener() に登録する、差し替え時に差分を計算して記録するコールバック
+
+        Args:
+            source_name (str): ソース（スプレッドシート名）
+            on_diff (callable): 記録した差分を受け取る関数（調査結果のキャッシュの無効化など）
+
+        Returns:
+            callable: (previous, current) を受け取るコールバック
+        """
+        def record_change(previous, current):
+            # 同じスナップショットの再公開のみ省略する（バージョンが同じでも内容が異なる場合は差分を計算する）
+            if previous is None or current is None or previous[0] is current[0]:
+                return
+            old_version, new_version = previous[0].version, current[0].version
+            shared = current[0].metadata.get('diff')
+            if shared is not None and (shared['from'], shared['to']) == (old_version, new_version):
+                # スナップショットを保存したプロセス（スーパーバイザーのローダー）で計算済みの差分。
+                # 共有キャッシュの調査結果の削除もそのプロセスで行われているため、記録のみ行う
+                self.record(source_name, old_version, new_version, SnapshotDiff.from_json(shared))
+                return
+            diff = diff_snapshots(previous[0], current[0])
+            # スナップショットと共に保存し、同じスナップショットを読み込むプロセスでは計算し直さない
+            current[0].metadata['diff'] = {'from': old_version, 'to': new_version, **diff.to_json()}
+            self.record(source_name, old_version, new_version, diff)
+            if on_diff is not None and diff:
+                on_diff(diff)
+        return record_change
@@ -0,0 +1,261 @@
+import heapq
+from array import array
+from bisect import bisect_left
+
+# あいまい検索で類似度を計算する候補数の上限（列ごと）
+DEFAULT_FUZZY_CANDIDATES = 500
+
+
+def text_grams(text):
+    """
+    小文字化済みテキストの文字バイグラムの集合（1文字の場合はその文字）
+
+    Args:
+        text (str): 小文字化済みのテキスト
+
+    Returns:
+        set: バイグラムの集合
+    """
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def sorted_position(keys, key):
+    """
+    ソート済みのシーケンス（リストまたはmmapした文字列）でのキーの位置（二分探索、ない場合はNone）
+
+    Args:
+        keys: ソート済みのシーケンス
+        key: 探すキー
+
+    Returns:
+        int: キーの位置
+    """
+    position = bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        return position
+    return None
+
+
+def _csr(groups, size):
+    """
+    グループのリストをCSR形式（開始位置配列と値配列）に変換
+    """
+    starts = array('I', [0])
+    values = array('I')
+    for key in range(size):
+        values.extend(groups.get(key, ()))
+        starts.append(len(values))
+    return starts, values
+
+
+class ColumnIndex:
+    __slots__ = ('order', 'row_starts', 'row_ids', 'gram_keys', 'gram_starts', 'gram_ids')
+
+    def __init__(self, order, row_starts, row_ids, gram_keys, gram_starts, gram_ids):
+        """
+        1列分の索引
+
+        Args:
+            order: 小文字化した文字列の順に並べた文字列IDの配列（完全一致の二分探索用）
+            row_starts, row_ids: 文字列IDごとの行インデックス（CSR形式）
+            gram_keys: ソート済みのバイグラムのシーケンス
+            gram_starts, gram_ids: バイグラムごとの文字列ID（CSR形式）
+        """
+        self.order = order
+        self.row_starts = row_starts
+        self.row_ids = row_ids
+        self.gram_keys = gram_keys
+        self.gram_starts = gram_starts
+        self.gram_ids = gram_ids
+
+    @classmethod
+    def build(cls, pool_lower, cells):
+        """
+        列の文字列プール（小文字化済み）と文字列ID配列から索引を作成
+
+        Args:
+            pool_lower (list): 小文字化した文字列プール
+            cells (array): 行ごとの文字列ID
+
+        Returns:
+            ColumnIndex: 列の索引
+        """
+        order = array('I', sorted(range(1, len(pool_lower)), key=pool_lower.__getitem__))
+
+        rows_by_id = {}
+        for index, string_id in enumerate(cells):
+            if string_id:
+                rows_by_id.setdefault(string_id, []).append(index)
+        row_starts, row_ids = _csr(rows_by_id, len(pool_lower))
+
+        ids_by_gram = {}
+        for string_id in range(1, len(pool_lower)):
+            for gram in text_grams(pool_lower[string_id]):
+                ids_by_gram.setdefault(gram, []).append(string_id)
+        gram_keys = sorted(ids_by_gram)
+        gram_starts = array('I', [0])
+        gram_ids = array('I')
+        for gram in gram_keys:
+            gram_ids.extend(ids_by_gram[gram])
+            gram_starts.append(len(gram_ids))
+
+        return cls(order, row_starts, row_ids, gram_keys, gram_starts, gram_ids)
+
+    def rows(self, string_id):
+        """
+        文字列IDを持つ行インデックス
+        """
+        if string_id + 1 >= len(self.row_starts):
+            return self.row_ids[0:0]
+        return self.row_ids[self.row_starts[string_id]:self.row_starts[string_id + 1]]
+
+    def gram_postings(self, gram):
+        """
+        バイグラムを含む文字列IDのリスト（昇順）
+        """
+        position = sorted_position(self.gram_keys, gram)
+        if position is None:
+            return self.gram_ids[0:0]
+        return self.gram_ids[self.gram_starts[position]:self.gram_starts[position + 1]]
+
+
+class SnapshotIndex:
+    __slots__ = ('columns', 'version')
+
+    def __init__(self, columns, version=0):
+        """
+        スナップショットの事前構築済み索引（完全一致・バイグラム転置索引・あいまい検索候補）
+
+        Args:
+            columns (list): 列ごとの ColumnIndex
+            version (int): 対応するスナップショットのバージョン
+        """
+        self.columns = columns
+        self.version = version
+
+    @classmethod
+    def build(cls, snapshot):
+        """
+        スナップショットから索引を作成
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+
+        Returns:
+            SnapshotIndex: 索引
+        """
+        columns = [
+            ColumnIndex.build(snapshot.column_pool(column).lower(), snapshot.column_ids(column))
+            for column in range(snapshot.width)
+        ]
+        return cls(columns, snapshot.version)
+
+    def column(self, column):
+        """
+        列の索引を取得（列が存在しない場合はNone）
+        """
+        if column >= len(self.columns):
+            return None
+        return self.columns[column]
+
+    def rows_with_ids(self, column, string_ids):
+        """
+        指定した文字列IDのいずれかを持つ行インデックス（行順）
+
+        Args:
+            column (int): 列インデックス
+            string_ids (iterable): 文字列IDの集合
+
+        Returns:
+            list: 行インデックスのリスト
+        """
+        column_index = self.column(column)
+        if column_index is None:
+            return []
+        rows = []
+        for string_id in string_ids:
+            rows.extend(column_index.rows(string_id))
+        rows.sort()
+        return rows
+
+    def exact_ids(self, snapshot, column, text_lower):
+        """
+        小文字化した値が一致する文字列ID（二分探索）
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            column (int): 列インデックス
+            text_lower (str): 小文字化した検索テキスト
+
+        Returns:
+            list: 文字列IDのリスト
+        """
+        column_index = self.column(column)
+        if column_index is None or not text_lower:
+            return []
+        pool = snapshot.column_pool(column)
+        order = column_index.order
+        position = bisect_left(order, text_lower, key=lambda string_id: pool[string_id].lower())
+        string_ids = []
+        while position < len(order) and pool[order[position]].lower() == text_lower:
+            string_ids.append(order[position])
+            position += 1
+        return string_ids
+
+    def substring_ids(self, snapshot, column, text_lower):
+        """
+        小文字化した値に検索テキストを含む文字列ID（バイグラムの積集合で候補を絞り込んで確認）
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            column (int): 列インデックス
+            text_lower (str): 小文字化した検索テキスト
+
+        Returns:
+            list: 文字列IDのリスト（昇順）
+        """
+        column_index = self.column(column)
+        if column_index is None or not text_lower:
+            return []
+        pool = snapshot.column_pool(column)
+
+        if len(text_lower) < 2:
+            # 1文字の場合は索引を使わずにプールを走査
+            return [string_id for string_id in range(1, len(pool)) if text_lower in pool[string_id].lower()]
+
+        # 出現頻度の低いバイグラムから順に積集合を取る
+        postings = sorted((column_index.gram_postings(gram) for gram in text_grams(text_lower)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+
+        return sorted(string_id for string_id in candidates if text_lower in pool[string_id].lower())
+
+    def fuzzy_candidates(self, column, text_lower, limit=DEFAULT_FUZZY_CANDIDATES):
+        """
+        検索テキストと共通するバイグラムが多い文字列ID（あいまい検索の候補）
+
+        Args:
+            column (int): 列インデックス
+            text_lower (str): 小文字化した検索テキスト
+            limit (int): 候補数の上限
+
+        Returns:
+            list: 文字列IDのリスト（共通バイグラム数の多い順）
+        """
+        column_index = self.column(column)
+        if column_index is None or not text_lower:
+            return []
+
+        counts = {}
+        for gram in text_grams(text_lower):
+            for string_id in column_index.gram_postings(gram):
+                counts[string_id] = counts.get(string_id, 0) + 1
+
+        if len(counts) <= limit:
+            return sorted(counts, key=counts.__getitem__, reverse=True)
+        return heapq.nlargest(limit, counts, key=counts.__getitem__)
@@ -0,0 +1,599 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+from bm25_search import BM25Index
+from circuit_breaker import CircuitOpenError
+from column_filter import FilterIndex, filter_search
+from google_sheets_handler_advanced import SNAPSHOT_COLUMNS
+from name_completer import MAX_COMPLETIONS, NameCompleter
+from name_matcher import AliasIndex, suggestion_matches
+from sheet_sync import IncrementalSheetSync
+from snapshot_index import SnapshotIndex
+from snapshot_store import SnapshotStore
+from spreadsheet_sources import source_snapshot_path
+from tfidf_search import TfidfIndex
+
+# スナップショットの更新確認間隔（秒）
+DEFAULT_REFRESH_INTERVAL = float(os.environ.get("SNAPSHOT_REFRESH_INTERVAL", "60"))
+
+# 派生した索引の保存時の名前と、保持する属性名
+DERIVED_ATTRIBUTES = {
+    'alias': '_alias_index',
+    'completer': '_completer',
+    'filter': '_filter_index',
+    'bm25': '_bm25_index',
+    'tfidf': '_tfidf_index',
+}
+
+
+class SnapshotRefresher:
+    def __init__(self, handler_factory, spreadsheet_name, columns=None, interval=DEFAULT_REFRESH_INTERVAL, store=None,
+                 cache=None, search_columns=None):
+        """
+        スナップショットをバックグラウンドで更新し、検索用のスナップショットを差し替える
+
+        Driveの更新日時を一定間隔で確認し、変更があった場合は公開中のスナップショットの
+        複製に対して差分同期と索引の作成を行ってから、参照を1回の代入で差し替える。
+        実行中の検索は差し替え前のスナップショットをそのまま使い続ける。
+
+        共有キャッシュを指定した場合、リースを取得した1つのレプリカのみがGoogle APIで更新を確認し、
+        作成したスナップショットをキャッシュに保存する。他のレプリカはキャッシュから読み込む。
+
+        Args:
+            handler_factory (callable): GoogleSheetsHandlerAdvanced を返す関数
+            spreadsheet_name (str): 対象のスプレッドシート名
+            columns (list): 取得する列の指定（例: ['A']）。Noneの場合は全列
+            interval (float): 更新確認の間隔（秒）
+            store (SnapshotStore): スナップショットの保存先（起動時の読み込みと更新時の保存に使用）
+            cache (CacheBackend): レプリカ間で共有するキャッシュ（Noneの場合は共有しない）
+            search_columns (list): テキストで検索する列インデックス（フィルター用に取得した列を除く場合に指定）
+        """
+        self.handler_factory = handler_factory
+        self.spreadsheet_name = spreadsheet_name
+        self.columns = columns
+        self.interval = interval
+        self.store = store
+        self.cache = cache
+        self.search_columns = search_columns
+        self.replica_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.spreadsheet_id = None
+        self.last_refresh = None
+        self.last_error = None
+        self._current = None
+        self._alias_index = None
+        self._completer = None
+        self._filter_index = None
+        self._bm25_index = None
+        self._tfidf_index = None
+        self._derived_locks = {name: threading.Lock() for name in DERIVED_ATTRIBUTES.values()}
+        self._sync = None
+        self._listeners = []
+        self._save_listeners = []
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        """
+        公開中の (SheetSnapshot, SnapshotIndex)（まだない場合はNone）
+        """
+        return self._current
+
+    @property
+    def stale(self):
+        """
+        直近の更新確認に失敗し、公開中のスナップショットが最新か確認できない場合True
+        """
+        return self.last_error is not None
+
+    def add_listener(self, listener):
+        """
+        スナップショットの差し替え時に (旧, 新) の (snapshot, index) を受け取るコールバックを登録
+        """
+        self._listeners.append(listener)
+
+    def add_save_listener(self, listener):
+        """
+        スナップショットをファイルに保存した後に (snapshot) を受け取るコールバックを登録
+
+        保存したファイルを読み込む別のプロセス（reload_saved()）への通知に使用する。
+        """
+        self._save_listeners.append(listener)
+
+    def _save(self, snapshot, index):
+        """
+        スナップショットと索引をファイルに保存し、保存後のコールバックを呼び出す
+
+        派生した索引も作成して保存するため、保存したファイルを読み込むプロセス（スーパーバイザーのワーカー）は
+        索引を作り直さずにmmapした配列を共有する。
+        """
+        if self.store is None or not self.store.save(snapshot, index, self._all_derived(snapshot, index)):
+            return
+        for listener in self._save_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"スナップショット保存通知エラー: {e}")
+
+    def _publish(self, snapshot, index):
+        """
+        新しいスナップショットと索引を公開（参照の差し替えのみで完了する）
+
+        検索に必要なのは索引のみのため、別名索引・入力補完・類似検索などの派生した索引は
+        公開後にバックグラウンドで作成する（作成前に使われた場合はその時点で作成する。
+        保存されていた索引を読み込んだ場合は作成しない）。
+        """
+        previous = self._current
+        self._current = (snapshot, index)
+        for listener in self._listeners:
+            try:
+                listener(previous, self._current)
+            except Exception as e:
+                print(f"スナップショット更新通知エラー: {e}")
+        threading.Thread(target=self._build_derived, args=(snapshot,), name='snapshot-indexer',
+                         daemon=True).start()
+
+    def _build_derived(self, snapshot):
+        """
+        公開したスナップショットの派生した索引を作成（作成中に差し替えられた場合は中止）
+
+        フィルター用の索引は使われるとは限らないため、初めてフィルター付きで検索した時に作成する。
+        """
+        builders = [
+            lambda: self._get_alias_index(snapshot),
+            lambda: self._get_completer(snapshot),
+            lambda: self._get_tfidf_index(snapshot),
+        ]
+        for build in builders:
+            current = self._current
+            if current is None or current[0] is not snapshot:
+                return
+            try:
+                build()
+            except Exception as e:
+                print(f"索引の作成エラー: {e}")
+
+    def _all_derived(self, snapshot, index):
+        """
+        スナップショットの全ての派生した索引（作成に失敗したものは含めない）
+        """
+        builders = {
+            'alias': lambda: self._get_alias_index(snapshot),
+            'completer': lambda: self._get_completer(snapshot),
+            'filter': lambda: self._get_filter_index(snapshot, index),
+            'bm25': lambda: self._get_bm25_index(snapshot),
+            'tfidf': lambda: self._get_tfidf_index(snapshot),
+        }
+        derived = {}
+        for name, build in builders.items():
+            try:
+                derived[name] = build()
+            except Exception as e:
+                print(f"索引の作成エラー: {e}")
+        return derived
+
+    def _adopt_derived(self, snapshot, derived):
+        """
+        保存されていた派生した索引を、公開するスナップショットのものとして保持（作り直さない）
+        """
+        for name, value in derived.items():
+            attribute = DERIVED_ATTRIBUTES[name]
+            with self._derived_locks[attribute]:
+                setattr(self, attribute, (snapshot, value))
+
+    def _get_derived(self, name, snapshot, build):
+        """
+        スナップショットごとに1回だけ作成する派生した索引を取得
+
+        同じ索引の作成は1スレッドずつ行い、バックグラウンドで作成中の場合はその完了を待つ。
+
+        Args:
+            name (str): 索引を保持する属性名
+            snapshot (SheetSnapshot): 対象のスナップショット
+            build (callable): 索引を作成する関数
+        """
+        derived = getattr(self, name)
+        if derived is not None and derived[0] is snapshot:
+            return derived[1]
+        with self._derived_locks[name]:
+            derived = getattr(self, name)
+            if derived is None or derived[0] is not snapshot:
+                derived = (snapshot, build())
+                setattr(self, name, derived)
+            return derived[1]
+
+    def _get_alias_index(self, snapshot):
+        """
+        スナップショットの1列目の別名索引を取得（スナップショットごとに1回だけ作成）
+        """
+        return self._get_derived('_alias_index', snapshot, lambda: AliasIndex.build(snapshot.column_pool(0)))
+
+    def _get_completer(self, snapshot):
+        """
+        スナップショットの1列目の入力補完用の配列を取得（スナップショットごとに1回だけ作成）
+        """
+        return self._get_derived('_completer', snapshot, lambda: NameCompleter.build(snapshot.column_pool(0)))
+
+    def _get_filter_index(self, snapshot, index):
+        """
+        スナップショットのフィルター用の索引を取得（初めてフィルター付きで検索した時に1回だけ作成）
+        """
+        return self._get_derived('_filter_index', snapshot, lambda: FilterIndex.build(snapshot, index))
+
+    def _get_bm25_index(self, snapshot):
+        """
+        スナップショットの関連度検索（BM25）の索引を取得（最初の関連度検索の時にスナップショットごとに1回だけ作成）
+        """
+        return self._get_derived('_bm25_index', snapshot, lambda: BM25Index.build(snapshot))
+
+    def _get_tfidf_index(self, snapshot):
+        """
+        スナップショットの類似検索（TF-IDF）の索引を取得（スナップショットごとに1回だけ作成）
+        """
+        return self._get_derived('_tfidf_index', snapshot, lambda: TfidfIndex.build(snapshot))
+
+    def load_saved(self):
+        """
+        保存済みのスナップショットを読み込んで公開（起動直後の応答用）
+
+        Returns:
+            bool: 読み込めた場合True
+        """
+        if self._current is not None:
+            return False
+        return self._load_store()
+
+    def reload_saved(self):
+        """
+        保存済みのスナップショットが公開中のものと異なれば読み込んで差し替える
+
+        他のプロセスが更新・保存したファイルに追従する場合（スーパーバイザーのワーカー）に使用する。
+        ファイルはmmapで読み込むため、同じファイルを読み込むプロセス間でページキャッシュを共有する。
+
+        Returns:
+            bool: スナップショットを差し替えた場合True
+        """
+        return self._load_store()
+
+    def _load_store(self):
+        """
+        保存済みのスナップショットを読み込んで公開（公開中のものと同じ場合は何もしない）
+        """
+        if self.store is None:
+            return False
+        loaded = self.store.load()
+        if not loaded:
+            return False
+        snapshot, index, derived = loaded
+        if snapshot.metadata.get('spreadsheet_name', self.spreadsheet_name) != self.spreadsheet_name:
+            # 別のスプレッドシートのスナップショットは使用しない
+            return False
+        if snapshot.metadata.get('columns', self.columns) != self.columns:
+            # 取得する列の指定が異なるスナップショットは使用しない（フィルター用の列がない場合など）
+            return False
+        current = self._current
+        if current is not None and self._shared_meta(current[0]) == self._shared_meta(snapshot):
+            return False
+        if index is None:
+            index = SnapshotIndex.build(snapshot)
+        self.spreadsheet_id = snapshot.metadata.get('spreadsheet_id')
+        self._adopt_derived(snapshot, derived)
+        self._publish(snapshot, index)
+        print(f"保存済みのスナップショットを読み込みました（バージョン {snapshot.version}, {len(snapshot)}行）")
+        return True
+
+    def refresh(self, force=False):
+        """
+        Driveの更新日時を確認し、変更があればスナップショットを再構築して差し替える
+
+        Args:
+            force (bool): 更新日時に関わらず同期する場合True
+
+        Returns:
+            bool: スナップショットを差し替えた場合True
+
+        Raises:
+            Exception: API呼び出しに失敗した場合（公開中のスナップショットは変更しない）
+        """
+        try:
+            refreshed = self._refresh(force)
+        except Exception as e:
+            self.last_error = e
+            raise
+        self.last_error = None
+        return refreshed
+
+    def _refresh(self, force):
+        """
+        refresh() の本体（更新確認と同期を1スレッドずつ実行）
+        """
+        with self._refresh_lock:
+            sheets_handler = self.handler_factory()
+
+            if not self.spreadsheet_id:
+                self.spreadsheet_id = sheets_handler.find_spreadsheet_by_name(self.spreadsheet_name)
+                if not self.spreadsheet_id:
+                    raise LookupError(f"スプレッドシート '{self.spreadsheet_name}' が見つかりません")
+
+            # 他のレプリカが更新を担当している場合は、共有キャッシュから読み込むのみ
+            if self.cache is not None and not self._hold_lease():
+                self.last_refresh = time.time()
+                return self._adopt_shared()
+
+            current = self._current
+            modified_time = sheets_handler.get_modified_time(self.spreadsheet_id)
+            if (not force and current is not None and modified_time
+                    and current[0].metadata.get('modified_time') == modified_time):
+                self._share(current, only_if_missing=True)
+                self.last_refresh = time.time()
+                return False
+
+            if self._sync is None:
+                self._sync = IncrementalSheetSync(sheets_handler, self.spreadsheet_id, columns=self.columns)
+                if current is not None:
+                    # 保存済み・共有のスナップショットから始めた場合も、バージョンが公開中のものより後になるようにする
+                    # （同じバージョンが別の内容を指すと、バージョンで差分を追う処理が変更を見落とす）
+                    self._sync.snapshot.version = current[0].version
+
+            # 公開中のスナップショットは変更せず、複製に対して差分同期を行う
+            # （同期状態がない初回は全件を取得するため複製は不要）
+            if current is not None and self._sync.sheet_states:
+                self._sync.snapshot = current[0].copy(version=current[0].version)
+            result = self._sync.refresh()
+
+            if result['mode'] == 'unchanged' and modified_time:
+                # サンプル行と末尾に変化がないのに更新日時が変わった場合は、サンプル以外の行の編集を
+                # 見落とさないよう全件を再取得する（再取得せずに新しい更新日時を記録すると、以降も検出できない）
+                result = self._sync.full_reload()
+                if current is not None and self._sync.snapshot.to_rows() == current[0].to_rows():
+                    result = {'mode': 'unchanged', 'added': 0}
+
+            snapshot = self._sync.snapshot
+            snapshot.metadata['modified_time'] = modified_time
+            snapshot.metadata['spreadsheet_name'] = self.spreadsheet_name
+            if current is not None and result['mode'] == 'unchanged':
+                # 内容に変更がない場合（取得していない列の編集など）は索引を作り直さずに更新日時のみ反映
+                current[0].metadata['modified_time'] = modified_time
+                self._share(current, only_if_missing=True)
+                self.last_refresh = time.time()
+                return False
+
+            index = SnapshotIndex.build(snapshot)
+            self._publish(snapshot, index)
+            self.last_refresh = time.time()
+            print(f"スナップショットを更新しました（{result['mode']}, バージョン {snapshot.version}, {len(snapshot)}行）")
+
+            self._save(snapshot, index)
+            self._share(self._current)
+            return True
+
+    def apply_appended(self, sheet_name, first_row, rows):
+        """
+        ボットが書き込んだ行を、全件を再取得せずに新しいスナップショットとして公開
+
+        公開中のスナップショットの複製に行を追加して索引を作り直し、差し替える（同期状態も更新するため、
+        次回の差分同期で同じ行を再取得しない）。このレプリカが同期を担当していない場合は何もしない
+        （担当のレプリカの差分同期で取得される）。
+
+        Args:
+            sheet_name (str): 書き込んだシート名
+            first_row (int): 書き込んだ最初の行番号
+            rows (list): 書き込んだ行データ（A列から）のリスト
+
+        Returns:
+            bool: スナップショットを差し替えた場合True
+        """
+        with self._refresh_lock:
+            current = self._current
+            if current is None or self._sync is None or not self._sync.sheet_states:
+                return False
+
+            self._sync.snapshot = current[0].copy(version=current[0].version)
+            if not self._sync.apply_appended(sheet_name, first_row, rows):
+                return False
+
+            snapshot = self._sync.snapshot
+            index = SnapshotIndex.build(snapshot)
+            self._publish(snapshot, index)
+            print(f"書き込んだ行をスナップショットに反映しました（バージョン {snapshot.version}, {len(rows)}行）")
+
+            self._save(snapshot, index)
+            self._share(self._current)
+            return True
+
+    def _cache_key(self, suffix):
+        """
+        共有キャッシュのキー（スプレッドシートと取得列ごと）
+        """
+        columns = ','.join(self.columns) if self.columns else '*'
+        return f"snapshot:{self.spreadsheet_id}:{columns}:{suffix}"
+
+    def _hold_lease(self):
+        """
+        更新担当のリースを取得または延長（取得できた場合True）
+
+        担当のレプリカが停止した場合は、リースの期限切れ後に他のレプリカが引き継ぐ。
+        取得と延長はそれぞれ不可分に行い、期限切れの直後に他のレプリカが取得したリースを上書きしない。
+        """
+        key = self._cache_key('lease')
+        owner = self.replica_id.encode('utf-8')
+        ttl = max(self.interval * 3, 30)
+        return self.cache.add(key, owner, ttl) or self.cache.compare_and_set(key, owner, owner, ttl)
+
+    def _share(self, current, only_if_missing=False):
+        """
+        公開中のスナップショットを共有キャッシュに保存
+        """
+        if self.cache is None or current is None:
+            return
+        snapshot, index = current
+        meta_key = self._cache_key('meta')
+        if only_if_missing and self.cache.get_json(meta_key) == self._shared_meta(snapshot):
+            return
+        # 本体を先に保存し、メタ情報の更新で他のレプリカに通知する
+        self.cache.set(self._cache_key('data'), SnapshotStore.dumps(snapshot, index))
+        self.cache.set_json(meta_key, self._shared_meta(snapshot))
+
+    @staticmethod
+    def _shared_meta(snapshot):
+        return {'version': snapshot.version, 'modified_time': snapshot.metadata.get('modified_time')}
+
+    def _adopt_shared(self):
+        """
+        共有キャッシュのスナップショットが公開中のものと異なれば読み込んで差し替える
+
+        Returns:
+            bool: スナップショットを差し替えた場合True
+        """
+        meta = self.cache.get_json(self._cache_key('meta'))
+        current = self._current
+        if meta is None or (current is not None and meta == self._shared_meta(current[0])):
+            return False
+
+        data = self.cache.get(self._cache_key('data'))
+        loaded = SnapshotStore.loads(data) if data is not None else None
+        if not loaded:
+            return False
+        snapshot, index, derived = loaded
+        if index is None:
+            index = SnapshotIndex.build(snapshot)
+
+        # 差分同期の状態は他のレプリカのものと一致しないため、担当になった時点で全件を取得し直す
+        self._sync = None
+        self._adopt_derived(snapshot, derived)
+        self._publish(snapshot, index)
+        print(f"共有キャッシュのスナップショットを読み込みました（バージョン {snapshot.version}, {len(snapshot)}行）")
+
+        self._save(snapshot, index)
+        return True
+
+    def _run(self):
+        """
+        バックグラウンドスレッドの処理（停止されるまで一定間隔で更新を確認）
+        """
+        while True:
+            try:
+                self.refresh()
+            except CircuitOpenError:
+                # 障害中は上流を呼び出さず、最後に取得できたスナップショットで応答を続ける
+                pass
+            except Exception as e:
+                print(f"スナップショット更新エラー: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        """
+        保存済みのスナップショットを読み込み、バックグラウンドでの更新を開始
+        """
+        self.load_saved()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        バックグラウンドでの更新を停止
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def search(self, search_text, search_types=['exact', 'partial', 'fuzzy'], limit=10, filters=None, stop_after=None):
+        """
+        公開中のスナップショットで検索（Google APIは呼び出さない）
+
+        Args:
+            search_text (str): 検索するテキスト
+            search_types (list): 検索タイプのリスト
+            limit (int): 返す結果の件数（揃った時点でコストの高い検索タイプを省略する）
+            filters (list): 列のフィルター [(フィルター名, 値)]（column_filter.parse_query() の結果）
+            stop_after (int): コストの高い検索タイプを省略する結果の件数（Noneの場合は limit）
+
+        Returns:
+            dict: 検索結果の詳細情報（スナップショットがまだない場合はNone）
+                  更新確認に失敗している場合は 'stale': True と 'refreshed_at'（最終確認時刻）を含む
+        """
+        current = self._current
+        if current is None:
+            return None
+        snapshot, index = current
+        if filters:
+            result = filter_search(snapshot, self._get_filter_index(snapshot, index), filters, search_text, search_types, limit)
+        else:
+            bm25_index = self._get_bm25_index(snapshot) if 'bm25' in search_types else None
+            tfidf_index = self._get_tfidf_index(snapshot) if 'tfidf' in search_types else None
+            result = self.handler_factory().search_snapshot(snapshot, search_text, search_types, index=index, limit=limit,
+                                                            columns=self.search_columns, bm25_index=bm25_index,
+                                                            tfidf_index=tfidf_index, stop_after=stop_after)
+        result['snapshot_version'] = snapshot.version
+        result['stale'] = self.stale
+        result['refreshed_at'] = self.last_refresh
+        return result
+
+    def suggest(self, search_text, limit=3):
+        """
+        公開中のスナップショットから表記ゆれ・略称で近いソフトウェア名を取得（「もしかして」用）
+
+        Args:
+            search_text (str): 検索するテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: 検索結果のリスト（スナップショットがまだない場合はNone）
+        """
+        current = self._current
+        if current is None:
+            return None
+        snapshot, index = current
+        return suggestion_matches(snapshot, index, self._get_alias_index(snapshot), search_text, limit)
+
+    def complete(self, text, limit=MAX_COMPLETIONS):
+        """
+        公開中のスナップショットから入力中のテキストに一致するソフトウェア名を取得（入力補完用）
+
+        Args:
+            text (str): 入力中のテキスト
+            limit (int): 取得する件数
+
+        Returns:
+            list: ソフトウェア名のリスト（スナップショットがまだない場合はNone）
+        """
+        current = self._current
+        if current is None:
+            return None
+        snapshot, index = current
+        return self._get_completer(snapshot).complete(snapshot, index, text, limit)
+
+
+def source_refreshers(handler_factory, sources, cache=None):
+    """
+    検索対象のスプレッドシート（ソース）ごとの SnapshotRefresher を作成
+
+    ソフトウェア名とフィルター用の列を取得し、テキストの検索はソフトウェア名（1列目）のみとする。
+    スナップショットはソースごとのファイル（環境変数 SNAPSHOT_PATH を基準）に保存する。
+
+    Args:
+        handler_factory (callable): GoogleSheetsHandlerAdvanced を返す関数
+        sources (list): spreadsheet_sources.load_sources() の戻り値
+        cache (CacheBackend): レプリカ間で共有するキャッシュ
+
+    Returns:
+        dict: {スプレッドシート名: SnapshotRefresher}
+    """
+    return {
+        source['name']: SnapshotRefresher(
+            handler_factory,
+            source['name'],
+            columns=SNAPSHOT_COLUMNS,
+            store=SnapshotStore(source_snapshot_path(os.environ.get("SNAPSHOT_PATH", "sheet_snapshot.bin"), source['name'])),
+            cache=cache,
+            search_columns=[0]
+        )
+        for source in sources
+    }
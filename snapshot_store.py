@@ -0,0 +1,398 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+from bm25_search import BM25Index
+from column_filter import FilterIndex, MappedBitmaps
+from name_completer import NameCompleter
+from name_matcher import AliasIndex
+from sheet_snapshot import SheetSnapshot, StringPool
+from snapshot_index import ColumnIndex, SnapshotIndex
+from tfidf_search import TfidfIndex
+
+# ファイル形式の識別子とバージョン（形式を変更した場合はバージョンを上げる）
+MAGIC = b'BOLTSNAP'
+FORMAT_VERSION = 1
+
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 8
+
+
+class MappedStrings:
+    __slots__ = ('_blob', '_offsets', '_strings', '_lower', '_ids')
+
+    def __init__(self, blob, offsets):
+        """
+        mmapしたUTF-8文字列の連結データとオフセット配列を参照する文字列シーケンス
+
+        文字列は参照時にのみデコードするため、読み込み時に全体をパースしない。
+
+        Args:
+            blob (memoryview): UTF-8文字列を連結したバイト列
+            offsets (memoryview): 各文字列の開始位置（要素数は文字列数+1）
+        """
+        self._blob = blob
+        self._offsets = offsets
+        self._strings = None
+        self._lower = None
+        self._ids = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if self._strings is not None:
+            return self._strings[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    @property
+    def strings(self):
+        """
+        全ての文字列のリスト（初回のみデコード）
+        """
+        if self._strings is None:
+            self._strings = [self[index] for index in range(len(self))]
+        return self._strings
+
+    def lower(self):
+        """
+        小文字化した文字列のリスト（初回のみ作成）
+        """
+        if self._lower is None:
+            self._lower = [string.lower() for string in self.strings]
+        return self._lower
+
+    def find(self, text):
+        """
+        文字列のIDを検索（登録されていない場合はNone）
+        """
+        if not text:
+            return 0
+        if self._ids is None:
+            self._ids = {string: index for index, string in enumerate(self.strings)}
+        return self._ids.get(text)
+
+    def copy(self):
+        """
+        変更可能な StringPool に変換
+        """
+        return StringPool(list(self.strings))
+
+
+class SnapshotStore:
+    def __init__(self, path):
+        """
+        スナップショットと索引をバージョン付きバイナリファイルとして保存・読み込み
+
+        派生した索引（別名・入力補完・フィルター・BM25・TF-IDF）も保存できる。同じファイルを読み込む
+        プロセス（スーパーバイザーのワーカー）はmmapした配列をそのまま参照するため、作り直さない。
+
+        Args:
+            path (str): 保存先のファイルパス
+        """
+        self.path = path
+
+    @staticmethod
+    def _encode_strings(strings):
+        """
+        文字列のリストを連結データとオフセット配列に変換
+        """
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = array('I', [0])
+        total = 0
+        for data in encoded:
+            total += len(data)
+            offsets.append(total)
+        return b''.join(encoded), offsets
+
+    @classmethod
+    def _sections(cls, snapshot, index, derived):
+        """
+        保存するセクション（名前, データ, 型コード）と、派生した索引の復元に必要な情報を列挙
+        """
+        sections = []
+        derived_header = {}
+
+        def add_strings(name, strings):
+            blob, offsets = cls._encode_strings(strings)
+            sections.append((f'{name}.blob', blob, 'B'))
+            sections.append((f'{name}.offsets', offsets, 'I'))
+
+        for column in range(snapshot.width):
+            add_strings(f'pool{column}', snapshot.column_pool(column).strings)
+            sections.append((f'cells{column}', snapshot.column_ids(column), 'I'))
+        sections.append(('row_numbers', snapshot.row_numbers, 'I'))
+        sections.append(('sheet_ids', snapshot.sheet_ids, 'I'))
+        add_strings('sheets', snapshot.sheets.strings)
+
+        if index is not None:
+            for column, column_index in enumerate(index.columns):
+                sections.append((f'index{column}.order', column_index.order, 'I'))
+                sections.append((f'index{column}.row_starts', column_index.row_starts, 'I'))
+                sections.append((f'index{column}.row_ids', column_index.row_ids, 'I'))
+                add_strings(f'index{column}.gram_keys', column_index.gram_keys)
+                sections.append((f'index{column}.gram_starts', column_index.gram_starts, 'I'))
+                sections.append((f'index{column}.gram_ids', column_index.gram_ids, 'I'))
+
+        derived = derived or {}
+        alias_index = derived.get('alias')
+        if alias_index is not None:
+            add_strings('alias.keys', alias_index.keys)
+            sections.append(('alias.id_starts', alias_index.id_starts, 'I'))
+            sections.append(('alias.ids', alias_index.ids, 'I'))
+            add_strings('alias.gram_keys', alias_index.gram_keys)
+            sections.append(('alias.gram_starts', alias_index.gram_starts, 'I'))
+            sections.append(('alias.gram_positions', alias_index.gram_positions, 'I'))
+            derived_header['alias'] = {}
+
+        completer = derived.get('completer')
+        if completer is not None:
+            add_strings('completer.keys', completer.keys)
+            sections.append(('completer.ids', array('I', completer.ids), 'I'))
+            derived_header['completer'] = {}
+
+        bm25_index = derived.get('bm25')
+        if bm25_index is not None:
+            add_strings('bm25.terms', bm25_index.terms)
+            sections.append(('bm25.starts', bm25_index.starts, 'I'))
+            sections.append(('bm25.rows', bm25_index.rows, 'I'))
+            sections.append(('bm25.impacts', bm25_index.impacts, 'f'))
+            sections.append(('bm25.max_impacts', bm25_index.max_impacts, 'f'))
+            derived_header['bm25'] = {'row_count': bm25_index.row_count}
+
+        tfidf_index = derived.get('tfidf')
+        if tfidf_index is not None:
+            matrix = tfidf_index.matrix
+            add_strings('tfidf.vocabulary', tfidf_index.vocabulary)
+            sections.append(('tfidf.idf', np.ascontiguousarray(tfidf_index.idf, dtype=np.float32), 'f'))
+            sections.append(('tfidf.data', np.ascontiguousarray(matrix.data, dtype=np.float32), 'f'))
+            sections.append(('tfidf.indices', np.ascontiguousarray(matrix.indices, dtype=np.int32), 'i'))
+            sections.append(('tfidf.indptr', np.ascontiguousarray(matrix.indptr, dtype=np.int32), 'i'))
+            derived_header['tfidf'] = {'shape': list(matrix.shape)}
+
+        filter_index = derived.get('filter')
+        if filter_index is not None and index is not None:
+            width = (filter_index.row_count + 7) // 8
+            kinds = {}
+            for column, (values, rows) in filter_index.columns.items():
+                add_strings(f'filter{column}.values', values)
+                if isinstance(rows, ColumnIndex):
+                    # 行インデックスはスナップショットの索引の同じ列を参照する
+                    kinds[column] = 'index'
+                    continue
+                bitmaps = b''.join(rows[string_id].to_bytes(width, 'little') for string_id in range(1, len(values)))
+                sections.append((f'filter{column}.bitmaps', bitmaps, 'B'))
+                kinds[column] = 'bitmaps'
+            derived_header['filter'] = {'row_count': filter_index.row_count, 'columns': kinds}
+
+        return sections, derived_header
+
+    @classmethod
+    def _chunks(cls, snapshot, index, derived=None):
+        """
+        保存形式のバイト列を先頭から順に列挙
+        """
+        section_table = {}
+        payloads = []
+        offset = 0
+        sections, derived_header = cls._sections(snapshot, index, derived)
+        for name, data, typecode in sections:
+            payload = memoryview(data).cast('B') if not isinstance(data, bytes) else data
+            padding = -len(payload) % _ALIGNMENT
+            section_table[name] = [offset, len(payload), typecode]
+            payloads.append((payload, padding))
+            offset += len(payload) + padding
+
+        header = json.dumps({
+            'version': snapshot.version,
+            'metadata': snapshot.metadata,
+            'width': snapshot.width,
+            'indexed': index is not None,
+            'derived': derived_header,
+            'byteorder': sys.byteorder,
+            'sections': section_table
+        }, ensure_ascii=False).encode('utf-8')
+        header += b' ' * (-(len(header) + _PREAMBLE.size) % _ALIGNMENT)
+
+        yield _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header))
+        yield header
+        for payload, padding in payloads:
+            yield payload
+            yield b'\0' * padding
+
+    @classmethod
+    def dumps(cls, snapshot, index=None, derived=None):
+        """
+        スナップショットと索引をファイルと同じ形式のバイト列に変換（共有キャッシュへの保存用）
+
+        Args:
+            snapshot (SheetSnapshot): 変換するスナップショット
+            index (SnapshotIndex): 変換する索引
+            derived (dict): 変換する派生した索引 {'alias', 'completer', 'filter', 'bm25', 'tfidf'}（一部のみでもよい）
+
+        Returns:
+            bytes: 保存形式のバイト列
+        """
+        return b''.join(cls._chunks(snapshot, index, derived))
+
+    @classmethod
+    def loads(cls, data):
+        """
+        dumps() で変換したバイト列からスナップショットと索引を復元（データはコピーせずに参照する）
+
+        Args:
+            data (bytes): 保存形式のバイト列
+
+        Returns:
+            tuple: (SheetSnapshot, SnapshotIndex, 派生した索引のdict) 。形式が異なる場合はNone
+        """
+        try:
+            return cls._parse(memoryview(data))
+        except (ValueError, KeyError, struct.error) as e:
+            print(f"スナップショット形式エラー: {e}")
+            return None
+
+    def save(self, snapshot, index=None, derived=None):
+        """
+        スナップショットと索引をファイルに保存（一時ファイルに書き込んでから置き換え）
+
+        Args:
+            snapshot (SheetSnapshot): 保存するスナップショット
+            index (SnapshotIndex): 保存する索引
+            derived (dict): 保存する派生した索引（dumps() と同じ）
+
+        Returns:
+            bool: 保存に成功した場合True
+        """
+        temp_path = f"{self.path}.tmp{os.getpid()}"
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in self._chunks(snapshot, index, derived):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            return True
+
+        except OSError as e:
+            # Windowsではmmap中のファイルを置き換えられない場合がある
+            print(f"スナップショット保存エラー: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+    def load(self):
+        """
+        ファイルをmmapしてスナップショットと索引を読み込む（全体のパースは行わない）
+
+        Returns:
+            tuple: (SheetSnapshot, SnapshotIndex, 派生した索引のdict) 。ファイルがない・形式が異なる場合はNone
+                   索引が保存されていない場合、SnapshotIndexはNone。派生した索引は保存されたもののみ含む
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"スナップショット読み込みエラー: {e}")
+            return None
+
+        return self.loads(mapped)
+
+    @staticmethod
+    def _parse(buffer):
+        """
+        mmapしたバッファからスナップショットと索引を復元（データはコピーせずに参照する）
+        """
+        magic, format_version, header_length = _PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"未対応の形式です: {magic!r} v{format_version}")
+
+        data_start = _PREAMBLE.size + header_length
+        header = json.loads(str(buffer[_PREAMBLE.size:data_start], 'utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError("バイトオーダーが異なります")
+        sections = header['sections']
+
+        def section(name):
+            offset, length, typecode = sections[name]
+            view = buffer[data_start + offset:data_start + offset + length]
+            return view if typecode == 'B' else view.cast(typecode)
+
+        def strings(name):
+            return MappedStrings(section(f'{name}.blob'), section(f'{name}.offsets'))
+
+        snapshot = SheetSnapshot(header['version'], header['metadata'])
+        snapshot.pools = [strings(f'pool{column}') for column in range(header['width'])]
+        snapshot.cells = [section(f'cells{column}') for column in range(header['width'])]
+        snapshot.row_numbers = section('row_numbers')
+        snapshot.sheet_ids = section('sheet_ids')
+        snapshot.sheets = strings('sheets')
+
+        index = None
+        if header['indexed']:
+            index = SnapshotIndex([
+                ColumnIndex(
+                    section(f'index{column}.order'),
+                    section(f'index{column}.row_starts'),
+                    section(f'index{column}.row_ids'),
+                    strings(f'index{column}.gram_keys'),
+                    section(f'index{column}.gram_starts'),
+                    section(f'index{column}.gram_ids')
+                )
+                for column in range(header['width'])
+            ], header['version'])
+
+        return snapshot, index, SnapshotStore._parse_derived(header.get('derived', {}), section, strings, index)
+
+    @staticmethod
+    def _parse_derived(specs, section, strings, index):
+        """
+        保存された派生した索引を復元（mmapした配列をそのまま参照する）
+        """
+        derived = {}
+        if 'alias' in specs:
+            derived['alias'] = AliasIndex(
+                strings('alias.keys'), section('alias.id_starts'), section('alias.ids'),
+                strings('alias.gram_keys'), section('alias.gram_starts'), section('alias.gram_positions')
+            )
+        if 'completer' in specs:
+            derived['completer'] = NameCompleter(strings('completer.keys'), section('completer.ids'))
+        if 'bm25' in specs:
+            derived['bm25'] = BM25Index(
+                strings('bm25.terms'), section('bm25.starts'), section('bm25.rows'),
+                section('bm25.impacts'), section('bm25.max_impacts'), specs['bm25']['row_count']
+            )
+        if 'tfidf' in specs:
+            matrix = sparse.csc_matrix((
+                np.frombuffer(section('tfidf.data'), dtype=np.float32),
+                np.frombuffer(section('tfidf.indices'), dtype=np.int32),
+                np.frombuffer(section('tfidf.indptr'), dtype=np.int32)
+            ), shape=tuple(specs['tfidf']['shape']), copy=False)
+            derived['tfidf'] = TfidfIndex(
+                strings('tfidf.vocabulary'), np.frombuffer(section('tfidf.idf'), dtype=np.float32), matrix
+            )
+        if 'filter' in specs and index is not None:
+            row_count = specs['filter']['row_count']
+            columns = {}
+            for column, kind in specs['filter']['columns'].items():
+                column = int(column)
+                if kind == 'index':
+                    rows = index.column(column)
+                else:
+                    rows = MappedBitmaps(section(f'filter{column}.bitmaps'), (row_count + 7) // 8)
+                columns[column] = (strings(f'filter{column}.values'), rows)
+            derived['filter'] = FilterIndex(row_count, columns)
+        return derived
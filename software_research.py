@@ -1,8 +1,44 @@
 import os
+import time
 
 import openai
 
-from google_sheets_handler_advanced import GoogleSheetsHandlerAdvanced
+from cache_backend import get_cache
+from google_sheets_handler_advanced import NAME_COLUMNS, GoogleSheetsHandlerAdvanced
+from name_matcher import name_aliases, normalize_name
+from research_scheduler import PRIORITY_INTERACTIVE, get_research_scheduler
+from spreadsheet_sources import primary_spreadsheet
+
+# 調査結果をキャッシュする期間（秒）。レプリカ間で共有し、同じソフトウェアの再調査を防ぐ
+RESEARCH_CACHE_TTL = float(os.environ.get("RESEARCH_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+# 1回の調査で生成するトークン数の上限
+RESEARCH_MAX_TOKENS = 500
+
+# 期限が指定されていない場合の調査の期限（秒）
+RESEARCH_DEADLINE = float(os.environ.get("RESEARCH_DEADLINE", "60"))
+
+
+def research_cache_key(software_name):
+    """
+    調査結果のキャッシュのキー（正規化したソフトウェア名ごと）
+    """
+    return f"research:{normalize_name(software_name) or software_name.strip().lower()}"
+
+
+def invalidate_research_cache(software_names):
+    """
+    スプレッドシートで追加・変更・削除されたソフトウェアの調査結果のキャッシュを削除
+
+    略称で調査された場合も削除するため、名前の別名（正規化した名前と略称）のキーを全て削除する。
+
+    Args:
+        software_names (iterable): ソフトウェア名
+    """
+    cache = get_cache()
+    for software_name in software_names:
+        for alias in name_aliases(software_name):
+            cache.delete(f"research:{alias}")
 
 
 class SoftwareResearcher:
@@ -23,16 +59,26 @@ class SoftwareResearcher:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY環境変数が設定されていません")
     
-    def research_software(self, software_name):
+    def research_software(self, software_name, priority=PRIORITY_INTERACTIVE, deadline=None):
         """
         ChatGPT APIを使用してソフトウェア情報を調査
         
+        APIの呼び出しは共有のResearchSchedulerを経由し、同時実行数・トークン数の制限と
+        429時のリトライを受ける。応答が遅い場合は重複した呼び出しを追加し、先に返った結果を使う。
+        
         Args:
             software_name (str): 調査するソフトウェア名
+            priority (int): スケジューラーでの優先度（一括調査は PRIORITY_BATCH）
+            deadline (float): 調査の期限（time.monotonic() の値）。Noneの場合は RESEARCH_DEADLINE 秒後
             
         Returns:
             dict: 調査結果
         """
+        cache_key = research_cache_key(software_name)
+        cached_result = get_cache().get_json(cache_key)
+        if cached_result is not None:
+            return cached_result
+        
         try:
             prompt = f"""
 以下のソフトウェアについて、セキュリティ観点から簡潔に調査してください：
@@ -51,21 +97,42 @@ class SoftwareResearcher:
 不明な場合は「不明」と記載してください。
 """
 
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "あなたはソフトウェアセキュリティの専門家です。企業環境でのソフトウェア利用について、セキュリティ観点から簡潔で正確な情報を提供してください。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.3
+            system_prompt = "あなたはソフトウェアセキュリティの専門家です。企業環境でのソフトウェア利用について、セキュリティ観点から簡潔で正確な情報を提供してください。"
+
+            if deadline is None:
+                deadline = time.monotonic() + RESEARCH_DEADLINE
+
+            # リトライはスケジューラーで行うため、クライアント側のリトライは無効にする
+            client = openai.OpenAI(api_key=self.api_key, max_retries=0)
+
+            def create_completion():
+                # 各呼び出しのタイムアウトは期限までの残り時間とする
+                return client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=RESEARCH_MAX_TOKENS,
+                    temperature=0.3,
+                    timeout=max(1.0, deadline - time.monotonic())
+                )
+
+            response = get_research_scheduler().hedged_call(
+                create_completion,
+                priority=priority,
+                # 日本語は1文字1トークン程度のため、文字数を入力トークン数の見積もりとする
+                tokens=len(system_prompt) + len(prompt) + RESEARCH_MAX_TOKENS,
+                deadline=deadline
             )
             
             research_result = response.choices[0].message.content
             
             # 結果をパース
             parsed_result = self._parse_research_result(research_result)
+            
+            # 調査に成功した結果のみキャッシュする（エラー時は次回再調査する）
+            get_cache().set_json(cache_key, parsed_result, RESEARCH_CACHE_TTL)
             return parsed_result
             
         except Exception as e:
@@ -147,25 +214,44 @@ class SoftwareResearcher:
         
         return result
     
-    def add_software_to_sheet(self, software_name, research_result):
+    def add_software_to_sheet(self, software_name, research_result, find_listed=None):
         """
         調査結果をスプレッドシートに追加
         
         Args:
             software_name (str): ソフトウェア名
             research_result (dict): 調査結果
+            find_listed (callable): ソフトウェア名が完全一致する行 [(シート名, 行番号)] を公開中のスナップショットから
+                                    返す関数（スナップショットがない場合はNoneを返す）。Noneの場合はスプレッドシートを読む
             
         Returns:
             bool: 追加成功の可否
         """
         try:
-            # スプレッドシートを検索
-            target_spreadsheet = "I want to use free software / フリーソフトを利用したい のコピー"
-            spreadsheet_id = self.sheets_handler.find_spreadsheet_by_name(target_spreadsheet)
-            
-            if not spreadsheet_id:
-                print(f"スプレッドシート '{target_spreadsheet}' が見つかりません")
-                return False
+            # 重複チェック（公開中のスナップショットで確認し、スナップショットがない場合のみ
+            # 追加先のスプレッドシートのソフトウェア名の列を取得して確認）
+            listed = find_listed(software_name) if find_listed is not None else None
+            if listed is None:
+                target_spreadsheet = primary_spreadsheet()
+                spreadsheet_id = self.sheets_handler.find_spreadsheet_by_name(target_spreadsheet)
+                
+                if not spreadsheet_id:
+                    print(f"スプレッドシート '{target_spreadsheet}' が見つかりません")
+                    return False
+                
+                name_index = self.sheets_handler.get_all_sheet_data(spreadsheet_id, columns=NAME_COLUMNS)
+                software_name_lower = software_name.strip().lower()
+                listed = [
+                    (sheet_name, row_num) for row_data, row_num, sheet_name in name_index
+                    if row_data and str(row_data[0]).strip().lower() == software_name_lower
+                ]
+            if listed:
+                sheet_name, row_num = listed[0]
+                return {
+                    'success': False,
+                    'data': None,
+                    'message': f"'{software_name}'は既にリストに登録されています（{sheet_name} 行{row_num}）"
+                }
             
             # 新しい行のデータを準備
             new_row = [
@@ -179,9 +265,8 @@ class SoftwareResearcher:
                 research_result.get('special_remarks', '不明')  # special remarks
             ]
             
-            # スプレッドシートに行を追加
-            # 注意: 実際の書き込みは読み取り専用権限では実行できないため、
-            # ここでは追加予定の内容を返すのみとします
+            # 追加予定の内容を返すのみとします（書き込みモードでは、管理者が承認した行を
+            # 書き込みキュー（sheet_writer.SheetWriteQueue）がまとめてスプレッドシートに追加します）
             return {
                 'success': True,
                 'data': new_row,
@@ -197,13 +282,17 @@ class SoftwareResearcher:
             }
 
 
-def research_and_suggest_software(software_name, proxy_info=None):
+def research_and_suggest_software(software_name, proxy_info=None, priority=PRIORITY_INTERACTIVE, deadline=None,
+                                  find_listed=None):
     """
     ソフトウェアを調査して追加提案を行う便利関数
     
     Args:
         software_name (str): 調査するソフトウェア名
         proxy_info (dict): プロキシ情報
+        priority (int): OpenAI APIの呼び出しの優先度（一括調査は PRIORITY_BATCH）
+        deadline (float): 調査の期限（time.monotonic() の値）
+        find_listed (callable): 登録済みか公開中のスナップショットで確認する関数（add_software_to_sheet() と同じ）
         
     Returns:
         dict: 調査結果と追加提案
@@ -214,10 +303,10 @@ def research_and_suggest_software(software_name, proxy_info=None):
         researcher = SoftwareResearcher(credentials_path, proxy_info)
         
         # ソフトウェア調査
-        research_result = researcher.research_software(software_name)
+        research_result = researcher.research_software(software_name, priority, deadline)
         
         # スプレッドシートへの追加提案
-        add_result = researcher.add_software_to_sheet(software_name, research_result)
+        add_result = researcher.add_software_to_sheet(software_name, research_result, find_listed)
         
         return {
             'software_name': software_name,
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+# 検索対象のスプレッドシート名（TARGET_SPREADSHEETS が未設定の場合）
+DEFAULT_SPREADSHEET = "I want to use free software / フリーソフトを利用したい のコピー"
+
+
+def load_sources():
+    """
+    検索対象のスプレッドシート（ソース）の一覧を環境変数から取得
+
+    環境変数 TARGET_SPREADSHEETS にJSONの配列で指定する。要素はスプレッドシート名の文字列、
+    または {"name": スプレッドシート名, "label": 表示名} のオブジェクト。
+    先頭のソースがソフトウェアの追加先（プライマリ）になる。
+
+    Returns:
+        list: {'name': スプレッドシート名, 'label': 表示名} のリスト
+    """
+    value = os.environ.get("TARGET_SPREADSHEETS", "").strip()
+    if not value:
+        return [{'name': DEFAULT_SPREADSHEET, 'label': DEFAULT_SPREADSHEET}]
+
+    try:
+        entries = json.loads(value)
+    except ValueError as e:
+        raise ValueError(f"TARGET_SPREADSHEETS はJSONの配列で指定してください: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("TARGET_SPREADSHEETS はJSONの配列で指定してください")
+
+    sources = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise ValueError(f"スプレッドシートの指定が不正です: {entry!r}")
+        sources.append({'name': entry['name'], 'label': entry.get('label') or entry['name']})
+    return sources
+
+
+def spreadsheet_names():
+    """
+    検索対象のスプレッドシート名のリスト
+    """
+    return [source['name'] for source in load_sources()]
+
+
+def primary_spreadsheet():
+    """
+    プライマリ（先頭）のスプレッドシート名（ソフトウェアの追加先）
+    """
+    return load_sources()[0]['name']
+
+
+def source_snapshot_path(base_path, spreadsheet_name):
+    """
+    ソースごとのスナップショット保存先（スプレッドシート名のハッシュをファイル名に付加）
+
+    Args:
+        base_path (str): 基準のパス（例: sheet_snapshot.bin）
+        spreadsheet_name (str): スプレッドシート名
+
+    Returns:
+        str: 保存先のパス（例: sheet_snapshot-1a2b3c4d.bin）
+    """
+    root, ext = os.path.splitext(base_path)
+    digest = hashlib.sha1(spreadsheet_name.encode('utf-8')).hexdigest()[:8]
+    return f"{root}-{digest}{ext}"
@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+from cache_backend import InProcessCacheBackend, get_cache
+from google_sheets_handler_advanced import GoogleSheetsHandlerAdvanced
+from snapshot_diff import SnapshotChangeLog
+from snapshot_refresher import source_refreshers
+from software_research import invalidate_research_cache
+from spreadsheet_sources import load_sources
+
+# 起動するSocket Modeのワーカープロセスの数
+SUPERVISOR_WORKERS = int(os.environ.get("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+
+# ワーカープロセスの死活と、スナップショットの更新確認の状態を確認する間隔（秒）
+SUPERVISOR_CHECK_INTERVAL = 1.0
+
+# 停止したワーカープロセスを再起動するまでの秒数（起動直後の異常終了の繰り返しを防ぐ）
+WORKER_RESTART_DELAY = 5.0
+
+# ワーカーへの通知の種類
+NOTICE_SAVED = 'saved'
+NOTICE_STATUS = 'status'
+
+
+def follow_notices(connection, refreshers):
+    """
+    ローダーからの通知を受け取り、保存されたスナップショットへの差し替えと更新確認の状態を反映（ワーカー側）
+
+    Args:
+        connection (Connection): ローダーからの通知を受け取る接続
+        refreshers (dict): {スプレッドシート名: SnapshotRefresher}（ワーカー内の、更新を行わないもの）
+    """
+    while True:
+        try:
+            kind, spreadsheet_name, value = connection.recv()
+        except (EOFError, OSError):
+            print("ローダーとの接続が切れました（最後に読み込んだスナップショットで応答を続けます）")
+            return
+        refresher = refreshers.get(spreadsheet_name)
+        if refresher is None:
+            continue
+        if kind == NOTICE_SAVED:
+            refresher.reload_saved()
+        elif kind == NOTICE_STATUS:
+            # ローダーの更新確認に失敗している間は、ワーカーの検索結果にも古い可能性があることを示す
+            refresher.last_error = RuntimeError(value) if value else None
+
+
+def _worker_main(connection, number, workers):
+    """
+    ワーカープロセスの処理（Google APIでの更新は行わず、ローダーが保存したスナップショットをmmapで読み込む）
+    """
+    import app
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    # Slackはリクエストを任意の接続に送るため、ユーザー・チャンネルごとの上限をワーカー間で分け合う
+    app.admission.share(workers)
+
+    for refresher in app.snapshot_refreshers.values():
+        refresher.load_saved()
+    threading.Thread(target=follow_notices, args=(connection, app.snapshot_refreshers),
+                     name='snapshot-follower', daemon=True).start()
+    if app.SHEETS_WRITE_MODE:
+        # 各ワーカーのキューは共有キャッシュのリースを取得してから書き込むため、同じ行を重複して追加しない
+        app.sheet_writes.start()
+
+    print(f"ワーカー{number}（pid {os.getpid()}）を起動しました")
+    SocketModeHandler(app.app, os.environ["SLACK_APP_TOKEN"]).start()
+
+
+class Supervisor:
+    def __init__(self, workers=SUPERVISOR_WORKERS, sources=None):
+        """
+        1つのローダーと複数のSocket Modeのワーカープロセスを起動・監視するスーパーバイザー
+
+        このプロセスがローダーとなり、全ソースのスナップショットを更新してファイルに保存し、
+        保存のたびにワーカーへ通知する。ワーカーは保存されたファイルを読み取り専用でmmapし、
+        通知を受けて新しいバージョンに差し替える（スナップショットと索引はページキャッシュを共有するため、
+        ワーカーの数を増やしてもメモリ使用量はほぼ増えない）。
+
+        Slackはボタンの操作などの続きのリクエストを任意のワーカーの接続に送るため、複数のワーカーを
+        起動する場合は、検索結果のカーソル・調査中の印・追加案と書き込みのリースを共有する
+        プロセス間で共有するキャッシュ（CACHE_BACKEND=sqlite）が必要。
+        ユーザー・チャンネルごとの受付の上限は、各ワーカーで 1/workers ずつに分け合う。
+
+        Args:
+            workers (int): ワーカープロセスの数
+            sources (list): 検索対象のソース（Noneの場合は環境変数から取得）
+        """
+        if workers > 1 and isinstance(get_cache(), InProcessCacheBackend):
+            raise ValueError("複数のワーカーを起動する場合は CACHE_BACKEND=sqlite を設定してください"
+                             "（検索結果のカーソル・調査中の印・追加案と書き込みのリースをワーカー間で共有するため）")
+        self.workers = workers
+        self.sources = sources if sources is not None else load_sources()
+        self._context = multiprocessing.get_context('spawn')
+        self._handler = None
+        self._handler_lock = threading.Lock()
+        self._processes = {}
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._statuses = {}
+        self.refreshers = source_refreshers(self._get_handler, self.sources, cache=get_cache())
+
+        # 差し替え時の差分はローダーで1回だけ計算してスナップショットと共に保存し、変更された名前の
+        # 調査結果のキャッシュを削除する（ワーカーは保存された差分を記録するのみで、計算し直さない）
+        self.changes = SnapshotChangeLog([source['name'] for source in self.sources])
+        for name, refresher in self.refreshers.items():
+            refresher.add_listener(
+                self.changes.listener(name, on_diff=lambda diff: invalidate_research_cache(diff.changed_names))
+            )
+
+    def _get_handler(self):
+        """
+        ローダーのGoogle Sheetsハンドラーを取得（初回のみ作成）
+        """
+        with self._handler_lock:
+            if self._handler is None:
+                credentials_path = os.environ.get("GOOGLE_CREDENTIALS_PATH", "google_service_account.json")
+                self._handler = GoogleSheetsHandlerAdvanced(credentials_path)
+            return self._handler
+
+    def _broadcast(self, notice):
+        """
+        全ワーカーに通知を送信（停止したワーカーへの送信は無視し、再起動時に最新を読み込ませる）
+        """
+        with self._connections_lock:
+            for number, connection in list(self._connections.items()):
+                try:
+                    connection.send(notice)
+                except (OSError, ValueError) as e:
+                    print(f"ワーカー{number}への通知エラー: {e}")
+
+    def _start_worker(self, number):
+        """
+        ワーカープロセスを起動（通知用の接続を作成して渡す）
+        """
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker_main, args=(receiver, number, self.workers),
+                                        name=f'socket-worker-{number}')
+        process.start()
+        receiver.close()
+        with self._connections_lock:
+            previous = self._connections.get(number)
+            if previous is not None:
+                previous.close()
+            self._connections[number] = sender
+        self._processes[number] = process
+
+    def _check_statuses(self):
+        """
+        ローダーの更新確認の状態（失敗しているか）が変わったソースをワーカーに通知
+        """
+        for spreadsheet_name, refresher in self.refreshers.items():
+            status = str(refresher.last_error) if refresher.last_error is not None else None
+            if self._statuses.get(spreadsheet_name) != status:
+                self._statuses[spreadsheet_name] = status
+                self._broadcast((NOTICE_STATUS, spreadsheet_name, status))
+
+    def _check_workers(self, restart_at):
+        """
+        停止したワーカープロセスを一定時間後に再起動
+        """
+        now = time.monotonic()
+        for number, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            if number not in restart_at:
+                print(f"ワーカー{number}が停止しました（終了コード {process.exitcode}）。{WORKER_RESTART_DELAY}秒後に再起動します")
+                restart_at[number] = now + WORKER_RESTART_DELAY
+            elif restart_at[number] <= now:
+                del restart_at[number]
+                self._start_worker(number)
+
+    def run(self):
+        """
+        ローダーとワーカーを起動し、停止されるまで監視
+        """
+        for spreadsheet_name, refresher in self.refreshers.items():
+            refresher.add_save_listener(
+                lambda snapshot, spreadsheet_name=spreadsheet_name:
+                    self._broadcast((NOTICE_SAVED, spreadsheet_name, snapshot.version))
+            )
+            refresher.start()
+
+        for number in range(self.workers):
+            self._start_worker(number)
+        print(f"{self.workers}個のワーカーを起動しました（ローダー pid {os.getpid()}）")
+
+        restart_at = {}
+        try:
+            while True:
+                time.sleep(SUPERVISOR_CHECK_INTERVAL)
+                self._check_statuses()
+                self._check_workers(restart_at)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10):
+        """
+        ワーカーを停止し、スナップショットの更新を停止
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+        with self._connections_lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+        for refresher in self.refreshers.values():
+            refresher.stop()
+
+
+if __name__ == "__main__":
+    # SIGTERMでもワーカーを停止してから終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    Supervisor().run()
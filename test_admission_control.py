@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+ユーザー・チャンネルごとの受付制御のテストスクリプト（オフラインテスト）
+"""
+
+import threading
+import time
+
+from admission_control import ADMITTED, QUEUED, REJECTED, WEIGHT_BATCH, AdmissionController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limits():
+    """
+    ユーザーの上限を超えたリクエストは順番待ちとなり、待ちの上限を超えると受け付けないことをテスト
+    """
+    print("=== 受付の上限のテスト ===")
+
+    clock = FakeClock()
+    gate = threading.Event()
+    controller = AdmissionController(workers=1, user_rate=60, user_burst=2, channel_rate=600, channel_burst=100,
+                                     max_queued=3, clock=clock)
+
+    statuses = [controller.submit('U1', 'C1', gate.wait).status for _ in range(5)]
+    assert statuses == [ADMITTED, ADMITTED, QUEUED, REJECTED, REJECTED]
+    rejected = controller.submit('U1', 'C1', gate.wait)
+    assert rejected.future is None and 0 < rejected.retry_after <= 1
+
+    # 他のユーザーは影響を受けない
+    assert controller.submit('U2', 'C1', lambda: 'ok').status == ADMITTED
+
+    # トークンが補充されると再び受け付ける
+    clock.now = 1.0
+    assert controller.submit('U1', 'C1', lambda: 'ok').status == ADMITTED
+    gate.set()
+    controller.shutdown()
+    assert controller.metrics()['completed'] == 5
+    print(f"統計: {controller.metrics()}")
+    print("結果: OK")
+
+
+def test_channel_limit():
+    """
+    チャンネルの上限を超えたリクエストは、ユーザーのトークンを消費せずに順番待ちとなることをテスト
+    """
+    print("=== チャンネルの上限のテスト ===")
+
+    clock = FakeClock()
+    controller = AdmissionController(workers=1, user_rate=60, user_burst=2, channel_rate=60, channel_burst=1,
+                                     max_queued=5, clock=clock)
+    assert controller.submit('U1', 'C1', lambda: None).status == ADMITTED
+    assert controller.submit('U2', 'C1', lambda: None).status == QUEUED
+    # 別のチャンネルではユーザーU2のトークンが残っている
+    assert controller.submit('U2', 'C2', lambda: None).status == ADMITTED
+    controller.shutdown()
+    print("結果: OK")
+
+
+def test_fair_queuing():
+    """
+    大量にリクエストしたユーザーがいても、他のユーザーのリクエストが先に処理されることをテスト
+    """
+    print("=== 公平キューのテスト ===")
+
+    gate = threading.Event()
+    order = []
+    controller = AdmissionController(workers=1, user_rate=6000, user_burst=100, channel_rate=6000, channel_burst=100)
+
+    # 1件目でワーカーを止めておき、その間にキューに追加する
+    controller.submit('blocker', None, gate.wait)
+    for i in range(10):
+        controller.submit('heavy', 'C1', lambda i=i: order.append(f'heavy{i}'))
+    controller.submit('batch', 'C1', lambda: order.append('batch'), weight=WEIGHT_BATCH, cost=1)
+    controller.submit('light', 'C1', lambda: order.append('light'))
+    gate.set()
+    controller.shutdown()
+
+    # 軽いユーザーは重いユーザーの1件目の直後に処理され、重みの低い一括処理は後回しになる
+    assert order.index('light') <= 1
+    assert order.index('batch') > order.index('light')
+    assert len(order) == 12
+    print(f"処理順: {order}")
+    print("結果: OK")
+
+
+def test_batch_cost():
+    """
+    一括処理は件数分のトークンを消費し、バケットの容量を超える件数は順番待ちとなることをテスト
+    """
+    print("=== 一括処理のコストのテスト ===")
+
+    clock = FakeClock()
+    gate = threading.Event()
+    controller = AdmissionController(workers=1, user_rate=60, user_burst=5, channel_rate=600, channel_burst=100,
+                                     max_queued=2, clock=clock)
+
+    assert controller.submit('U1', 'C1', gate.wait, weight=WEIGHT_BATCH, cost=3).status == ADMITTED
+    # 残りのトークン（2）では3件分に足りない
+    assert controller.submit('U1', 'C1', lambda: None, weight=WEIGHT_BATCH, cost=3).status == QUEUED
+    assert controller.submit('U1', 'C1', lambda: None, cost=2).status == ADMITTED
+
+    # 容量（5）を超える件数は、トークンが満たされていても上限内とはならない
+    clock.now = 60.0
+    assert controller.submit('U2', 'C1', lambda: None, weight=WEIGHT_BATCH, cost=100).status == QUEUED
+    assert controller.submit('U2', 'C1', lambda: None).status == ADMITTED
+    gate.set()
+    controller.shutdown()
+    assert controller.metrics()['completed'] == 5
+    print("結果: OK")
+
+
+def test_rate_limits_execution():
+    """
+    上限を超えて順番待ちとなったリクエストは、トークンが補充されるまで実行されないことをテスト
+    """
+    print("=== 実行のレートのテスト ===")
+
+    # 1秒あたり10件、連続して2件まで
+    controller = AdmissionController(workers=4, user_rate=600, user_burst=2, channel_rate=6000, channel_burst=100,
+                                     max_queued=10)
+    started = time.monotonic()
+    finished = []
+    admissions = [controller.submit('U1', 'C1', lambda: finished.append(time.monotonic() - started)) for _ in range(6)]
+    assert [admission.status for admission in admissions] == [ADMITTED] * 2 + [QUEUED] * 4
+    for admission in admissions:
+        admission.future.result(5)
+    controller.shutdown()
+
+    # 超過した4件は0.1秒ごとに1件ずつ実行される
+    finished.sort()
+    assert finished[1] < 0.1
+    assert finished[5] >= 0.35
+    assert controller.metrics()['waiting_for_tokens'] == 0
+    print(f"実行時刻: {[round(t, 2) for t in finished]}")
+    print("結果: OK")
+
+
+def test_shared_limits():
+    """
+    複数のプロセスで上限を分け合うと、各プロセスの上限が 1/parts になることをテスト
+    """
+    print("=== 上限の分け合いのテスト ===")
+
+    clock = FakeClock()
+    controller = AdmissionController(workers=1, user_rate=60, user_burst=4, channel_rate=600, channel_burst=100,
+                                     max_queued=0, clock=clock)
+    assert controller.submit('U1', 'C1', lambda: 'ok').status == ADMITTED
+    controller.share(2)
+    statuses = [controller.submit('U1', 'C1', lambda: 'ok').status for _ in range(3)]
+    assert statuses == [ADMITTED, ADMITTED, REJECTED]
+    # 補充も半分の速さ（1秒あたり0.5件）
+    clock.now = 1.0
+    assert controller.submit('U1', 'C1', lambda: 'ok').status == REJECTED
+    clock.now = 2.0
+    assert controller.submit('U1', 'C1', lambda: 'ok').status == ADMITTED
+    controller.shutdown()
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_limits()
+    test_channel_limit()
+    test_fair_queuing()
+    test_batch_cost()
+    test_rate_limits_execution()
+    test_shared_limits()
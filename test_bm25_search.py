@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+関連度検索（BM25）のテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+import random
+
+from bm25_search import BM25Index, tokenize
+from sheet_snapshot import SheetSnapshot
+from test_search_pipeline import make_handler
+
+
+def test_tokenize():
+    """
+    英数字は単語、日本語は文字バイグラムに分割することをテスト
+    """
+    print("=== 語の分割のテスト ===")
+
+    assert tokenize('Visual Studio Code') == ['visual', 'studio', 'code']
+    assert tokenize('Web会議ツール') == ['web', '会議', '議ツ', 'ツー', 'ール']
+    assert tokenize('ＺＯＯＭ 可') == ['zoom', '可']
+    print("結果: OK")
+
+
+def test_ranking():
+    """
+    行全体（複数の列）の関連度で順位付けされることをテスト
+    """
+    print("=== 関連度の順位のテスト ===")
+
+    rows = [
+        (['Zoom', 'Web会議', 'Windows, Mac'], 4, 'ツール'),
+        (['draw.io', '作図 エディタ', 'Windows, Mac, Linux'], 5, 'ツール'),
+        (['Visual Studio Code', 'コード エディタ', 'Windows, Mac, Linux'], 6, 'ツール'),
+        (['Notepad++', 'テキスト エディタ', 'Windows'], 7, 'ツール'),
+        (['Slack', 'チャット', 'Windows, Mac'], 8, 'ツール'),
+    ]
+    snapshot = SheetSnapshot.from_rows(rows)
+    handler = make_handler()
+
+    matches = handler.bm25_search(snapshot, 'code editor エディタ linux', limit=3)
+    assert [match['text'] for match in matches] == ['Visual Studio Code', 'draw.io', 'Notepad++'], matches
+    assert matches[0]['type'] == '関連度' and matches[0]['position'] == '行6, 列1'
+    assert matches[0]['score'] > matches[1]['score'] > matches[2]['score']
+
+    # 検索タイプとして指定できる
+    result = handler.search_snapshot(snapshot, 'Web会議', ['bm25'], limit=3)
+    assert result['engines'] == ['bm25'] and result['matches'][0]['text'] == 'Zoom'
+    print("結果: OK")
+
+
+def test_pruning_matches_full_scan():
+    """
+    枝刈りした検索の上位の結果が、全ての行のスコアを計算した場合と一致することをテスト
+    """
+    print("=== 枝刈りのテスト ===")
+
+    rng = random.Random(42)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'editor', 'chat', 'mac', 'linux', 'windows', 'free']
+    rows = [([' '.join(rng.choice(words) for _ in range(rng.randint(1, 6)))], row_num, 'S') for row_num in range(4, 504)]
+    index = BM25Index.build(SheetSnapshot.from_rows(rows))
+
+    for query in ['editor mac', 'alpha beta gamma delta', 'free linux chat windows']:
+        top, _ = index.search(query, limit=5)
+
+        # 全ての行のスコアを計算
+        scores = {}
+        for token in set(tokenize(query)):
+            term_id = index.term_id(token)
+            for position in range(index.starts[term_id], index.starts[term_id + 1]):
+                row = index.rows[position]
+                scores[row] = scores.get(row, 0.0) + index.impacts[position]
+        expected = sorted(scores.values(), reverse=True)[:5]
+        assert [round(score, 4) for _, score in top] == [round(score, 4) for score in expected], query
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_tokenize()
+    test_ranking()
+    test_pruning_matches_full_scan()
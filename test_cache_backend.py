@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+キャッシュバックエンドのテストスクリプト（オフラインテスト）
+"""
+
+import os
+import tempfile
+import time
+
+from cache_backend import CacheBackend, InProcessCacheBackend, SQLiteCacheBackend
+
+
+def check_backend(cache):
+    assert cache.get('missing') is None
+
+    cache.set('key', b'value')
+    assert cache.get('key') == b'value'
+
+    cache.set_json('json', {'name': 'Zoom', 'rows': [4, 5]})
+    assert cache.get_json('json') == {'name': 'Zoom', 'rows': [4, 5]}
+
+    # 期限切れの値は返さない
+    cache.set('short', b'value', ttl=0.05)
+    time.sleep(0.06)
+    assert cache.get('short') is None
+
+    # add() は有効な値がない場合のみ保存する（期限切れの値は上書きできる）
+    assert cache.add('lease', b'replica-1', ttl=0.05)
+    assert not cache.add('lease', b'replica-2', ttl=0.05)
+    assert cache.get('lease') == b'replica-1'
+    time.sleep(0.06)
+    assert cache.add('lease', b'replica-2', ttl=0.05)
+
+    # compare_and_set() は現在の有効な値が一致する場合のみ保存する（リースの延長）
+    assert cache.compare_and_set('lease', b'replica-2', b'replica-2', ttl=60)
+    assert not cache.compare_and_set('lease', b'replica-1', b'replica-1', ttl=60)
+    assert cache.get('lease') == b'replica-2'
+    cache.set('expired', b'replica-1', ttl=0.05)
+    time.sleep(0.06)
+    assert not cache.compare_and_set('expired', b'replica-1', b'replica-1', ttl=60)
+    assert not cache.compare_and_set('missing', b'replica-1', b'replica-1')
+
+    cache.delete('key')
+    assert cache.get('key') is None
+
+
+def test_in_process_backend():
+    """
+    プロセス内キャッシュの保存・期限切れ・排他的な追加をテスト
+    """
+    print("=== プロセス内キャッシュのテスト ===")
+    check_backend(InProcessCacheBackend())
+
+    # 上限を超えた場合は最も長く参照されていない値から削除する
+    cache = InProcessCacheBackend(max_entries=3)
+    for key in ['search:a', 'search:b', 'search:c']:
+        cache.set(key, b'1', ttl=60)
+    assert cache.get('search:a') == b'1'
+    cache.set('search:d', b'1', ttl=60)
+    assert cache.get('search:b') is None and cache.get('search:a') == b'1'
+    assert len(cache) == 3
+
+    # 期限切れの値は参照されなくても書き込みの際にまとめて削除する
+    cache = InProcessCacheBackend(sweep_interval=0)
+    for number in range(100):
+        cache.set(f'negative:{number}', b'1', ttl=-1)
+    cache.set('research:zoom', b'1', ttl=60)
+    assert len(cache) == 1
+    print("結果: OK")
+
+
+def test_sqlite_backend():
+    """
+    SQLiteキャッシュが別の接続（別のレプリカ）と値を共有することをテスト
+    """
+    print("=== SQLiteキャッシュのテスト ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'cache.sqlite3')
+        cache = SQLiteCacheBackend(path)
+        check_backend(cache)
+
+        other = SQLiteCacheBackend(path)
+        cache.set_json('spreadsheet_id:test', 'abc')
+        assert other.get_json('spreadsheet_id:test') == 'abc'
+        assert cache.add('shared-lease', b'replica-1', ttl=60)
+        assert not other.add('shared-lease', b'replica-2', ttl=60)
+        assert not other.compare_and_set('shared-lease', b'replica-2', b'replica-2', ttl=60)
+        assert cache.compare_and_set('shared-lease', b'replica-1', b'replica-1', ttl=60)
+
+        # 期限切れの行は参照されなくても書き込みの際にまとめて削除する
+        sweeping = SQLiteCacheBackend(path, sweep_interval=0)
+        for number in range(100):
+            sweeping.set(f'negative:{number}', b'1', ttl=-1)
+        sweeping.set('research:zoom', b'1', ttl=60)
+        count = sweeping._connection().execute("SELECT COUNT(*) FROM cache WHERE key LIKE 'negative:%'").fetchone()[0]
+        assert count == 0
+
+        cache.close()
+        other.close()
+        sweeping.close()
+
+    print("結果: OK")
+
+
+def test_abstract_interface():
+    """
+    共通インターフェースのメソッドを実装しないバックエンドは作成できないことをテスト
+    """
+    print("=== 共通インターフェースのテスト ===")
+
+    class PartialBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    try:
+        PartialBackend()
+        assert False, "TypeError が送出されるべき"
+    except TypeError:
+        pass
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_in_process_backend()
+    test_sqlite_backend()
+    test_abstract_interface()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+サーキットブレーカーのテストスクリプト（オフラインテスト）
+"""
+
+import time
+
+import httplib2
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_upstream_failure
+from quota_governor import QuotaExceededError
+from test_quota_governor import FakeHttpError
+
+
+def test_open_and_recover():
+    """
+    連続失敗で開き、半開状態の試行が成功すると閉じることをテスト
+    """
+    print("=== サーキットブレーカーのテスト ===")
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, name='test')
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise FakeHttpError(503)
+
+    for _ in range(2):
+        try:
+            breaker.call(failing)
+        except FakeHttpError:
+            pass
+    assert breaker.state == OPEN
+
+    # 開いている間は上流を呼び出さずに即座に失敗する
+    started = time.monotonic()
+    try:
+        breaker.call(failing)
+        assert False, "CircuitOpenError が送出されるべき"
+    except CircuitOpenError:
+        pass
+    assert len(calls) == 2
+    assert time.monotonic() - started < 0.01
+
+    # 一定時間後に1件だけ試行し、成功すれば閉じる
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+    print("結果: OK")
+
+
+def test_client_errors_do_not_trip():
+    """
+    4xxエラー（権限不足など）では開かないことをテスト
+    """
+    print("=== 4xxエラーのテスト ===")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, name='test')
+    try:
+        breaker.call(lambda: (_ for _ in ()).throw(FakeHttpError(403)))
+    except FakeHttpError:
+        pass
+    assert breaker.state == CLOSED
+
+    # 半開状態での試行が失敗すると再び開く
+    breaker.reset_timeout = 0
+    try:
+        breaker.call(lambda: (_ for _ in ()).throw(ConnectionError("refused")))
+    except ConnectionError:
+        pass
+    assert breaker.state == HALF_OPEN
+    try:
+        breaker.call(lambda: (_ for _ in ()).throw(TimeoutError("timed out")))
+    except TimeoutError:
+        pass
+    breaker.reset_timeout = 60
+    assert breaker.state == OPEN
+    print("結果: OK")
+
+
+def test_failure_classification():
+    """
+    ローカルの流量制御によるクォータ超過は障害として数えず、名前解決の失敗は数えることをテスト
+    """
+    print("=== 障害の判定のテスト ===")
+
+    assert not is_upstream_failure(QuotaExceededError("リクエスト期限までにクォータを確保できませんでした"))
+    try:
+        raise QuotaExceededError("リトライ上限に達しました") from FakeHttpError(503)
+    except QuotaExceededError as e:
+        assert is_upstream_failure(e)
+    try:
+        raise QuotaExceededError("リトライ上限に達しました") from FakeHttpError(403)
+    except QuotaExceededError as e:
+        assert not is_upstream_failure(e)
+    assert is_upstream_failure(httplib2.ServerNotFoundError("Unable to find the server at sheets.googleapis.com"))
+    assert not is_upstream_failure(httplib2.RelativeURIError("relative URI"))
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_open_and_recover()
+    test_client_errors_do_not_trip()
+    test_failure_classification()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+列のフィルター付き検索のテストスクリプト（オフラインテスト）
+"""
+
+import random
+
+from column_filter import FilterIndex, _bitmap, filter_search, iter_rows, parse_query
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import SnapshotIndex
+
+# 列の並び: A 名前, B カテゴリ, C ダウンロード, D プラットフォーム, E 備考, F Slack, G 商用利用
+ROWS = [
+    (['draw.io', '作図', '', 'Windows, macOS, Linux', '承認済み', '', '可'], 4, 'ツール'),
+    (['Visio', '作図', '', 'Windows', '承認済み', '', '不可'], 5, 'ツール'),
+    (['OmniGraffle', '作図', '', 'macOS', '承認待ち', '', '有料'], 6, 'ツール'),
+    (['Visual Studio Code', 'エディタ', '', 'Windows, Mac, Linux', '承認済み', '', 'Yes'], 7, 'ツール'),
+    (['Sublime Text', 'エディタ', '', 'Windows, Mac', '承認済み', '', 'No (license required)'], 8, 'ツール'),
+]
+
+
+def build():
+    snapshot = SheetSnapshot.from_rows(ROWS)
+    index = SnapshotIndex.build(snapshot)
+    return snapshot, FilterIndex.build(snapshot, index)
+
+
+def test_parse_query():
+    """
+    「フィルター名:値」の語をフィルターとして取り出し、それ以外を検索テキストとすることをテスト
+    """
+    print("=== クエリのパースのテスト ===")
+
+    assert parse_query('platform:Mac commercial:yes editor') == ('editor', [('platform', 'Mac'), ('commercial', 'yes')])
+    assert parse_query('OS：mac 商用:はい') == ('', [('platform', 'mac'), ('commercial', 'はい')])
+    # フィルター名でない語はそのまま検索テキストに含める
+    assert parse_query('https://example.com Zoom') == ('https://example.com Zoom', [])
+    print("結果: OK")
+
+
+def test_filters():
+    """
+    フィルターの組み合わせ（異なる列はAND、同じ列はOR）と yes/no の表記ゆれをテスト
+    """
+    print("=== フィルターのテスト ===")
+
+    snapshot, filter_index = build()
+
+    def names(query):
+        search_text, filters = parse_query(query)
+        result = filter_search(snapshot, filter_index, filters, search_text)
+        return [match['text'] for match in result['matches']]
+
+    # 'mac' は 'macOS' にも一致する
+    assert names('platform:mac') == ['draw.io', 'OmniGraffle', 'Visual Studio Code', 'Sublime Text']
+    # 「可」は一致し、「不可」「有料」「No」は一致しない
+    assert names('commercial:yes') == ['draw.io', 'Visual Studio Code']
+    assert names('commercial:no') == ['Visio', 'OmniGraffle', 'Sublime Text']
+    assert names('category:作図 platform:mac commercial:yes status:承認済み') == ['draw.io']
+    assert names('platform:linux platform:macos category:作図') == ['draw.io', 'OmniGraffle']
+
+    # 絞り込んだ行のみ検索テキストと比較する
+    assert names('platform:mac visual') == ['Visual Studio Code']
+    assert names('platform:windows visio') == ['Visio']
+    assert names('platform:linux visio') == []
+
+    result = filter_search(snapshot, filter_index, [('commercial', 'yes')])
+    assert result['matches'][0]['row_data'][3] == 'Windows, macOS, Linux'
+    assert result['matches'][0]['position'] == '行4, 列1'
+    print("結果: OK")
+
+
+def test_row_id_columns():
+    """
+    値の種類が多い列はビットマップを保持せず、検索時に行インデックスから作成しても同じ結果になることをテスト
+    """
+    print("=== 行インデックスの列のテスト ===")
+
+    snapshot = SheetSnapshot.from_rows(ROWS)
+    index = SnapshotIndex.build(snapshot)
+    bitmaps = FilterIndex.build(snapshot, index)
+    row_ids = FilterIndex.build(snapshot, index, max_bitmap_values=2)
+
+    # カテゴリ・備考（2種類）はビットマップを保持し、プラットフォーム・商用利用（4-5種類）は保持しない
+    assert all(isinstance(row_ids.columns[column][1], dict) for column in (1, 4))
+    assert not any(isinstance(row_ids.columns[column][1], dict) for column in (3, 6))
+
+    for query in ('platform:mac', 'commercial:no', 'status:承認待ち', 'category:作図 platform:windows', 'platform:beos'):
+        _, filters = parse_query(query)
+        assert row_ids.evaluate(filters) == bitmaps.evaluate(filters)
+    print("結果: OK")
+
+
+def test_iter_rows():
+    """
+    ビットマップの1のビットを昇順に列挙することをテスト（大きなビットマップでも行数に比例する時間で）
+    """
+    print("=== ビットマップの列挙のテスト ===")
+
+    assert list(iter_rows(0)) == []
+    assert list(iter_rows(_bitmap([0, 7, 8, 63, 64], 100))) == [0, 7, 8, 63, 64]
+    rows = sorted(random.Random(7).sample(range(100000), 50000))
+    assert list(iter_rows(_bitmap(rows, 100000))) == rows
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_parse_query()
+    test_filters()
+    test_row_id_columns()
+    test_iter_rows()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+複数スプレッドシートの横断検索のテストスクリプト（オフラインテスト）
+"""
+
+import os
+import time
+
+from federated_search import FederatedSearch
+from spreadsheet_sources import DEFAULT_SPREADSHEET, load_sources
+
+
+class FakeRefresher:
+    def __init__(self, matches, delay=0.0, stale=False):
+        """
+        固定の検索結果を返すスナップショット更新（delay 秒かけて応答する）
+        """
+        self.matches = matches
+        self.delay = delay
+        self.stale = stale
+        self.stop_after = None
+
+    def search(self, search_text, search_types, limit=10, filters=None, stop_after=None):
+        self.stop_after = stop_after
+        time.sleep(self.delay)
+        return {'found': bool(self.matches), 'message': '', 'matches': self.matches, 'stale': self.stale}
+
+    def stop(self):
+        pass
+
+
+def make_match(text, score):
+    return {'type': 'partial', 'text': text, 'position': '行4, 列1', 'sheet': 'OK', 'row': 4, 'score': score}
+
+
+def test_load_sources():
+    """
+    環境変数からソースの一覧を読み込むことをテスト
+    """
+    print("=== ソース設定のテスト ===")
+
+    original = os.environ.pop("TARGET_SPREADSHEETS", None)
+    try:
+        assert load_sources() == [{'name': DEFAULT_SPREADSHEET, 'label': DEFAULT_SPREADSHEET}]
+
+        os.environ["TARGET_SPREADSHEETS"] = '["Global list", {"name": "JP list", "label": "日本"}]'
+        assert load_sources() == [
+            {'name': 'Global list', 'label': 'Global list'},
+            {'name': 'JP list', 'label': '日本'},
+        ]
+    finally:
+        os.environ.pop("TARGET_SPREADSHEETS", None)
+        if original is not None:
+            os.environ["TARGET_SPREADSHEETS"] = original
+    print("結果: OK")
+
+
+def test_parallel_merge_within_budget():
+    """
+    全ソースを並列に検索し、期限内に応答したソースの結果を出典付きで統合することをテスト
+    """
+    print("=== 横断検索のテスト ===")
+
+    sources = [
+        {'name': 'global', 'label': 'Global'},
+        {'name': 'jp', 'label': 'Japan'},
+        {'name': 'dev', 'label': 'Dev'},
+        {'name': 'slow', 'label': 'Slow'},
+    ]
+    refreshers = {
+        'global': FakeRefresher([make_match('Zoom', 80)], delay=0.1),
+        'jp': FakeRefresher([make_match('Zoom Workplace', 90)], delay=0.1),
+        'dev': FakeRefresher([], delay=0.1),
+        'slow': FakeRefresher([make_match('Zoom', 100)], delay=1.0),
+    }
+    federated = FederatedSearch(sources, refreshers, budget=0.5)
+
+    result = federated.search('zoom', ['partial'], limit=30, stop_after=3)
+    federated.stop()
+
+    # 各ソースの時間は合計されず、期限を過ぎたソースは結果に含まれない
+    assert result['elapsed'] < 0.8
+    assert [(match['text'], match['source']) for match in result['matches']] == [('Zoom Workplace', 'Japan'), ('Zoom', 'Global')]
+    assert result['found'] and result['incomplete']
+    assert result['failed_sources'] == ['Slow']
+    # 早期終了の件数は各ソースの検索に渡す
+    assert all(refresher.stop_after == 3 for refresher in refreshers.values())
+    print(f"結果: {len(result['matches'])}件（{result['elapsed']:.2f}秒）")
+
+
+if __name__ == "__main__":
+    test_load_sources()
+    test_parallel_merge_within_budget()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+スレッドごとのHTTPクライアントのトランスポートプールのテストスクリプト（通信を行わないオフラインテスト）
+"""
+
+import gc
+import threading
+
+from google.oauth2.credentials import Credentials
+
+from http_transport import HttpTransportPool
+
+
+def make_pool():
+    return HttpTransportPool(Credentials(token='test-token'), timeout=5)
+
+
+def test_per_thread_reuse():
+    """
+    同じスレッドではHTTPクライアントを再利用し、別のスレッドでは専用のものを作成することをテスト
+    """
+    print("=== スレッドごとの再利用のテスト ===")
+
+    pool = make_pool()
+    http = pool.get_http()
+    assert pool.get_http() is http
+
+    others = []
+    thread = threading.Thread(target=lambda: others.extend([pool.get_http(), pool.get_http()]))
+    thread.start()
+    thread.join()
+    assert others[0] is others[1] and others[0] is not http
+    del others
+
+    # 終了したスレッドのHTTPクライアントは保持し続けない
+    gc.collect()
+    assert list(pool._all_http) == [http]
+
+    pool.close()
+    assert len(pool._all_http) == 0
+    print("結果: OK")
+
+
+def test_gzip_header():
+    """
+    リクエストがgzip圧縮のレスポンスを要求し、作成したスレッドのHTTPクライアントを使うことをテスト
+    """
+    print("=== gzipヘッダーのテスト ===")
+
+    pool = make_pool()
+    request = pool.request_builder(None, lambda response, content: content, 'https://example.com/v4', method='GET')
+    assert request.headers['accept-encoding'] == 'gzip, deflate'
+    assert request.http is pool.get_http()
+
+    # 指定済みのヘッダーは上書きしない
+    request = pool.request_builder(None, lambda response, content: content, 'https://example.com/v4',
+                                   headers={'accept-encoding': 'identity'})
+    assert request.headers['accept-encoding'] == 'identity'
+    pool.close()
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_per_thread_reuse()
+    test_gzip_header()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+ソフトウェア名の入力補完のテストスクリプト（オフラインテスト）
+"""
+
+import random
+import time
+
+from federated_search import FederatedSearch
+from name_completer import NameCompleter
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import SnapshotIndex
+
+ROWS = [
+    (['Visual Studio Code'], 4, 'ツール'),
+    (['VS Code Insiders'], 5, 'ツール'),
+    (['Visio'], 6, 'ツール'),
+    (['draw.io'], 7, 'ツール'),
+    (['Microsoft Visio Viewer'], 8, 'ツール'),
+    (['Ｖｉｍ'], 9, 'ツール'),
+]
+
+
+class FakeRefresher:
+    def __init__(self, rows):
+        snapshot = SheetSnapshot.from_rows(rows)
+        self.snapshot = snapshot
+        self.index = SnapshotIndex.build(snapshot)
+        self.completer = NameCompleter.build(snapshot.column_pool(0))
+
+    def complete(self, text, limit=10):
+        return self.completer.complete(self.snapshot, self.index, text, limit)
+
+    def stop(self):
+        pass
+
+
+def test_complete():
+    """
+    正規化した名前の前方一致を先に、名前の途中に含む名前を後に返すことをテスト
+    """
+    print("=== 入力補完のテスト ===")
+
+    refresher = FakeRefresher(ROWS)
+
+    # 大文字小文字・空白・全角を無視した、名前と略称の前方一致（名前・略称の順）
+    assert refresher.complete('vis') == ['Visio', 'Visual Studio Code', 'Microsoft Visio Viewer']
+    assert refresher.complete('VS co') == ['Visual Studio Code', 'VS Code Insiders']
+    assert refresher.complete('vim') == ['Ｖｉｍ']
+    # 1文字の入力は前方一致のみ
+    assert refresher.complete('d') == ['draw.io']
+    assert refresher.complete('visio', limit=1) == ['Visio']
+    assert refresher.complete('') == []
+
+    # 複数のソースにある名前は1件にまとめ、前方一致の名前を先にする
+    federated = FederatedSearch(
+        [{'name': 'A', 'label': 'A'}, {'name': 'B', 'label': 'B'}],
+        {'A': FakeRefresher(ROWS), 'B': FakeRefresher([(['Visio'], 4, 'S'), (['Visionary'], 5, 'S')])}
+    )
+    try:
+        assert federated.complete('visio') == ['Visio', 'Visionary', 'Microsoft Visio Viewer']
+    finally:
+        federated.stop()
+    print("結果: OK")
+
+
+def test_latency():
+    """
+    10万件のソフトウェア名で、1回の入力補完が数ミリ秒で終わることをテスト
+    """
+    print("=== 10万件の入力補完の時間のテスト ===")
+
+    rng = random.Random(3)
+    syllables = ['zo', 'om', 'sla', 'ck', 'vis', 'ual', 'co', 'de', 'dra', 'wi', 'no', 'te', 'pad', 'gim', 'pho', 'to']
+    rows = [([''.join(rng.choice(syllables) for _ in range(rng.randint(2, 5))) + f' {i}'], i + 4, 'S') for i in range(100000)]
+    refresher = FakeRefresher(rows)
+
+    elapsed = []
+    for text in ['z', 'zo', 'zoom', 'visual co', 'padgim', 'ual', 'tepho']:
+        started = time.perf_counter()
+        names = refresher.complete(text, limit=20)
+        elapsed.append(time.perf_counter() - started)
+        assert names, text
+    assert max(elapsed) < 0.05, elapsed
+    print(f"結果: 最大 {max(elapsed) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_complete()
+    test_latency()
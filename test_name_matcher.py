@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+表記ゆれ・略称による「もしかして」検索のテストスクリプト（オフラインテスト）
+"""
+
+from name_matcher import AliasIndex, name_aliases, normalize_name, suggestion_matches
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import SnapshotIndex
+
+
+def test_normalize():
+    """
+    全角・大文字小文字・記号の正規化と略称の生成をテスト
+    """
+    print("=== 正規化のテスト ===")
+
+    assert normalize_name('ＺＯＯＭ') == 'zoom'
+    assert normalize_name('VS Code') == 'vscode'
+    assert normalize_name('Notepad++') == 'notepad'
+    assert name_aliases('Visual Studio Code') == {'visualstudiocode', 'vscode', 'vsc'}
+    print("結果: OK")
+
+
+def test_suggestions():
+    """
+    誤字・表記ゆれ・略称で近いソフトウェア名を提示し、無関係な名前は提示しないことをテスト
+    """
+    print("=== もしかして検索のテスト ===")
+
+    rows = [
+        (['Zoom'], 4, 'OK'),
+        (['Visual Studio Code'], 5, 'OK'),
+        (['Slack'], 6, 'OK'),
+        (['Google Chrome'], 7, 'OK'),
+    ]
+    snapshot = SheetSnapshot.from_rows(rows)
+    index = SnapshotIndex.build(snapshot)
+    alias_index = AliasIndex.build(snapshot.column_pool(0))
+
+    for text, expected in [('Zooom', 'Zoom'), ('VS code', 'Visual Studio Code'), ('ｓｌａｃｋ', 'Slack'), ('google-chrome', 'Google Chrome')]:
+        matches = suggestion_matches(snapshot, index, alias_index, text)
+        assert matches and matches[0]['text'] == expected, (text, matches)
+        print(f"{text} → {matches[0]['text']}（{matches[0]['score']}）")
+
+    assert suggestion_matches(snapshot, index, alias_index, 'Photoshop') == []
+    assert suggestion_matches(snapshot, index, alias_index, 'Visual Studio Code')[0]['position'] == '行5, 列1'
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_normalize()
+    test_suggestions()
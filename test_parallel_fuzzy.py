@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+並列のあいまい検索のテストスクリプト（オフラインテスト）
+"""
+
+import random
+
+from fuzzywuzzy import process
+
+import google_sheets_handler_advanced
+from google_sheets_handler_advanced import GoogleSheetsHandlerAdvanced
+from parallel_fuzzy import ParallelFuzzyScorer
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import DEFAULT_FUZZY_CANDIDATES, SnapshotIndex
+
+
+def make_snapshot(count=3000):
+    rng = random.Random(7)
+    syllables = ['zo', 'om', 'sla', 'ck', 'vis', 'ual', 'co', 'de', 'dra', 'wi', 'no', 'te', 'pad', 'gim', 'pho', 'to']
+    rows = [
+        ([''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) + f' {i % 50}', f'カテゴリ{i % 7}'], i + 4, 'S')
+        for i in range(count)
+    ]
+    return SheetSnapshot.from_rows(rows)
+
+
+def test_matches_serial_extract():
+    """
+    ワーカープロセスで分割して比較した結果が、単一スレッドの process.extract と一致することをテスト
+    """
+    print("=== 並列のあいまい検索のテスト ===")
+
+    snapshot = make_snapshot()
+    scorer = ParallelFuzzyScorer(workers=2, threshold=100)
+    try:
+        assert scorer.enabled(3000) and not scorer.enabled(99)
+        assert not ParallelFuzzyScorer(workers=1, threshold=0).enabled(3000)
+
+        pool = snapshot.column_pool(0)
+        candidates = [(0, string_id) for string_id in range(1, len(pool))]
+        texts = [pool[string_id] for _, string_id in candidates]
+        for query in ['zoom', 'visual code', 'drawio 3']:
+            expected = process.extract(query, texts, limit=10)
+            actual = scorer.extract(snapshot, query, candidates, limit=10)
+            assert [score for _, score in actual] == [score for _, score in expected], query
+            assert {text for text, _ in actual} <= set(texts)
+
+        # 2列目の候補もテーブル内の番号から元のテキストに戻せる
+        category_pool = snapshot.column_pool(1)
+        actual = scorer.extract(snapshot, 'カテゴリ3', [(1, string_id) for string_id in range(1, len(category_pool))], limit=1)
+        assert actual[0] == ('カテゴリ3', 100), actual
+
+        # 同じスナップショットでは共有メモリのテーブルを再利用する
+        assert len(scorer._tables) == 1
+        # スナップショットが変わった場合は作り直す
+        snapshot.append_rows([(['new tool', 'カテゴリ9'], 9999, 'S')])
+        actual = scorer.extract(snapshot, 'new tool', [(0, len(pool) - 1)], limit=1)
+        assert actual == [('new tool', 100)], actual
+        assert len(scorer._tables) == 2
+    finally:
+        scorer.shutdown()
+    print("結果: OK")
+
+
+class RecordingScorer(ParallelFuzzyScorer):
+    def extract(self, snapshot, search_text, candidates, limit=10):
+        self.candidate_counts.append(len(candidates))
+        return super().extract(snapshot, search_text, candidates, limit)
+
+
+def test_indexed_search_uses_workers():
+    """
+    索引を使うあいまい検索でも、並列化できる場合は候補数の上限を増やしてワーカーで比較することをテスト
+    """
+    print("=== 索引を使うあいまい検索の並列化のテスト ===")
+
+    snapshot = make_snapshot()
+    index = SnapshotIndex.build(snapshot)
+    handler = GoogleSheetsHandlerAdvanced.__new__(GoogleSheetsHandlerAdvanced)
+    scorer = RecordingScorer(workers=2, threshold=2 * DEFAULT_FUZZY_CANDIDATES)
+    scorer.candidate_counts = []
+    original = google_sheets_handler_advanced.get_fuzzy_scorer
+    google_sheets_handler_advanced.get_fuzzy_scorer = lambda: scorer
+    try:
+        parallel = handler.fuzzy_search(snapshot, 'visual code', index=index, columns=[0])
+    finally:
+        google_sheets_handler_advanced.get_fuzzy_scorer = original
+        scorer.shutdown()
+
+    # 単一スレッドの上限（列ごとに500件）を超える候補がワーカーで比較される
+    assert scorer.candidate_counts and scorer.candidate_counts[0] > DEFAULT_FUZZY_CANDIDATES
+    serial = handler.fuzzy_search(snapshot, 'visual code', columns=[0])
+    assert [match['score'] for match in parallel] == [match['score'] for match in serial]
+    print(f"比較した候補数: {scorer.candidate_counts[0]}")
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_matches_serial_extract()
+    test_indexed_search_uses_workers()
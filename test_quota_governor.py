@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+クォータ制御（トークンバケット・リトライ）のテストスクリプト
+"""
+
+import time
+
+from quota_governor import QuotaExceededError, QuotaGovernor, TokenBucket
+
+
+class FakeResponse(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.resp = FakeResponse(status, headers)
+
+
+def test_token_bucket():
+    """
+    トークンバケットの取得と期限切れをテスト
+    """
+    print("=== トークンバケットのテスト ===")
+
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    # 1秒に1トークン補充されるため、0.1秒の期限では取得できない
+    assert not bucket.acquire(deadline=time.monotonic() + 0.1)
+    print("結果: OK")
+
+
+def test_retry_on_rate_limit():
+    """
+    429エラー時にリトライして成功することをテスト
+    """
+    print("=== 429リトライのテスト ===")
+
+    governor = QuotaGovernor(requests_per_minute=6000, base_delay=0.01, max_delay=0.02)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeHttpError(429)
+        return {'ok': True}
+
+    assert governor.call(flaky) == {'ok': True}
+    assert len(calls) == 3
+    print(f"結果: {len(calls)}回目で成功")
+
+
+def test_give_up_cleanly():
+    """
+    リトライ上限・期限・リトライ対象外エラーの扱いをテスト
+    """
+    print("=== リトライ打ち切りのテスト ===")
+
+    governor = QuotaGovernor(requests_per_minute=6000, max_retries=2, base_delay=0.01, max_delay=0.01)
+
+    def always_unavailable():
+        raise FakeHttpError(503)
+
+    try:
+        governor.call(always_unavailable)
+        assert False, "QuotaExceededErrorが発生しませんでした"
+    except QuotaExceededError as e:
+        print(f"リトライ上限: {e}")
+
+    # Retry-Afterが期限を超える場合は待たずに打ち切る
+    slow_governor = QuotaGovernor(requests_per_minute=6000, max_delay=60)
+
+    def rate_limited():
+        raise FakeHttpError(429, {'retry-after': '30'})
+
+    start = time.monotonic()
+    try:
+        slow_governor.call(rate_limited, timeout=0.5)
+        assert False, "QuotaExceededErrorが発生しませんでした"
+    except QuotaExceededError as e:
+        print(f"期限切れ: {e}")
+    assert time.monotonic() - start < 0.5
+
+    # 404などはリトライせずにそのまま送出する
+    def not_found():
+        raise FakeHttpError(404)
+
+    try:
+        governor.call(not_found)
+        assert False, "FakeHttpErrorが発生しませんでした"
+    except FakeHttpError:
+        print("リトライ対象外: OK")
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_retry_on_rate_limit()
+    test_give_up_cleanly()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+検索結果の否定キャッシュと、実行中のソフトウェア調査の共有のテストスクリプト（オフラインテスト）
+"""
+
+import threading
+
+from cache_backend import InProcessCacheBackend
+from research_jobs import NegativeCache, ResearchRegistry
+
+
+def test_negative_cache():
+    """
+    スナップショットのバージョンが変わると否定キャッシュを参照しないことをテスト
+    """
+    print("=== 否定キャッシュのテスト ===")
+
+    negative_cache = NegativeCache(InProcessCacheBackend(), ttl=60)
+    negative_cache.add('NewTool', [3, 7])
+    assert negative_cache.contains('newtool', [3, 7])
+    assert negative_cache.contains('ＮｅｗＴｏｏｌ', [3, 7])
+    assert not negative_cache.contains('NewTool', [4, 7])
+
+    # スナップショットがないソースを含む場合は記録しない
+    negative_cache.add('Other', [3, None])
+    assert not negative_cache.contains('Other', [3, None])
+
+    # 正規化すると空になる記号のみのテキストは、互いに別のキーにする
+    negative_cache.add('???', [3, 7])
+    assert negative_cache.contains(' ??? ', [3, 7])
+    assert not negative_cache.contains('!!!', [3, 7])
+    print("結果: OK")
+
+
+def test_in_flight_research_is_shared():
+    """
+    同じソフトウェアの調査が実行中の場合、新しく調査せずに結果を共有することをテスト
+    """
+    print("=== 調査の共有のテスト ===")
+
+    registry = ResearchRegistry(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def research():
+        calls.append(1)
+        release.wait(5)
+        return {'research': {'category': 'Web会議'}}
+
+    first, first_started = registry.submit('NewTool', research)
+    results = []
+    for name in ['newtool', 'New Tool', 'ＮｅｗＴｏｏｌ']:
+        future, started = registry.submit(name, research)
+        assert not started and future is first
+        results.append(future)
+
+    release.set()
+    assert first_started
+    assert all(future.result(5) == {'research': {'category': 'Web会議'}} for future in results)
+    assert len(calls) == 1
+
+    # 完了後は登録簿から外れる
+    first.result(5)
+    registry.shutdown()
+    assert registry.in_flight() == 0
+    print(f"結果: 4件の依頼に対して調査{len(calls)}回")
+
+
+def test_research_shared_across_processes():
+    """
+    共有キャッシュの「調査中」の印により、別のプロセスで調査中のソフトウェアは完了を待ってから
+    調査結果のキャッシュを参照することをテスト（2つの登録簿で2つのプロセスを模擬）
+    """
+    print("=== プロセス間の調査の共有のテスト ===")
+
+    cache = InProcessCacheBackend()
+    first_registry = ResearchRegistry(max_workers=1, cache=cache, poll_interval=0.01)
+    second_registry = ResearchRegistry(max_workers=1, cache=cache, poll_interval=0.01)
+    release = threading.Event()
+    calls = []
+
+    def research():
+        cached = cache.get_json('research:newtool')
+        if cached is not None:
+            return cached
+        calls.append(1)
+        release.wait(5)
+        result = {'research': {'category': 'Web会議'}}
+        cache.set_json('research:newtool', result)
+        return result
+
+    first, first_started = first_registry.submit('NewTool', research)
+    second, second_started = second_registry.submit('newtool', research)
+    assert first_started and not second_started
+    assert not second.done()
+
+    release.set()
+    assert first.result(5) == second.result(5) == {'research': {'category': 'Web会議'}}
+    assert len(calls) == 1
+    # 完了後は印が解放され、次の調査は新しく開始する
+    assert cache.get('research_in_flight:newtool') is None
+    assert second_registry.submit('NewTool', research)[1]
+    first_registry.shutdown()
+    second_registry.shutdown()
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_negative_cache()
+    test_in_flight_research_is_shared()
+    test_research_shared_across_processes()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+OpenAI APIの呼び出しのスケジューラーのテストスクリプト（オフラインテスト）
+"""
+
+import threading
+import time
+
+import openai
+
+from research_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, ResearchScheduler
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    """
+    OpenAI APIの429エラーを模した例外
+    """
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("Rate limit reached")
+        self.response = FakeResponse({'retry-after': str(retry_after)})
+
+
+class FakeServerError(openai.InternalServerError):
+    """
+    OpenAI APIの503エラーを模した例外
+    """
+    status_code = 503
+
+    def __init__(self, retry_after):
+        Exception.__init__(self, "Service unavailable")
+        self.response = FakeResponse({'retry-after': str(retry_after)})
+
+
+class FakeTimeoutError(openai.APITimeoutError):
+    """
+    OpenAI APIのタイムアウトを模した例外
+    """
+
+    def __init__(self):
+        Exception.__init__(self, "Request timed out")
+
+
+def test_interactive_runs_before_batch():
+    """
+    同時実行数の上限で待機中の呼び出しのうち、対話的な調査が一括調査より先に実行されることをテスト
+    """
+    print("=== 優先度のテスト ===")
+
+    scheduler = ResearchScheduler(max_concurrency=1, tokens_per_minute=100000)
+    release = threading.Event()
+    order = []
+
+    blocker = scheduler.submit(lambda: release.wait(5))
+    time.sleep(0.05)
+    futures = [scheduler.submit(lambda name=name: order.append(name), PRIORITY_BATCH) for name in ['batch1', 'batch2']]
+    futures.append(scheduler.submit(lambda: order.append('interactive'), PRIORITY_INTERACTIVE))
+
+    metrics = scheduler.metrics()
+    assert metrics['running'] == 1 and metrics['queued'] == 3
+    assert metrics['queued_by_priority'] == {PRIORITY_BATCH: 2, PRIORITY_INTERACTIVE: 1}
+
+    release.set()
+    blocker.result(5)
+    for future in futures:
+        future.result(5)
+    assert order == ['interactive', 'batch1', 'batch2'], order
+    assert scheduler.metrics()['completed'] == 4
+    scheduler.shutdown()
+    print(f"実行順: {order}")
+
+
+def test_rate_limit_retry_after():
+    """
+    429の場合にRetry-Afterの秒数だけ待ってからリトライし、成功した結果を返すことをテスト
+    """
+    print("=== 429時のリトライのテスト ===")
+
+    scheduler = ResearchScheduler(max_concurrency=2, tokens_per_minute=100000)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FakeRateLimitError(retry_after=0.2)
+        return 'ok'
+
+    assert scheduler.call(flaky) == 'ok'
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.2
+
+    metrics = scheduler.metrics()
+    assert metrics['retries'] == 1 and metrics['rate_limited'] == 1
+    assert metrics['completed'] == 1 and metrics['failed'] == 0
+
+    # リトライで回復しないエラーはそのまま返す
+    try:
+        scheduler.call(lambda: 1 / 0)
+        assert False
+    except ZeroDivisionError:
+        pass
+    assert scheduler.metrics()['failed'] == 1
+    scheduler.shutdown()
+    print(f"結果: {len(attempts)}回目で成功")
+
+
+def test_token_budget():
+    """
+    1分あたりのトークン数を超える呼び出しは、期限までに開始できなければエラーになることをテスト
+    """
+    print("=== トークン数の上限のテスト ===")
+
+    scheduler = ResearchScheduler(max_concurrency=2, tokens_per_minute=1000)
+    assert scheduler.call(lambda: 'first', tokens=1000) == 'first'
+    try:
+        scheduler.call(lambda: 'second', tokens=1000, timeout=0.1)
+        assert False
+    except Exception as e:
+        assert type(e).__name__ == 'ResearchQueueTimeout'
+    scheduler.shutdown()
+    print("結果: OK")
+
+
+def test_hedged_call():
+    """
+    実行時間がパーセンタイルを超えた呼び出しにヘッジを追加し、先に返った結果を使うことをテスト
+    """
+    print("=== ヘッジのテスト ===")
+
+    scheduler = ResearchScheduler(max_concurrency=2, tokens_per_minute=100000, hedge_percentile=95, hedge_max_ratio=0.5)
+    for _ in range(20):
+        scheduler.latency.record(0.05)
+
+    # 1回目の呼び出しだけが止まる（遅いリクエスト）
+    calls = []
+    stalled = threading.Event()
+
+    def research():
+        calls.append(1)
+        if len(calls) == 1:
+            stalled.wait(5)
+            return 'slow'
+        return 'fast'
+
+    started = time.monotonic()
+    assert scheduler.hedged_call(research, deadline=time.monotonic() + 5) == 'fast'
+    elapsed = time.monotonic() - started
+    assert elapsed < 1.0, elapsed
+    metrics = scheduler.metrics()
+    assert metrics['hedges'] == 1 and metrics['hedge_wins'] == 1
+
+    # 期限を超えた場合はエラー
+    stalled.set()
+    calls.clear()
+    try:
+        scheduler.hedged_call(lambda: time.sleep(0.5), deadline=time.monotonic() + 0.1)
+        assert False
+    except Exception as e:
+        assert type(e).__name__ == 'ResearchQueueTimeout'
+    scheduler.shutdown()
+    print(f"結果: {elapsed:.2f}秒でヘッジの結果を使用")
+
+
+def test_backoff_releases_slot():
+    """
+    429以外のリトライの待機中は同時実行数の枠を使用せず、他の呼び出しを先に実行することをテスト
+    """
+    print("=== バックオフ中の枠の解放のテスト ===")
+
+    scheduler = ResearchScheduler(max_concurrency=1, tokens_per_minute=100000)
+    order = []
+
+    def flaky():
+        order.append('flaky')
+        if order.count('flaky') == 1:
+            raise FakeServerError(retry_after=0.3)
+        return 'ok'
+
+    future = scheduler.submit(flaky)
+    time.sleep(0.05)
+    assert scheduler.metrics()['backing_off'] == 1
+    assert scheduler.call(lambda: order.append('other'), timeout=0.2) is None
+    assert future.result(5) == 'ok'
+    assert order == ['flaky', 'other', 'flaky'], order
+    assert scheduler.metrics()['rate_limited'] == 0
+
+    # タイムアウトはリトライし、回復しないエラーの判定は型で行う
+    attempts = []
+
+    def timeout_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FakeTimeoutError()
+        return 'ok'
+
+    scheduler.base_delay = 0.01
+    assert scheduler.call(timeout_once) == 'ok' and len(attempts) == 2
+    scheduler.shutdown()
+    print(f"実行順: {order}")
+
+
+if __name__ == "__main__":
+    test_interactive_runs_before_batch()
+    test_rate_limit_retry_after()
+    test_token_budget()
+    test_hedged_call()
+    test_backoff_releases_slot()
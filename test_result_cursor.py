@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+検索結果のカーソル（ページ単位の表示）のテストスクリプト（オフラインテスト）
+"""
+
+import os
+import tempfile
+
+from cache_backend import SQLiteCacheBackend
+from result_cursor import ResultCursorStore, first_page
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_result(count):
+    matches = [{'type': '部分一致', 'text': f'Tool {i}', 'position': f'行{i + 4}, 列1', 'score': 90} for i in range(count)]
+    return {'found': True, 'message': '', 'matches': matches, 'stale': True, 'failed_sources': ['B']}
+
+
+def test_pages():
+    """
+    保存した検索結果をページ単位で切り出すことをテスト
+    """
+    print("=== ページのテスト ===")
+
+    store = ResultCursorStore(capacity=10, ttl=60)
+    cursor_id = store.put('tool', make_result(8))
+
+    page = store.page(cursor_id, 0, 3)
+    assert [match['text'] for match in page['matches']] == ['Tool 0', 'Tool 1', 'Tool 2']
+    assert (page['start'], page['total'], page['pages']) == (1, 8, 3)
+    assert page['stale'] and page['failed_sources'] == ['B'] and page['query'] == 'tool'
+
+    page = store.page(cursor_id, 2, 3)
+    assert [match['text'] for match in page['matches']] == ['Tool 6', 'Tool 7'] and page['start'] == 7
+    # 範囲外のページ番号は最後のページ
+    assert store.page(cursor_id, 5, 3)['page'] == 2
+
+    assert first_page('tool', make_result(2), 3)['pages'] == 1
+    assert store.page('unknown', 0, 3) is None
+    print("結果: OK")
+
+
+def test_expiry_and_eviction():
+    """
+    期限切れのカーソルと、上限を超えた場合の最も長く参照されていないカーソルが削除されることをテスト
+    """
+    print("=== 期限と削除のテスト ===")
+
+    clock = FakeClock()
+    store = ResultCursorStore(capacity=2, ttl=60, clock=clock)
+    first = store.put('a', make_result(4))
+    second = store.put('b', make_result(4))
+
+    # 参照すると期限が延び、LRUの順も更新される
+    clock.now = 50
+    assert store.page(first, 0, 3) is not None
+    third = store.put('c', make_result(4))
+    assert store.page(second, 0, 3) is None
+    assert len(store) == 2
+
+    clock.now = 105
+    assert store.page(first, 1, 3) is not None
+    clock.now = 200
+    assert store.page(first, 0, 3) is None and store.page(third, 0, 3) is None
+    assert len(store) == 0
+    print("結果: OK")
+
+
+def test_shared_cursor():
+    """
+    共有キャッシュに保存したカーソルを、別のプロセスのカーソルの保存先から参照できることをテスト
+    """
+    print("=== 共有キャッシュのカーソルのテスト ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'cache.sqlite3')
+        store = ResultCursorStore(ttl=60, cache=SQLiteCacheBackend(path))
+        other = ResultCursorStore(ttl=60, cache=SQLiteCacheBackend(path))
+
+        cursor_id = store.put('tool', make_result(8))
+        page = other.page(cursor_id, 1, 3)
+        assert [match['text'] for match in page['matches']] == ['Tool 3', 'Tool 4', 'Tool 5']
+        assert page['stale'] and page['failed_sources'] == ['B'] and page['query'] == 'tool'
+        assert other.page('unknown', 0, 3) is None
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_pages()
+    test_expiry_and_eviction()
+    test_shared_cursor()
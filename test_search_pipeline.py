@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+段階的な検索（完全一致 → 部分一致 → あいまい検索）のテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+from google_sheets_handler_advanced import GoogleSheetsHandlerAdvanced
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import SnapshotIndex
+
+
+def make_handler():
+    # 検索処理のみを使用するため、認証は行わない
+    return GoogleSheetsHandlerAdvanced.__new__(GoogleSheetsHandlerAdvanced)
+
+
+def test_early_exit():
+    """
+    表示件数の結果が揃った場合、コストの高い検索タイプを実行しないことをテスト
+    """
+    print("=== 段階的な検索のテスト ===")
+
+    rows = [
+        (['Zoom'], 4, 'OK'),
+        (['Zoom Workplace'], 5, 'OK'),
+        (['Zoom Rooms'], 6, 'OK'),
+        (['Slack'], 7, 'OK'),
+        (['zoom'], 4, 'NG'),
+    ]
+    snapshot = SheetSnapshot.from_rows(rows)
+    index = SnapshotIndex.build(snapshot)
+    handler = make_handler()
+
+    # 完全一致と部分一致で3件揃うため、あいまい検索は実行しない
+    result = handler.search_snapshot(snapshot, 'zoom', ['exact', 'partial', 'fuzzy'], index=index, limit=3)
+    assert result['engines'] == ['exact', 'partial']
+    assert len(result['matches']) == 3
+    assert all(match['score'] == 100 for match in result['matches'][:2])
+
+    # 同じセルは完全一致の結果のみ残る（重複しない）
+    positions = [(match['sheet'], match['row']) for match in result['matches']]
+    assert len(positions) == len(set(positions))
+
+    # 結果が少ない場合のみあいまい検索を実行する
+    result = handler.search_snapshot(snapshot, 'Slak', ['exact', 'partial', 'fuzzy'], index=index, limit=3)
+    assert result['engines'] == ['exact', 'partial', 'fuzzy']
+    assert result['matches'] and result['matches'][0]['text'] == 'Slack'
+
+    # 時間の上限を超えた場合は以降の検索を省略する
+    result = handler.search_snapshot(snapshot, 'zoom', ['exact', 'partial', 'fuzzy'], index=index, time_budget=0)
+    assert result['truncated'] and result['engines'] == []
+    print("結果: OK")
+
+
+def test_browsable_tail():
+    """
+    ページ送り用に多くの結果を返す場合も、表示件数（stop_after）の結果が揃った時点で以降の検索を省略することをテスト
+    """
+    print("=== ページ送り用の結果の早期終了のテスト ===")
+
+    rows = [(['Zoom'], 4, 'OK'), (['zoom'], 4, 'NG'), (['ZOOM'], 4, 'JP')]
+    rows += [([f'Zoom plugin {i}'], 5 + i, 'OK') for i in range(5)]
+    rows += [(['Zooom'], 20, 'OK')]
+    snapshot = SheetSnapshot.from_rows(rows)
+    index = SnapshotIndex.build(snapshot)
+    handler = make_handler()
+
+    # 完全一致で表示件数が揃うため、部分一致とあいまい検索は実行しない
+    result = handler.search_snapshot(snapshot, 'zoom', ['exact', 'partial', 'fuzzy'], index=index, limit=30, stop_after=3)
+    assert result['engines'] == ['exact']
+    assert len(result['matches']) == 3
+
+    # 完全一致の1件では揃わないため部分一致を実行し、その結果は表示件数を超えてもページ送り用に全て返す
+    result = handler.search_snapshot(snapshot, 'zoom plugin', ['exact', 'partial', 'fuzzy'], index=index, limit=30,
+                                     stop_after=3)
+    assert result['engines'] == ['exact', 'partial']
+    assert len(result['matches']) == 5
+
+    # stop_after を指定しない場合は limit 件揃うまであいまい検索も実行する
+    result = handler.search_snapshot(snapshot, 'zoom', ['exact', 'partial', 'fuzzy'], index=index, limit=30)
+    assert result['engines'] == ['exact', 'partial', 'fuzzy']
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_early_exit()
+    test_browsable_tail()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+列指向スナップショットのテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+from sheet_snapshot import SheetSnapshot
+
+
+def test_snapshot_rows():
+    """
+    スナップショットの行ビューと文字列プールの共有をテスト
+    """
+    print("=== スナップショットのテスト ===")
+
+    rows = [
+        (['Zoom', 'Web会議', '', 'Windows, Mac'], 4, 'OK'),
+        (['Slack', 'チャット', '', 'Windows, Mac'], 5, 'OK'),
+        (['BadTool'], 4, 'NG'),
+    ]
+    snapshot = SheetSnapshot.from_rows(rows)
+
+    assert len(snapshot) == 3
+    assert snapshot.to_rows() == rows
+    assert snapshot[1].values == ['Slack', 'チャット', '', 'Windows, Mac']
+    assert (snapshot[2].row_number, snapshot[2].sheet) == (4, 'NG')
+
+    # 同じ値のセルは文字列プール内の1つの文字列を共有する
+    platform_pool = snapshot.column_pool(3)
+    assert len(platform_pool) == 2
+    assert snapshot.rows_with_ids(3, {platform_pool.find('Windows, Mac')}) == [0, 1]
+
+    # 従来の (行データ, 行番号, シート名) タプルとして展開できる
+    for row_data, row_num, sheet_name in snapshot:
+        print(f"  {sheet_name} 行{row_num}: {row_data}")
+
+    # より多くの列を持つ行を追加しても既存の行は空文字で埋められる
+    added = snapshot.append_rows([(['Wide', '', '', '', '', '', 'Yes'], 6, 'OK')])
+    assert list(added) == [3]
+    assert snapshot.cell(0, 6) == ''
+    assert snapshot[3][6] == 'Yes'
+
+    # 複製は元のスナップショットに影響しない
+    copied = snapshot.copy(version=2)
+    copied.append_rows([(['Extra'], 7, 'OK')])
+    assert len(snapshot) == 4 and len(copied) == 5
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_snapshot_rows()
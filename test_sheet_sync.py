@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+スプレッドシート差分同期のテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+from sheet_sync import IncrementalSheetSync, mask_row
+
+
+class FakeSheetsHandler:
+    def __init__(self, sheets):
+        """
+        メモリ上のシート {シート名: 行のリスト（1行目から）} を返すハンドラー
+        """
+        self.sheets = sheets
+        self.requested_rows = 0
+
+    def get_sheet_properties(self, spreadsheet_id):
+        return [
+            {'title': title, 'row_count': len(rows) + 100, 'column_count': 8}
+            for title, rows in self.sheets.items()
+        ]
+
+    def get_row_blocks(self, spreadsheet_id, blocks):
+        results = []
+        for sheet_name, start_row, end_row, columns in blocks:
+            rows = self.sheets[sheet_name]
+            end = len(rows) if end_row is None else min(end_row, len(rows))
+            block = [
+                (list(rows[row_num - 1]), row_num, sheet_name)
+                for row_num in range(start_row, end + 1)
+                if rows[row_num - 1]
+            ]
+            self.requested_rows += end - start_row + 1 if end >= start_row else 0
+            results.append(block)
+        return results
+
+
+def make_sheet(names):
+    return [['header'], ['header'], ['header']] + [[name, 'category'] for name in names]
+
+
+def test_tail_sync():
+    """
+    末尾への追加は追加分のみ取得し、途中の編集は全件再取得することをテスト
+    """
+    print("=== 差分同期のテスト ===")
+
+    handler = FakeSheetsHandler({
+        'OK': make_sheet([f'Software{i}' for i in range(100)]),
+        'NG': make_sheet(['BadTool']),
+    })
+    sync = IncrementalSheetSync(handler, 'spreadsheet-id')
+
+    result = sync.full_reload()
+    assert result == {'mode': 'full', 'added': 101}
+    snapshot = sync.snapshot
+
+    # 変更なし
+    assert sync.refresh() == {'mode': 'unchanged', 'added': 0}
+
+    # 末尾に追加 → 追加分のみ取得し、同じスナップショットをその場で更新
+    handler.sheets['OK'].append(['NewTool', 'editor'])
+    handler.requested_rows = 0
+    result = sync.refresh()
+    assert result == {'mode': 'tail', 'added': 1}
+    assert sync.snapshot is snapshot
+    assert handler.requested_rows < 20
+    assert snapshot[-1].values == ['NewTool', 'editor']
+    assert (snapshot[-1].row_number, snapshot[-1].sheet) == (104, 'OK')
+    print(f"末尾追加: {result}, 取得行数: {handler.requested_rows}")
+
+    # 末尾より上の行を削除 → 全件再取得
+    del handler.sheets['OK'][3]
+    result = sync.refresh()
+    assert result['mode'] == 'full'
+    assert sync.snapshot is not snapshot
+    assert len(sync.snapshot) == 101
+    print(f"途中の削除: {result}")
+
+
+def test_apply_appended():
+    """
+    書き込んだ行を再取得せずに反映し、次回の差分同期で再取得しないことをテスト
+    """
+    print("=== 書き込んだ行の反映のテスト ===")
+
+    handler = FakeSheetsHandler({'OK': make_sheet(['Zoom'])})
+    sync = IncrementalSheetSync(handler, 'spreadsheet-id')
+    sync.full_reload()
+    version = sync.snapshot.version
+
+    # 最終行の直後でない場合は反映しない
+    assert not sync.apply_appended('OK', 10, [['Slack', 'chat']])
+
+    row = ['Slack', 'chat', 'https://slack.com', 'Windows']
+    handler.sheets['OK'].append(row)
+    assert sync.apply_appended('OK', 5, [row])
+    assert sync.snapshot.version == version + 1
+    assert sync.snapshot[-1].values == row and sync.snapshot[-1].row_number == 5
+    # 取得する列の指定に含まれない列は同期で取得した場合と同じく空にする
+    assert mask_row(row + ['', ''], ['A:B', 'D']) == ['Slack', 'chat', '', 'Windows']
+
+    handler.requested_rows = 0
+    assert sync.refresh() == {'mode': 'unchanged', 'added': 0}
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_tail_sync()
+    test_apply_appended()
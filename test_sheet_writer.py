@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+承認された行の書き込みキューのテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+import sheet_writer
+from cache_backend import InProcessCacheBackend
+from sheet_writer import SheetWriteQueue
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = FakeResponse(status)
+
+
+class FakeSheetsHandler:
+    def __init__(self):
+        """
+        メモリ上のシートに行を追加するハンドラー（次の書き込みで発生させる例外を指定できる）
+        """
+        self.rows = [['header'], ['header'], ['header'], ['Zoom', 'web meeting']]
+        self.append_calls = 0
+        self.fail_next = None
+        self.apply_before_failure = False
+
+    def find_spreadsheet_by_name(self, spreadsheet_name):
+        return 'spreadsheet-id'
+
+    def get_sheet_properties(self, spreadsheet_id):
+        return [{'title': 'OK', 'row_count': 1000, 'column_count': 8}]
+
+    def get_row_blocks(self, spreadsheet_id, blocks):
+        return [[(list(row), row_num, 'OK') for row_num, row in enumerate(self.rows, start=1)] for _ in blocks]
+
+    def append_rows(self, spreadsheet_id, sheet_name, rows):
+        self.append_calls += 1
+        first_row = len(self.rows) + 1
+        if self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            if self.apply_before_failure:
+                # 書き込みは反映されたが、応答が失われた場合
+                self.rows.extend(rows)
+            raise error
+        self.rows.extend(rows)
+        return first_row
+
+
+def make_queue(handler, written, cache=None):
+    return SheetWriteQueue(
+        lambda: handler, 'Software List', interval=60, cache=cache if cache is not None else InProcessCacheBackend(),
+        is_listed=lambda name: any(row[0].lower() == name.lower() for row in handler.rows[3:]),
+        on_written=lambda sheet_name, first_row, rows: written.append((sheet_name, first_row, len(rows)))
+    )
+
+
+def test_coalesced_flush():
+    """
+    まとめて承認した行が1回の書き込みで追加され、重複する行は追加されないことをテスト
+    """
+    print("=== まとめて書き込むテスト ===")
+
+    handler = FakeSheetsHandler()
+    written = []
+    queue = make_queue(handler, written)
+
+    for name in ['Slack', 'Notion', 'Figma']:
+        queue.propose([name, 'tool', '', '', '承認待ち', '', '', ''])
+    futures = [queue.approve(name) for name in ['Slack', 'Notion', 'Figma', ' slack ']]
+    assert futures[3] is futures[0]
+    assert queue.approve('Unknown') is None
+    assert queue.enqueue(['Zoom', 'web meeting']).result()['success'] is False
+
+    assert queue.flush() == 3
+    assert handler.append_calls == 1
+    assert [row[0] for row in handler.rows[4:]] == ['Slack', 'Notion', 'Figma']
+    assert [future.result()['row_num'] for future in futures[:3]] == [5, 6, 7]
+    assert written == [('OK', 5, 3)]
+
+    # 書き込み済みの行は再度承認しても追加しない
+    assert queue.approve('Slack') is None
+    assert queue.enqueue(['Slack', 'tool']).result()['success'] is False
+    assert queue.flush() == 0 and handler.append_calls == 1
+
+    # 長いソフトウェア名も、追加案のIDで承認できる
+    long_name = 'Enterprise Edition ' * 12
+    proposal_id = queue.propose([long_name, 'tool'])
+    assert len(proposal_id) < 20
+    assert queue.approve_proposal(proposal_id) is queue.approve(long_name)
+    assert queue.approve_proposal('unknown') is None
+    assert queue.flush() == 1 and handler.rows[-1][0] == long_name
+    print("結果: OK")
+
+
+def test_retry_after_ambiguous_failure():
+    """
+    反映されたか不明な失敗の後は、反映済みの行を除いて再実行することをテスト
+    """
+    print("=== 再実行のテスト ===")
+
+    handler = FakeSheetsHandler()
+    written = []
+    queue = make_queue(handler, written)
+
+    # 429は反映されていないため、確認せずにそのまま再実行する
+    future = queue.enqueue(['Slack', 'chat'])
+    handler.fail_next = FakeHttpError(429)
+    assert queue.flush() == 0 and queue.pending() == 1 and not future.done()
+    assert queue.flush() == 1
+    assert [row[0] for row in handler.rows[4:]] == ['Slack']
+
+    # 5xxで応答が失われた場合は、シートを確認して反映済みの行を再度追加しない
+    first = queue.enqueue(['Notion', 'notes'])
+    handler.fail_next = FakeHttpError(503)
+    handler.apply_before_failure = True
+    assert queue.flush() == 0
+    second = queue.enqueue(['Figma', 'design'])
+    handler.apply_before_failure = False
+    assert queue.flush() == 1
+    assert [row[0] for row in handler.rows[4:]] == ['Slack', 'Notion', 'Figma']
+    assert first.result()['success'] and first.result()['row_num'] is None
+    assert second.result()['row_num'] == 7
+    assert written == [('OK', 5, 1), ('OK', 7, 1)]
+    print("結果: OK")
+
+
+def test_drain_backlog():
+    """
+    1回の書き込みの上限を超える行は、次の間隔を待たずに続けて書き込むことをテスト
+    """
+    print("=== 書き込み待ちの行をまとめて書き込むテスト ===")
+
+    handler = FakeSheetsHandler()
+    written = []
+    queue = make_queue(handler, written)
+    original = sheet_writer.MAX_FLUSH_ROWS
+    sheet_writer.MAX_FLUSH_ROWS = 2
+    try:
+        futures = [queue.enqueue([f'Tool {i}', 'tool']) for i in range(5)]
+        queue._drain()
+        assert queue.pending() == 0 and handler.append_calls == 3
+        assert [future.result()['row_num'] for future in futures] == [5, 6, 7, 8, 9]
+
+        # 失敗した場合は次の間隔まで再実行しない
+        queue.enqueue(['Slack', 'chat'])
+        queue.enqueue(['Notion', 'notes'])
+        queue.enqueue(['Figma', 'design'])
+        handler.fail_next = FakeHttpError(429)
+        queue._drain()
+        assert queue.pending() == 3 and handler.append_calls == 4
+    finally:
+        sheet_writer.MAX_FLUSH_ROWS = original
+    print("結果: OK")
+
+
+def test_shared_queues():
+    """
+    複数のプロセスのキューが同じ行を承認しても、共有キャッシュのリースにより1回だけ追加されることをテスト
+    """
+    print("=== 複数のキューのテスト ===")
+
+    handler = FakeSheetsHandler()
+    cache = InProcessCacheBackend()
+    written = []
+    first = make_queue(handler, written, cache)
+    second = make_queue(handler, written, cache)
+    first.propose(['Slack', 'chat'])
+
+    # 同じ追加案を別々のワーカーで承認した場合
+    first_future = first.approve('Slack')
+    second_future = second.approve('Slack')
+    second.enqueue(['Notion', 'notes'])
+
+    # 他のキューが書き込み中の場合は書き込まずに次回に再実行する
+    assert cache.add('sheet_write:Software List:lease:flush', b'other', 60)
+    assert first.flush() == 0 and first.pending() == 1
+    cache.delete('sheet_write:Software List:lease:flush')
+
+    assert first.flush() == 1
+    assert second.flush() == 1
+    assert [row[0] for row in handler.rows[4:]] == ['Slack', 'Notion']
+    assert first_future.result()['row_num'] == 5
+    assert second_future.result() == {'success': True, 'message': "'Slack'は追加済みです", 'row_num': None}
+
+    # 他のキューの書き込みの結果が不明な場合も、シートを確認してから再実行する
+    first.enqueue(['Figma', 'design'])
+    handler.fail_next = FakeHttpError(503)
+    handler.apply_before_failure = True
+    assert first.flush() == 0
+    handler.apply_before_failure = False
+    second.enqueue(['Figma', 'design'])
+    assert second.flush() == 0 and first.flush() == 0
+    assert [row[0] for row in handler.rows[4:]] == ['Slack', 'Notion', 'Figma']
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_coalesced_flush()
+    test_retry_after_ambiguous_failure()
+    test_drain_backlog()
+    test_shared_queues()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+スナップショットの差分と、対象を絞ったキャッシュの無効化のテストスクリプト（オフラインテスト）
+"""
+
+from cache_backend import InProcessCacheBackend
+from research_jobs import NegativeCache
+from sheet_snapshot import SheetSnapshot
+from snapshot_diff import SnapshotChangeLog, diff_snapshots
+
+ROWS = [
+    (['Zoom', 'Web会議', '可'], 4, 'ツール'),
+    (['Slack', 'チャット', '可'], 5, 'ツール'),
+    (['draw.io', '作図', '可'], 6, 'ツール'),
+]
+
+
+def test_diff():
+    """
+    行単位の追加・削除・変更を、正規化したソフトウェア名をキーとして検出することをテスト
+    """
+    print("=== スナップショットの差分のテスト ===")
+
+    old = SheetSnapshot.from_rows(ROWS, version=1)
+    new = SheetSnapshot.from_rows([
+        # 行の挿入で以降の行番号がずれても変更とはしない
+        (['Visual Studio Code', 'エディタ', '可'], 4, 'ツール'),
+        (['ZOOM', 'Web会議', '可'], 5, 'ツール'),
+        (['Slack', 'チャット', '不可'], 6, 'ツール'),
+    ], version=2)
+
+    diff = diff_snapshots(old, new)
+    assert diff.added == {'visualstudiocode': 'Visual Studio Code'}
+    assert diff.removed == {'drawio': 'draw.io'}
+    # 'Zoom' → 'ZOOM' は名前の表記の変更として変更扱い、'Slack' は他の列の変更
+    assert set(diff.modified) == {'zoom', 'slack'}
+    assert sorted(diff.changed_names) == sorted(['Visual Studio Code', 'draw.io', 'ZOOM', 'Slack'])
+    assert not diff_snapshots(old, SheetSnapshot.from_rows(ROWS, version=3))
+
+    # 追加・変更された名前に関係する検索テキストのみ影響を受ける
+    assert diff.affects('vscode') and diff.affects('Visual Studio') and diff.affects('slak')
+    assert not diff.affects('Photoshop')
+    # 削除では見つからない結果は変わらない
+    assert not diff.affects('draw.io')
+    print("結果: OK")
+
+
+def test_targeted_negative_cache():
+    """
+    スナップショットが更新されても、変更に関係しない否定キャッシュは引き続き参照されることをテスト
+    """
+    print("=== 否定キャッシュの対象を絞った無効化のテスト ===")
+
+    change_log = SnapshotChangeLog(['A', 'B'])
+    negative_cache = NegativeCache(InProcessCacheBackend(), ttl=60, change_log=change_log)
+    negative_cache.add('Photoshop', [1, 5])
+    negative_cache.add('Notion', [1, 5])
+
+    changed = []
+    listener = change_log.listener('A', on_diff=lambda diff: changed.extend(diff.changed_names))
+    old = SheetSnapshot.from_rows(ROWS, version=1)
+    middle = SheetSnapshot.from_rows(ROWS + [(['Notion', 'メモ', '可'], 7, 'ツール')], version=2)
+    new = SheetSnapshot.from_rows(ROWS + [(['Notion', 'メモ', '可'], 7, 'ツール'), (['Miro', '作図', '可'], 8, 'ツール')], version=3)
+    listener((old, None), (middle, None))
+    listener((middle, None), (new, None))
+    assert changed == ['Notion', 'Miro']
+
+    # 複数の差分をたどって判定し、影響しない場合は現在のバージョンで記録し直す
+    assert negative_cache.contains('Photoshop', [3, 5])
+    assert negative_cache.contains('Photoshop', [3, 5])
+    # 追加された名前に一致する検索テキストは無効になる
+    assert not negative_cache.contains('Notion', [3, 5])
+    assert not negative_cache.contains('Notion', [1, 5])
+
+    # 差分の記録がないバージョンの変更（他のソース）は無効とする
+    assert not negative_cache.contains('Photoshop', [3, 6])
+
+    # 同じスナップショットの再公開は差分を計算せず、バージョンが同じでも内容が異なる場合は計算する
+    listener((new, None), (new, None))
+    assert changed == ['Notion', 'Miro']
+    listener((old, None), (SheetSnapshot.from_rows(ROWS + [(['Slack', 'チャット', '可'], 7, 'ツール')], version=1), None))
+    assert changed == ['Notion', 'Miro', 'Slack']
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_diff()
+    test_targeted_negative_cache()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+スナップショットのバックグラウンド更新のテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import snapshot_refresher
+
+from cache_backend import InProcessCacheBackend
+from circuit_breaker import CircuitOpenError
+from snapshot_refresher import SnapshotRefresher
+from snapshot_store import SnapshotStore
+from test_sheet_sync import FakeSheetsHandler, make_sheet
+
+
+class FakeDriveHandler(FakeSheetsHandler):
+    def __init__(self, sheets):
+        """
+        更新日時を返す機能を追加したハンドラー
+        """
+        super().__init__(sheets)
+        self.modified_time = '2024-01-01T00:00:00Z'
+
+    def find_spreadsheet_by_name(self, spreadsheet_name):
+        return 'spreadsheet-id'
+
+    def get_modified_time(self, spreadsheet_id):
+        return self.modified_time
+
+
+def test_refresh_and_swap():
+    """
+    更新時に公開中のスナップショットを変更せず、新しいスナップショットに差し替えることをテスト
+    """
+    print("=== スナップショット更新のテスト ===")
+
+    handler = FakeDriveHandler({'OK': make_sheet(['Zoom', 'Slack'])})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = SnapshotStore(os.path.join(temp_dir, 'snapshot.bin'))
+        refresher = SnapshotRefresher(lambda: handler, 'software list', store=store)
+
+        assert refresher.refresh()
+        first_snapshot, first_index = refresher.current
+        assert len(first_snapshot) == 2
+
+        # 更新日時が同じ場合は取得しない
+        handler.requested_rows = 0
+        assert not refresher.refresh()
+        assert handler.requested_rows == 0
+
+        # 末尾に追加 → 複製に対して同期し、旧スナップショットはそのまま残る
+        handler.sheets['OK'].append(['Docker Desktop', 'container'])
+        handler.modified_time = '2024-01-02T00:00:00Z'
+        assert refresher.refresh()
+        snapshot, index = refresher.current
+        assert snapshot is not first_snapshot
+        assert len(first_snapshot) == 2 and len(snapshot) == 3
+        assert index.version == snapshot.version > first_snapshot.version
+        print(f"差し替え: バージョン {first_snapshot.version} → {snapshot.version}")
+
+        # 保存済みのスナップショットから起動できる
+        restarted = SnapshotRefresher(lambda: handler, 'software list', store=store)
+        assert restarted.load_saved()
+        assert restarted.current[0].to_rows() == snapshot.to_rows()
+        assert restarted.spreadsheet_id == 'spreadsheet-id'
+
+        # 再起動後の更新でもバージョンは保存済みのものより後になる（同じバージョンが別の内容を指さない）
+        handler.sheets['OK'].append(['Figma', 'design'])
+        handler.modified_time = '2024-01-03T00:00:00Z'
+        assert restarted.refresh()
+        assert restarted.current[0].version > snapshot.version
+
+    # 障害中は最後のスナップショットで検索を続け、古い可能性があることを示す
+    def unavailable(spreadsheet_id):
+        raise CircuitOpenError("drive APIへの呼び出しを停止中です")
+
+    handler.get_modified_time = unavailable
+    try:
+        refresher.refresh()
+        assert False, "CircuitOpenError が送出されるべき"
+    except CircuitOpenError:
+        pass
+    assert refresher.stale
+    assert refresher.current[0] is snapshot
+
+    print("結果: OK")
+
+
+def test_shared_cache():
+    """
+    共有キャッシュを使う場合、更新担当の1レプリカのみがGoogle APIを呼び出すことをテスト
+    """
+    print("=== 共有キャッシュのテスト ===")
+
+    cache = InProcessCacheBackend()
+    leader_handler = FakeDriveHandler({'OK': make_sheet(['Zoom', 'Slack'])})
+    follower_handler = FakeDriveHandler(leader_handler.sheets)
+    leader = SnapshotRefresher(lambda: leader_handler, 'software list', cache=cache)
+    follower = SnapshotRefresher(lambda: follower_handler, 'software list', cache=cache)
+
+    assert leader.refresh()
+    assert follower.refresh()
+    assert follower.current[0].to_rows() == leader.current[0].to_rows()
+    assert follower_handler.requested_rows == 0
+
+    # 担当のレプリカが更新すると、他のレプリカはキャッシュから読み込む
+    leader_handler.sheets['OK'].append(['Docker Desktop', 'container'])
+    leader_handler.modified_time = '2024-01-02T00:00:00Z'
+    assert leader.refresh()
+    assert follower.refresh()
+    assert len(follower.current[0]) == 3
+    assert not follower.refresh()
+    assert follower_handler.requested_rows == 0
+    print("結果: OK")
+
+
+def test_boot_before_derived_indexes():
+    """
+    保存済みのスナップショットは派生した索引の作成を待たずに公開され、作成中に使われた場合は完了を待つことをテスト
+    """
+    print("=== 起動直後の公開のテスト ===")
+
+    handler = FakeDriveHandler({'OK': make_sheet(['Zoom', 'Slack'])})
+    gate = threading.Event()
+    original = snapshot_refresher.TfidfIndex
+
+    class SlowTfidfIndex:
+        @staticmethod
+        def build(snapshot):
+            gate.wait(5)
+            return original.build(snapshot)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = SnapshotStore(os.path.join(temp_dir, 'snapshot.bin'))
+        assert SnapshotRefresher(lambda: handler, 'software list', store=store).refresh()
+
+        snapshot_refresher.TfidfIndex = SlowTfidfIndex
+        try:
+            restarted = SnapshotRefresher(lambda: handler, 'software list', store=store)
+            started = time.monotonic()
+            assert restarted.load_saved()
+            assert time.monotonic() - started < 1
+            assert restarted.current is not None
+            assert restarted.complete('Zo') == ['Zoom']
+            gate.set()
+            snapshot = restarted.current[0]
+            assert restarted._get_tfidf_index(snapshot) is restarted._get_tfidf_index(snapshot)
+        finally:
+            snapshot_refresher.TfidfIndex = original
+            gate.set()
+    print("結果: OK")
+
+
+def test_edit_outside_samples():
+    """
+    サンプル行以外の行の編集も、更新日時が変わった時点で全件を再取得して反映することをテスト
+    """
+    print("=== サンプル行以外の編集のテスト ===")
+
+    names = [f'Tool {i}' for i in range(40)]
+    handler = FakeDriveHandler({'OK': make_sheet(names)})
+    refresher = SnapshotRefresher(lambda: handler, 'software list')
+    assert refresher.refresh()
+    sampled = refresher._sync.sheet_states['OK']['sample_rows']
+    row_num = next(row_num for row_num in range(5, 40) if row_num not in sampled)
+
+    # サンプル行でも末尾でもない行の名前を変更
+    handler.sheets['OK'][row_num - 1][0] = 'Zoom'
+    handler.modified_time = '2024-01-02T00:00:00Z'
+    assert refresher.refresh()
+    assert 'Zoom' in [row[0][0] for row in refresher.current[0].to_rows()]
+
+    # 取得していない内容のみの変更では差し替えない
+    snapshot = refresher.current[0]
+    handler.modified_time = '2024-01-03T00:00:00Z'
+    assert not refresher.refresh()
+    assert refresher.current[0] is snapshot
+    assert snapshot.metadata['modified_time'] == '2024-01-03T00:00:00Z'
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_refresh_and_swap()
+    test_shared_cache()
+    test_boot_before_derived_indexes()
+    test_edit_outside_samples()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+スナップショットのファイル保存・mmap読み込みのテストスクリプト（オフラインテスト）
+"""
+
+import os
+import tempfile
+
+from bm25_search import BM25Index
+from column_filter import FilterIndex
+from name_completer import NameCompleter
+from name_matcher import AliasIndex
+from sheet_snapshot import SheetSnapshot
+from snapshot_index import SnapshotIndex
+from snapshot_store import SnapshotStore
+from tfidf_search import TfidfIndex
+
+
+def make_snapshot():
+    rows = [
+        (['Zoom', 'Web会議', '', 'Windows, Mac'], 4, 'OK'),
+        (['Slack', 'チャット', '', 'Windows, Mac'], 5, 'OK'),
+        (['Visual Studio Code', 'エディタ'], 6, 'OK'),
+        (['zoom'], 4, 'NG'),
+    ]
+    return SheetSnapshot.from_rows(rows, version=3, metadata={'spreadsheet_id': 'abc', 'modified_time': '2024-01-01T00:00:00Z'})
+
+
+def test_save_and_load():
+    """
+    保存したスナップショットと索引をmmapで読み込み、同じ結果が得られることをテスト
+    """
+    print("=== スナップショット保存・読み込みのテスト ===")
+
+    snapshot = make_snapshot()
+    index = SnapshotIndex.build(snapshot)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = SnapshotStore(os.path.join(temp_dir, 'snapshot.bin'))
+        assert store.load() is None
+        assert store.save(snapshot, index)
+
+        loaded_snapshot, loaded_index, derived = store.load()
+        assert derived == {}
+        assert loaded_snapshot.version == 3
+        assert loaded_snapshot.metadata['modified_time'] == '2024-01-01T00:00:00Z'
+        assert loaded_snapshot.to_rows() == snapshot.to_rows()
+
+        # 索引も読み込んだデータのまま使用できる
+        for text in ['zoom', 'slack', 'visual studio code']:
+            assert loaded_index.exact_ids(loaded_snapshot, 0, text) == index.exact_ids(snapshot, 0, text)
+        assert loaded_index.substring_ids(loaded_snapshot, 0, 'oo') == index.substring_ids(snapshot, 0, 'oo')
+        assert loaded_index.rows_with_ids(0, loaded_index.substring_ids(loaded_snapshot, 0, 'oo')) == [0, 3]
+        assert set(loaded_index.fuzzy_candidates(0, 'slak')) == set(index.fuzzy_candidates(0, 'slak'))
+
+        # 複製すると変更可能なスナップショットになる
+        copied = loaded_snapshot.copy(version=4)
+        copied.append_rows([(['Docker Desktop'], 7, 'OK')])
+        assert len(copied) == 5 and len(loaded_snapshot) == 4
+
+        # バイト列（共有キャッシュ用）でも同じ形式で復元できる
+        restored_snapshot, restored_index, _ = SnapshotStore.loads(SnapshotStore.dumps(snapshot, index))
+        assert restored_snapshot.to_rows() == snapshot.to_rows()
+        assert restored_index.exact_ids(restored_snapshot, 0, 'zoom') == index.exact_ids(snapshot, 0, 'zoom')
+
+        # 形式が異なるファイルは読み込まない
+        with open(store.path, 'r+b') as f:
+            f.write(b'BROKEN!!')
+        assert store.load() is None
+
+    print("結果: OK")
+
+
+def test_derived_indexes():
+    """
+    派生した索引（別名・入力補完・フィルター・BM25・TF-IDF）を保存し、読み込んだ配列のまま同じ結果が得られることをテスト
+    """
+    print("=== 派生した索引の保存・読み込みのテスト ===")
+
+    categories = ['Web会議', 'チャット', 'エディタ', 'コンテナ']
+    rows = [
+        ([f'Tool {i}', categories[i % 4], '', 'Windows, Mac' if i % 2 else 'Linux', f'承認済み{i % 3}', '', 'Yes' if i % 5 else 'No'],
+         i + 4, 'OK')
+        for i in range(100)
+    ]
+    rows += [(['Visual Studio Code', 'エディタ', '', 'Windows', f'メモ{i}', '', 'Yes'], 104 + i, 'OK') for i in range(70)]
+    snapshot = SheetSnapshot.from_rows(rows, version=5)
+    index = SnapshotIndex.build(snapshot)
+    derived = {
+        'alias': AliasIndex.build(snapshot.column_pool(0)),
+        'completer': NameCompleter.build(snapshot.column_pool(0)),
+        'filter': FilterIndex.build(snapshot, index),
+        'bm25': BM25Index.build(snapshot),
+        'tfidf': TfidfIndex.build(snapshot),
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = SnapshotStore(os.path.join(temp_dir, 'snapshot.bin'))
+        assert store.save(snapshot, index, derived)
+        loaded_snapshot, loaded_index, loaded = store.load()
+        assert set(loaded) == set(derived)
+
+        for text in ['vscode', 'Tool 1', 'tol 12']:
+            assert loaded['alias'].suggest(text) == derived['alias'].suggest(text)
+        assert (loaded['completer'].complete(loaded_snapshot, loaded_index, 'too', 5)
+                == derived['completer'].complete(snapshot, index, 'too', 5))
+        # 値の種類が少ない列はビットマップ、多い列はスナップショットの索引を参照する
+        for filters in [[('platform', 'mac')], [('commercial', 'yes'), ('category', 'エディタ')], [('remarks', 'メモ1')]]:
+            assert loaded['filter'].evaluate(filters) == derived['filter'].evaluate(filters)
+        assert loaded['bm25'].search('visual code', 5) == derived['bm25'].search('visual code', 5)
+        vector = derived['tfidf'].query_vector('エディタ')
+        assert loaded['tfidf'].search(loaded['tfidf'].query_vector('エディタ')) == derived['tfidf'].search(vector)
+
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_save_and_load()
+    test_derived_indexes()
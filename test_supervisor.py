@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+ローダーとワーカーの間のスナップショットの共有のテストスクリプト（Google API・Slackを使用しないオフラインテスト）
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from snapshot_diff import SnapshotChangeLog
+from snapshot_refresher import DERIVED_ATTRIBUTES, SnapshotRefresher
+from snapshot_store import MappedStrings, SnapshotStore
+from supervisor import NOTICE_SAVED, NOTICE_STATUS, follow_notices
+from test_sheet_sync import make_sheet
+from test_snapshot_refresher import FakeDriveHandler
+
+
+def test_follow_saved_snapshot():
+    """
+    ローダーが保存したスナップショットに、ワーカーが通知を受けて差し替えることをテスト
+    """
+    print("=== スナップショットの共有のテスト ===")
+
+    handler = FakeDriveHandler({'OK': make_sheet(['Zoom', 'Slack'])})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'snapshot.bin')
+        loader = SnapshotRefresher(lambda: handler, 'software list', store=SnapshotStore(path))
+        worker = SnapshotRefresher(lambda: handler, 'software list', store=SnapshotStore(path))
+
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        loader.add_save_listener(lambda snapshot: sender.send((NOTICE_SAVED, 'software list', snapshot.version)))
+        follower = threading.Thread(target=follow_notices, args=(receiver, {'software list': worker}))
+        follower.start()
+
+        assert loader.refresh()
+        handler.sheets['OK'].append(['Docker Desktop', 'container'])
+        handler.modified_time = '2024-01-02T00:00:00Z'
+        assert loader.refresh()
+        sender.send((NOTICE_STATUS, 'software list', 'drive APIへの呼び出しを停止中です'))
+        sender.close()
+        follower.join(5)
+
+        # ワーカーはGoogle APIを呼び出さずに、最新のバージョンと更新確認の状態を反映している
+        snapshot, _ = worker.current
+        assert snapshot.version == loader.current[0].version
+        assert snapshot.to_rows() == loader.current[0].to_rows()
+        assert worker.stale
+        # 同じバージョンは読み込み直さない
+        assert not worker.reload_saved()
+        print(f"バージョン: {snapshot.version}, {len(snapshot)}行")
+    print("結果: OK")
+
+
+def test_worker_reuses_saved_derived():
+    """
+    ワーカーはローダーが保存した派生した索引と差分をそのまま使い、作り直さないことをテスト
+    """
+    print("=== 派生した索引と差分の共有のテスト ===")
+
+    handler = FakeDriveHandler({'OK': make_sheet(['Zoom', 'Slack'])})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'snapshot.bin')
+        loader = SnapshotRefresher(lambda: handler, 'software list', store=SnapshotStore(path))
+        worker = SnapshotRefresher(lambda: handler, 'software list', store=SnapshotStore(path))
+        loader_diffs = []
+        worker_diffs = []
+        loader_changes = SnapshotChangeLog(['software list'])
+        worker_changes = SnapshotChangeLog(['software list'])
+        loader.add_listener(loader_changes.listener('software list', on_diff=loader_diffs.append))
+        worker.add_listener(worker_changes.listener('software list', on_diff=worker_diffs.append))
+
+        assert loader.refresh()
+        assert worker.load_saved()
+        handler.sheets['OK'].append(['Docker Desktop', 'container'])
+        handler.modified_time = '2024-01-02T00:00:00Z'
+        assert loader.refresh()
+        assert worker.reload_saved()
+
+        snapshot = worker.current[0]
+        # 派生した索引は読み込んだ時点で揃っている（ワーカーでは作成しない）
+        for attribute in DERIVED_ATTRIBUTES.values():
+            assert getattr(worker, attribute)[0] is snapshot, attribute
+        assert isinstance(worker._tfidf_index[1].vocabulary, MappedStrings)
+        assert worker.complete('dock') == ['Docker Desktop']
+        assert worker.suggest('zoom')
+
+        # 差分はローダーで1回だけ計算し、ワーカーは記録のみ行う（キャッシュの削除はローダーが行う）
+        versions = [loader.current[0].version - 1], [loader.current[0].version]
+        assert [list(diff.added.values()) for diff in loader_diffs] == [['Docker Desktop']]
+        assert worker_diffs == []
+        assert worker_changes.affects('docker', *versions)
+        assert not worker_changes.affects('notepad', *versions)
+    print("結果: OK")
+
+
+if __name__ == "__main__":
+    test_follow_saved_snapshot()
+    test_worker_reuses_saved_derived()
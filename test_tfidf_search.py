@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+類似検索（TF-IDF文字n-gram）のテストスクリプト（Google APIを使用しないオフラインテスト）
+"""
+
+import random
+import time
+
+from sheet_snapshot import SheetSnapshot
+from test_search_pipeline import make_handler
+from tfidf_search import TfidfIndex
+
+ROWS = [
+    (['Zoom', 'Web会議'], 4, 'ツール'),
+    (['Microsoft Teams', 'Web会議'], 5, 'ツール'),
+    (['Google Meet', 'Web会議'], 6, 'ツール'),
+    (['draw.io', '作図'], 7, 'ツール'),
+    (['Visual Studio Code', 'エディタ'], 8, 'ツール'),
+    (['Zoom It', '画面拡大'], 9, 'ツール'),
+]
+
+
+def test_similar_tools():
+    """
+    ソフトウェア名で検索すると、その行の名前とカテゴリに近いソフトウェアが上位になることをテスト
+    """
+    print("=== 類似検索のテスト ===")
+
+    snapshot = SheetSnapshot.from_rows(ROWS)
+    handler = make_handler()
+
+    matches = handler.tfidf_search(snapshot, 'zoom', limit=4)
+    names = [match['text'] for match in matches]
+    assert names[0] == 'Zoom'
+    # 同じカテゴリ（Web会議）のソフトウェアが、名前だけが近いソフトウェアより上位になる
+    assert set(names[1:3]) == {'Microsoft Teams', 'Google Meet'}, names
+
+    # 登録されていない名前はテキストのn-gramで検索する
+    matches = handler.tfidf_search(snapshot, 'Visual Studio', limit=1)
+    assert matches[0]['text'] == 'Visual Studio Code' and matches[0]['type'] == '類似'
+
+    result = handler.search_snapshot(snapshot, 'Zoom', ['tfidf'], limit=3)
+    assert result['engines'] == ['tfidf'] and len(result['matches']) == 3
+    print(f"結果: {names}")
+
+
+def test_query_latency():
+    """
+    10万行のスナップショットで、1回の検索が数ミリ秒で終わることをテスト
+    """
+    print("=== 10万行の類似検索の時間のテスト ===")
+
+    rng = random.Random(1)
+    syllables = ['zo', 'om', 'sla', 'ck', 'vis', 'ual', 'co', 'de', 'dra', 'wi', 'no', 'te', 'pad', 'gim', 'pho', 'to']
+    categories = ['Web会議', '作図', 'エディタ', 'チャット', 'ブラウザ', '圧縮', '画像編集']
+    rows = [
+        ([''.join(rng.choice(syllables) for _ in range(rng.randint(2, 5))) + f' {i}', rng.choice(categories)], i + 4, 'S')
+        for i in range(100000)
+    ]
+    snapshot = SheetSnapshot.from_rows(rows)
+    index = TfidfIndex.build(snapshot)
+
+    elapsed = []
+    for query in ['zoom', 'visual code', 'Web会議 slack', 'drawio']:
+        started = time.perf_counter()
+        index.search(index.query_vector(query), limit=3)
+        elapsed.append(time.perf_counter() - started)
+    assert max(elapsed) < 0.05, elapsed
+    print(f"結果: 最大 {max(elapsed) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_similar_tools()
+    test_query_latency()
@@ -0,0 +1,196 @@
+import math
+import re
+import unicodedata
+
+import numpy as np
+from scipy import sparse
+
+from snapshot_index import sorted_position
+
+# ベクトル化する列と重み（ソフトウェア名、カテゴリ）
+TFIDF_COLUMNS = {0: 1.0, 1: 1.0}
+
+# 「Xのようなツール」の検索で、基準の行からベクトルを作る際の重み（名前よりカテゴリを重視する）
+SIMILAR_COLUMNS = {0: 0.5, 1: 1.0}
+
+# 文字n-gramの長さの範囲
+NGRAM_RANGE = (2, 3)
+
+# 類似とみなすコサイン類似度の閾値（0-1）
+SIMILARITY_THRESHOLD = 0.2
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def char_ngrams(text, ngram_range=NGRAM_RANGE):
+    """
+    テキストの文字n-gramの出現回数（前後に空白を付けて、語の先頭・末尾を区別する）
+
+    Args:
+        text (str): テキスト
+        ngram_range (tuple): n-gramの長さの範囲 (最小, 最大)
+
+    Returns:
+        dict: {n-gram: 出現回数}
+    """
+    text = _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+    if not text:
+        return {}
+    padded = f' {text} '
+    counts = {}
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def _sublinear(counts):
+    """
+    出現回数を 1 + log(回数) に変換（同じn-gramの繰り返しの影響を抑える）
+    """
+    return {gram: 1.0 + math.log(count) for gram, count in counts.items()}
+
+
+class TfidfIndex:
+    __slots__ = ('vocabulary', 'idf', 'matrix', 'row_count')
+
+    def __init__(self, vocabulary, idf, matrix):
+        """
+        行ごとのTF-IDF文字n-gramベクトル（疎行列）による類似検索の索引
+
+        配列のみで構成するため、保存したファイルをmmapしてそのまま参照できる。
+
+        Args:
+            vocabulary: ソート済みのn-gramのシーケンス（位置が行列の列番号）
+            idf (ndarray): n-gramごとのIDF
+            matrix (csc_matrix): 行 × n-gram のL2正規化済みTF-IDF行列（列の取り出しが速いCSC形式）
+        """
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+        self.row_count = matrix.shape[0]
+
+    @classmethod
+    def build(cls, snapshot, columns=TFIDF_COLUMNS):
+        """
+        スナップショットから索引を作成
+
+        列の文字列プール（重複なし）ごとにn-gramを数えて疎行列にし、行ごとの文字列IDで
+        まとめて取り出す（セルごとのPythonのループは行わない）。
+
+        Args:
+            snapshot (SheetSnapshot): 対象のスナップショット
+            columns (dict): {列インデックス: 重み}
+
+        Returns:
+            TfidfIndex: 索引
+        """
+        row_count = len(snapshot)
+        vocabulary = {}
+        column_matrices = []
+
+        for column, weight in columns.items():
+            cells = snapshot.column_ids(column)
+            if cells is None:
+                continue
+            pool = snapshot.column_pool(column)
+            indptr = [0]
+            indices = []
+            data = []
+            for string_id in range(len(pool)):
+                for gram, value in _sublinear(char_ngrams(pool[string_id])).items():
+                    indices.append(vocabulary.setdefault(gram, len(vocabulary)))
+                    data.append(value * weight)
+                indptr.append(len(indices))
+            column_matrices.append((np.asarray(cells, dtype=np.int64), indptr, indices, data))
+
+        size = len(vocabulary)
+        matrix = sparse.csr_matrix((row_count, size), dtype=np.float32)
+        for cells, indptr, indices, data in column_matrices:
+            pool_matrix = sparse.csr_matrix(
+                (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+                shape=(len(indptr) - 1, size)
+            )
+            # 行ごとの文字列IDで文字列プールの行列から行を取り出す
+            matrix = matrix + pool_matrix[cells]
+        matrix = sparse.csr_matrix(matrix)
+        matrix.sum_duplicates()
+
+        # 列の並びをn-gramの昇順にする（語彙を辞書ではなくソート済みの配列として二分探索で引けるように）
+        grams = list(vocabulary)
+        order = sorted(range(size), key=grams.__getitem__)
+        ranks = np.empty(size, dtype=np.int32)
+        ranks[order] = np.arange(size, dtype=np.int32)
+        matrix.indices = ranks[matrix.indices]
+        matrix.has_sorted_indices = False
+
+        # IDF（平滑化あり）を掛けて、行ごとにL2正規化
+        document_frequency = np.bincount(matrix.indices, minlength=size)
+        idf = (np.log((1 + row_count) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix.data *= idf[matrix.indices]
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+
+        return cls([grams[column] for column in order], idf, matrix.tocsc())
+
+    def _vector(self, weighted_texts):
+        """
+        (テキスト, 重み) のリストから、索引と同じ方法でL2正規化したTF-IDFベクトルを作成（索引にあるn-gramのみ）
+        """
+        weights = {}
+        for text, weight in weighted_texts:
+            for gram, value in _sublinear(char_ngrams(text)).items():
+                column = sorted_position(self.vocabulary, gram)
+                if column is not None:
+                    weights[column] = weights.get(column, 0.0) + value * weight
+        if not weights:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        columns = np.fromiter(weights.keys(), dtype=np.int64, count=len(weights))
+        values = np.fromiter(weights.values(), dtype=np.float32, count=len(weights)) * self.idf[columns]
+        return columns, values / np.linalg.norm(values)
+
+    def query_vector(self, text):
+        """
+        検索テキストのTF-IDFベクトル
+
+        Returns:
+            tuple: (n-gramの列番号の配列, L2正規化した値の配列)
+        """
+        return self._vector([(text, 1.0)])
+
+    def row_vector(self, snapshot, row_index, columns=SIMILAR_COLUMNS):
+        """
+        行（ソフトウェア名とカテゴリ）のTF-IDFベクトル（「Xのようなツール」の検索用）
+
+        Returns:
+            tuple: (n-gramの列番号の配列, L2正規化した値の配列)
+        """
+        return self._vector([(snapshot.cell(row_index, column), weight) for column, weight in columns.items()])
+
+    def search(self, vector, limit=10, threshold=SIMILARITY_THRESHOLD):
+        """
+        ベクトルとのコサイン類似度が高い行を取得
+
+        検索ベクトルに含まれるn-gramの列だけを取り出して1回の疎行列・ベクトル積で全行のスコアを計算し、
+        argpartition で上位 limit 件を選ぶ（全件のソートは行わない）。
+
+        Args:
+            vector (tuple): query_vector() または row_vector() の戻り値
+            limit (int): 取得する件数
+            threshold (float): コサイン類似度の閾値
+
+        Returns:
+            list: [(行インデックス, コサイン類似度)] 類似度の高い順（同じ類似度は行順）
+        """
+        columns, values = vector
+        if len(columns) == 0 or limit <= 0 or self.row_count == 0:
+            return []
+        scores = self.matrix[:, columns] @ values
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        order = np.lexsort((candidates, -scores[candidates]))
+        return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]